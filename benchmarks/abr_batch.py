@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Measure how fast BatchABREvaluator evaluates a grid of panic and safe buffers over random throughput traces.
+
+Run from the root of the repository:
+    python3 -m benchmarks.abr_batch
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from dash_emulator.abr_batch import BatchABREvaluator
+from dash_emulator.models import AdaptationSet, Representation
+from dash_emulator.traces import ThroughputTrace
+
+
+def random_trace(rng: random.Random, length: int) -> ThroughputTrace:
+    return ThroughputTrace([rng.uniform(0.5, 5) for _ in range(length)],
+                           [rng.uniform(200000, 8000000) for _ in range(length)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the batch evaluation of the ABR logic")
+    parser.add_argument("--traces", type=int, default=50, help="Number of traces")
+    parser.add_argument("--grid", type=int, default=10, help="Number of panic buffers and of safe buffers")
+    parser.add_argument("--segments", type=int, default=900, help="Number of 2-second segments")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    video = AdaptationSet(0, "video", "30", 1920, 1080, "16:9", {
+        i: Representation(i, "video/mp4", "avc1", bandwidth, 1920, 1080, "", [])
+        for i, bandwidth in enumerate([300000, 750000, 1200000, 2500000, 4500000, 6000000])})
+    audio = AdaptationSet(1, "audio", "", 0, 0, "", {
+        i: Representation(i, "audio/mp4", "mp4a", bandwidth, 0, 0, "", [])
+        for i, bandwidth in enumerate([64000, 128000])})
+    evaluator = BatchABREvaluator({0: video, 1: audio}, [2.0] * args.segments, 2.0)
+    traces = [random_trace(rng, 200) for _ in range(args.traces)]
+    panic_buffers = np.linspace(0, 4, args.grid)
+    safe_buffers = np.linspace(2, 10, args.grid)
+
+    start = time.perf_counter()
+    result = evaluator.evaluate(traces, panic_buffers, safe_buffers)
+    elapsed = time.perf_counter() - start
+    num_sessions = len(result)
+    print("%d sessions of %d segments in %.2f s: %.0f sessions/s, %.0f segment decisions/s" % (
+        num_sessions, args.segments, elapsed, num_sessions / elapsed, num_sessions * args.segments / elapsed))
+    print("Mean bitrate %.0f bps, mean switches %.1f, mean stall time %.2f s" % (
+        result.average_bitrate.mean(), result.num_switches.mean(), result.stall_time.mean()))
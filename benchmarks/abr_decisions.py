@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Measure the number of decisions per second of DashABRController on a random bandwidth sequence,
+compared with sorting the representations on every decision.
+
+Run from the root of the repository:
+    python3 -m benchmarks.abr_decisions
+"""
+
+import argparse
+import random
+import time
+
+from dash_emulator.abr import DashABRController
+from dash_emulator.bandwidth import BandwidthMeter
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.models import AdaptationSet, Representation, MPD
+from dash_emulator.mpd import MPDProvider
+
+
+class FixedBandwidthMeter(BandwidthMeter):
+    def __init__(self):
+        self.fixed_bandwidth = 0
+
+    @property
+    def bandwidth(self) -> int:
+        return self.fixed_bandwidth
+
+    def add_listener(self, listener):
+        pass
+
+
+class StaticMPDProvider(MPDProvider):
+    def __init__(self, mpd):
+        self._mpd = mpd
+
+    @property
+    def mpd(self) -> MPD:
+        return self._mpd
+
+    async def start(self, mpd_url):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class SortingABRController(DashABRController):
+    """
+    Choose the representations by sorting them on every decision
+    """
+
+    @staticmethod
+    def choose_ideal_selection(adaptation_set, bw) -> int:
+        representations = sorted(adaptation_set.representations.values(), key=lambda x: x.bandwidth, reverse=True)
+        representation = None
+        for representation in representations:
+            if representation.bandwidth < bw:
+                return representation.id
+        return representation.id
+
+    def _update_ladders(self, adaptation_sets):
+        super()._update_ladders(adaptation_sets)
+        self._ladders = {id_: SortingLadder(adaptation_set) for id_, adaptation_set in adaptation_sets.items()}
+
+
+class SortingLadder(object):
+    def __init__(self, adaptation_set):
+        self.adaptation_set = adaptation_set
+
+    def choose(self, bw):
+        return SortingABRController.choose_ideal_selection(self.adaptation_set, bw)
+
+
+def build_adaptation_sets(num_representations):
+    video = {i: Representation(i, "video/mp4", "avc1", 200000 * (i + 1), 1920, 1080, "", [])
+             for i in range(num_representations)}
+    audio = {i: Representation(i, "audio/mp4", "mp4a", 32000 * (i + 1), 0, 0, "", []) for i in range(3)}
+    return {0: AdaptationSet(0, "video", "30", 1920, 1080, "16:9", video),
+            1: AdaptationSet(1, "audio", "", 0, 0, "", audio)}
+
+
+def measure(name, controller_class, adaptation_sets, bandwidths):
+    bandwidth_meter = FixedBandwidthMeter()
+    provider = StaticMPDProvider(MPD("", "", "static", 0, 2, 2, adaptation_sets))
+    controller = controller_class(-1, float("inf"), bandwidth_meter, BufferManagerImpl(), provider)
+    start = time.perf_counter()
+    for bandwidth in bandwidths:
+        bandwidth_meter.fixed_bandwidth = bandwidth
+        controller.update_selection(adaptation_sets)
+    elapsed = time.perf_counter() - start
+    print("%-24s %10.0f decisions/s" % (name, len(bandwidths) / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the ABR decisions")
+    parser.add_argument("--decisions", type=int, default=200000, help="Number of decisions")
+    parser.add_argument("--representations", type=int, default=12, help="Number of video representations")
+    args = parser.parse_args()
+
+    random.seed(0)
+    adaptation_sets = build_adaptation_sets(args.representations)
+    bandwidths = [random.randint(100000, 4000000 * args.representations // 10) for _ in range(args.decisions)]
+    measure("Sorting on every decision", SortingABRController, adaptation_sets, bandwidths)
+    measure("Bitrate ladders", DashABRController, adaptation_sets, bandwidths)
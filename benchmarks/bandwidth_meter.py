@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Measure the cost of each chunk in the continuous bandwidth estimate of BandwidthMeterImpl.
+The cost per chunk should stay flat however long the session is.
+
+Run from the root of the repository:
+    python3 -m benchmarks.bandwidth_meter
+"""
+
+import argparse
+import asyncio
+import time
+
+from dash_emulator.bandwidth import BandwidthMeterImpl
+
+
+async def run(num_chunks: int, block_size: int, chunk_interval: float):
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], cont_bw_window=1)
+    await bandwidth_meter.on_transfer_start("http://benchmark.local/segment.m4s")
+    t = 0.0
+    block_start = time.perf_counter()
+    for i in range(1, num_chunks + 1):
+        t += chunk_interval
+        await bandwidth_meter.update_cont_bw(4096, t)
+        if i % block_size == 0:
+            now = time.perf_counter()
+            print("%10d chunks: %8.1f ns/chunk, %6d samples in window, estimate %d bps" % (
+                i, (now - block_start) / block_size * 1e9, len(bandwidth_meter._cont_bw),
+                bandwidth_meter.last_cont_bw))
+            block_start = now
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the continuous bandwidth estimate")
+    parser.add_argument("--chunks", type=int, default=1000000, help="Number of chunks to feed")
+    parser.add_argument("--block", type=int, default=100000, help="Number of chunks between two reports")
+    parser.add_argument("--interval", type=float, default=0.0001, help="Interval between two chunks in seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args.chunks, args.block, args.interval))
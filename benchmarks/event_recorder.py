@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Measure the time to record the events of a session and to load them back for post-processing,
+with EventRecorder compared with writing one JSON object per event.
+
+Run from the root of the repository:
+    python3 -m benchmarks.event_recorder
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from dash_emulator.event_recorder import EventRecorder, load_events, stalls
+from dash_emulator.models import State
+
+
+class JSONRecorder(object):
+    """
+    Write one JSON object per event, like a writer of event objects
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    async def on_state_change(self, position, old_state, new_state):
+        self.file.write(json.dumps({"time": time.time(), "type": "state", "position": position,
+                                    "old": old_state.name, "new": new_state.name}) + "\n")
+
+    async def on_buffer_level_change(self, buffer_level):
+        self.file.write(json.dumps({"time": time.time(), "type": "buffer", "level": buffer_level}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def json_stalls(path):
+    start_times = []
+    durations = []
+    start = None
+    with open(path) as f:
+        for line in f:
+            event = json.loads(line)
+            if event["type"] != "state":
+                continue
+            if start is not None:
+                durations.append(event["time"] - start)
+                start = None
+            if event["old"] == "READY" and event["new"] == "BUFFERING":
+                start = event["time"]
+                start_times.append(start)
+    return start_times, durations
+
+
+async def feed(recorder, events):
+    for is_state, value in events:
+        if is_state:
+            await recorder.on_state_change(value, State.READY, State.BUFFERING)
+            await recorder.on_state_change(value, State.BUFFERING, State.READY)
+        else:
+            await recorder.on_buffer_level_change(value)
+
+
+def measure(name, recorder_class, load, events, path):
+    recorder = recorder_class(path)
+    start = time.perf_counter()
+    asyncio.run(feed(recorder, events))
+    recorder.close()
+    write = time.perf_counter() - start
+    start = time.perf_counter()
+    num_stalls = load(path)
+    read = time.perf_counter() - start
+    print("%-16s write %6.2f s, load and find %d stalls %6.3f s, %6.1f MB" % (
+        name, write, num_stalls, read, os.path.getsize(path) / 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the event recorders")
+    parser.add_argument("--events", type=int, default=1000000, help="Number of events")
+    args = parser.parse_args()
+
+    random.seed(0)
+    events = [(random.random() < 0.001, random.random() * 30) for _ in range(args.events)]
+    with tempfile.TemporaryDirectory() as folder:
+        measure("JSON lines", JSONRecorder, lambda path: len(json_stalls(path)[0]), events,
+                os.path.join(folder, "events.json"))
+        measure("EventRecorder", EventRecorder, lambda path: len(stalls(load_events(path))[0]), events,
+                os.path.join(folder, "events.bin"))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Measure the overhead of the download listeners, with and without coalescing the received chunks.
+A local HTTP server sends the content as fast as it can, and the download manager reports the chunks
+to a bandwidth meter and to a counting listener.
+With --chunk, the content is read in small chunks, like on a slow link, through a rate limit high enough
+to never hold the transfer.
+
+Run from the root of the repository:
+    python3 -m benchmarks.listener_dispatch
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from dash_emulator.bandwidth import BandwidthMeterImpl, BandwidthUpdateListener
+from dash_emulator.download import DownloadManagerImpl, DownloadEventListener
+from dash_emulator.rate_limit import TokenBucket
+
+
+class CountingListener(DownloadEventListener, BandwidthUpdateListener):
+    def __init__(self):
+        self.byte_events = 0
+        self.cont_bw_events = 0
+
+    async def on_transfer_start(self, url) -> None:
+        pass
+
+    async def on_bytes_transferred(self, length: int, url: str, position: int, size: int, content) -> None:
+        self.byte_events += 1
+
+    async def on_transfer_end(self, size: int, url: str) -> None:
+        pass
+
+    async def on_transfer_canceled(self, url: str, position: int, size: int) -> None:
+        pass
+
+    async def on_bandwidth_update(self, bw: int, extra_stats: dict) -> None:
+        pass
+
+    async def on_continuous_bw_update(self, bw: int) -> None:
+        self.cont_bw_events += 1
+
+
+async def serve(size: int):
+    payload = bytes(size)
+
+    async def handle(request):
+        return web.Response(body=payload)
+
+    app = web.Application()
+    app.router.add_get("/{name}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, "http://127.0.0.1:%d/" % runner.addresses[0][1]
+
+
+async def run(size: int, repeat: int, chunk_size: int):
+    runner, base_url = await serve(size)
+    configurations = [
+        ("every chunk", {}, 0),
+        ("every 1 ms", {"coalesce_interval": 0.001}, 0.001),
+        ("every 10 ms", {"coalesce_interval": 0.01}, 0.01),
+        ("every 256 kB", {"coalesce_bytes": 262144}, 0),
+    ]
+    try:
+        print("%-14s %10s %12s %12s %14s" % ("coalescing", "MB/s", "events", "events/s", "cont bw events"))
+        for name, options, cont_bw_update_interval in configurations:
+            counter = CountingListener()
+            bandwidth_meter = BandwidthMeterImpl(1000000, 0, [counter],
+                                                 cont_bw_update_interval=cont_bw_update_interval)
+            rate_limiter = TokenBucket(1e12) if chunk_size > 0 else None
+            download_manager = DownloadManagerImpl([bandwidth_meter, counter], chunk_size=chunk_size,
+                                                   rate_limiter=rate_limiter, **options)
+            start = time.perf_counter()
+            for i in range(repeat):
+                await download_manager.download(base_url + "content-%d" % i)
+            elapsed = time.perf_counter() - start
+            await download_manager.close()
+            print("%-14s %10.1f %12d %12.0f %14d" % (name, size * repeat / elapsed / 1e6, counter.byte_events,
+                                                     counter.byte_events / elapsed, counter.cont_bw_events))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the dispatch of the download events")
+    parser.add_argument("--size", type=int, default=100 * 1024 * 1024, help="Size of each download in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of downloads for each configuration")
+    parser.add_argument("--chunk", type=int, default=4096,
+                        help="Size of the chunks read by the client in bytes, 0 to read whatever has arrived")
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.repeat, args.chunk))
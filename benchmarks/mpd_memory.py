@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compare the memory kept by the parsed model of a long multi-representation manifest with the memory a
+list of Segment objects with their own URL strings would take, like the model kept before the segment
+timelines were compacted.
+The manifest has a SegmentTimeline with one S element per segment, whose durations alternate between
+2.002 and 1.968 seconds, so the runs of the timeline can't be merged and the model keeps one run per segment.
+
+Run from the root of the repository:
+    python3 -m benchmarks.mpd_memory
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from dash_emulator.models import Segment
+from dash_emulator.mpd.parser import DefaultMPDParser
+
+MPD_HEAD = """<?xml version="1.0" encoding="utf-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" profiles="urn:mpeg:dash:profile:isoff-live:2011" type="static"
+    mediaPresentationDuration="PT%dS" maxSegmentDuration="PT2.1S" minBufferTime="PT2.0S">
+    <Period id="0" start="PT0.0S">
+        <AdaptationSet id="0" contentType="video" frameRate="30/1" maxWidth="1920" maxHeight="1080" par="16:9">
+"""
+
+REPRESENTATION = """            <Representation id="%d" mimeType="video/mp4" codecs="avc1.64001f" bandwidth="%d" width="1920" height="1080">
+                <SegmentTemplate timescale="30000" initialization="init-$RepresentationID$.m4s" media="chunk-$RepresentationID$-$Number%%05d$.m4s" startNumber="1">
+                    <SegmentTimeline>
+%s
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>
+"""
+
+# The alternating durations of the segments, in ticks of the timescale
+DURATIONS = (60060, 59040)
+
+MPD_TAIL = """        </AdaptationSet>
+    </Period>
+</MPD>
+"""
+
+
+class DictSegment(object):
+    """
+    A segment with a per-instance __dict__, like the model classes without __slots__
+    """
+
+    def __init__(self, url: str, duration: float):
+        self.url = url
+        self.duration = duration
+
+
+def generate_timeline(num_segments: int) -> str:
+    elements = ['                        <S t="0" d="%d" />' % DURATIONS[0]]
+    elements.extend('                        <S d="%d" />' % DURATIONS[i % 2] for i in range(1, num_segments))
+    return "\n".join(elements)
+
+
+def generate_mpd(duration: int, num_representations: int) -> str:
+    timeline = generate_timeline(duration // 2)
+    parts = [MPD_HEAD % duration]
+    for representation_id in range(num_representations):
+        parts.append(REPRESENTATION % (representation_id, 5000000 // (representation_id + 1), timeline))
+    parts.append(MPD_TAIL)
+    return "".join(parts)
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def expand(mpd, segment_class):
+    """
+    Materialize every segment of every representation in a list
+    """
+    return [[segment_class(segment.url, segment.duration) for segment in representation.segments]
+            for adaptation_set in mpd.adaptation_sets.values()
+            for representation in adaptation_set.representations.values()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the memory of the MPD model")
+    parser.add_argument("--duration", type=int, default=24 * 3600, help="Duration of the stream in seconds")
+    parser.add_argument("--representations", type=int, default=10, help="Number of representations")
+    args = parser.parse_args()
+
+    content = generate_mpd(args.duration, args.representations)
+    url = "http://benchmark.local/live/manifest.mpd"
+    mpd, compact = measure(lambda: DefaultMPDParser().parse(content, url))
+    num_segments = sum(len(representation.segments) for adaptation_set in mpd.adaptation_sets.values()
+                       for representation in adaptation_set.representations.values())
+    # The content is shared by the three models, it isn't counted
+    if mpd.content is not None:
+        compact -= sys.getsizeof(mpd.content)
+    _, slotted = measure(lambda: expand(mpd, Segment))
+    _, legacy = measure(lambda: expand(mpd, DictSegment))
+
+    print("%d segments in %d representations" % (num_segments, args.representations))
+    print("%-32s %10.2f MB" % ("Segment lists with __dict__", legacy / 1e6))
+    print("%-32s %10.2f MB" % ("Segment lists with __slots__", slotted / 1e6))
+    print("%-32s %10.2f MB" % ("Parsed model (SegmentTimeline)", compact / 1e6))
+    print("Reduction: %.0fx" % (legacy / compact))
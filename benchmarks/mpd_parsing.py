@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Compare the parse time and the peak memory of DefaultMPDParser and StreamingMPDParser on a generated manifest.
+The manifest lists every segment in its own <S> element, with alternating durations, like a long live stream.
+
+Run from the root of the repository:
+    python3 -m benchmarks.mpd_parsing
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from dash_emulator.mpd.parser import DefaultMPDParser, StreamingMPDParser
+
+MPD_HEAD = """<?xml version="1.0" encoding="utf-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" profiles="urn:mpeg:dash:profile:isoff-live:2011" type="static"
+    mediaPresentationDuration="PT24H" maxSegmentDuration="PT2.1S" minBufferTime="PT2.0S">
+    <Period id="0" start="PT0.0S">
+        <AdaptationSet id="0" contentType="video" frameRate="30/1" maxWidth="1920" maxHeight="1080" par="16:9">
+"""
+
+REPRESENTATION_HEAD = """            <Representation id="%d" mimeType="video/mp4" codecs="avc1.64001f" bandwidth="%d" width="1920" height="1080">
+                <SegmentTemplate timescale="30000" initialization="init-$RepresentationID$.m4s" media="chunk-$RepresentationID$-$Number%%05d$.m4s" startNumber="1">
+                    <SegmentTimeline>
+"""
+
+REPRESENTATION_TAIL = """                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>
+"""
+
+MPD_TAIL = """        </AdaptationSet>
+    </Period>
+</MPD>
+"""
+
+
+def generate_mpd(size: int, num_representations: int) -> str:
+    """
+    Generate a manifest of about size characters
+    """
+    line = '                        <S t="%d" d="%d" />\n'
+    num_segments = size // num_representations // len(line % (10 ** 9, 60000))
+    parts = [MPD_HEAD]
+    for representation_id in range(num_representations):
+        parts.append(REPRESENTATION_HEAD % (representation_id, 5000000 // (representation_id + 1)))
+        t = 0
+        for i in range(num_segments):
+            d = 60000 if i % 2 == 0 else 59000
+            parts.append(line % (t, d))
+            t += d
+        parts.append(REPRESENTATION_TAIL)
+    parts.append(MPD_TAIL)
+    return "".join(parts)
+
+
+def measure(name: str, parser, content: str):
+    url = "http://benchmark.local/live/manifest.mpd"
+    gc.collect()
+    start = time.perf_counter()
+    parser.parse(content, url)
+    elapsed = time.perf_counter() - start
+    # Measure the memory in a second run, tracemalloc slows the parsing down
+    gc.collect()
+    tracemalloc.start()
+    mpd = parser.parse(content, url)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    num_segments = sum(len(representation.segments) for adaptation_set in mpd.adaptation_sets.values()
+                       for representation in adaptation_set.representations.values())
+    print("%-40s %8.2f s %10.1f MB peak %10.1f MB kept %10d segments" % (
+        name, elapsed, peak / 1e6, current / 1e6, num_segments))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the MPD parsers")
+    parser.add_argument("--size", type=float, default=50, help="Size of the generated manifest in MB")
+    parser.add_argument("--representations", type=int, default=10, help="Number of representations")
+    args = parser.parse_args()
+
+    mpd_content = generate_mpd(int(args.size * 1e6), args.representations)
+    print("Manifest: %.1f MB" % (len(mpd_content) / 1e6))
+    # The manifest itself is allocated before the measures, and it is not counted in the peaks
+    measure("DefaultMPDParser", DefaultMPDParser(), mpd_content)
+    measure("StreamingMPDParser", StreamingMPDParser(), mpd_content)
+    measure("StreamingMPDParser(keep_content=False)", StreamingMPDParser(keep_content=False), mpd_content)
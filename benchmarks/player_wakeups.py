@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Count the wakeups of the main loop of DASHPlayer and of the scheduler per hour of session, on a simulated session
+downloading from a synthetic origin at the rate of a throughput trace, compared with polling the buffer every
+update interval.
+
+Run from the root of the repository:
+    python3 -m benchmarks.player_wakeups
+"""
+
+import argparse
+import time
+
+from dash_emulator.abr import DashABRController
+from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.clock import VirtualClock
+from dash_emulator.mpd.parser import DefaultMPDParser
+from dash_emulator.mpd.providers import MPDProviderImpl
+from dash_emulator.origin import SyntheticOrigin
+from dash_emulator.player import DASHPlayer
+from dash_emulator.scheduler import SchedulerImpl
+from dash_emulator.trace_download import TraceDownloadManager, TraceLink
+from dash_emulator.traces import ThroughputTrace
+
+MPD_URL = "http://origin.local/videos/BBB/output.mpd"
+
+
+class PollingScheduler(SchedulerImpl):
+    """
+    Check the full buffer every update interval, ignoring the playback notifications
+    """
+
+    def notify_playback(self, position, rate):
+        pass
+
+
+def generate_mpd(num_segments, segment_duration, bandwidths):
+    representations = "".join("""
+            <Representation id="%d" mimeType="video/mp4" codecs="avc1" bandwidth="%d" width="1280" height="720">
+                <SegmentTemplate timescale="1000" initialization="init-$RepresentationID$.m4s"
+                    media="chunk-$RepresentationID$-$Number%%05d$.m4s" startNumber="1">
+                    <SegmentTimeline>
+                        <S t="0" d="%d" r="%d" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>""" % (i, bw, segment_duration * 1000, num_segments - 1) for i, bw in enumerate(bandwidths))
+    return """<?xml version="1.0" encoding="utf-8"?>
+    <MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT%dS"
+        maxSegmentDuration="PT%dS" minBufferTime="PT2S">
+        <Period id="0">
+            <AdaptationSet id="0" contentType="video" maxWidth="1280" maxHeight="720">%s
+            </AdaptationSet>
+        </Period>
+    </MPD>""" % (num_segments * segment_duration, segment_duration, representations)
+
+
+def run_session(duration, segment_duration, update_interval, scheduler_class):
+    clock = VirtualClock()
+    origin = SyntheticOrigin()
+    origin.add_mpd_content(MPD_URL, generate_mpd(duration // segment_duration, segment_duration,
+                                                 [4000000, 2000000, 1000000, 400000]))
+    trace = ThroughputTrace([30, 30, 30, 30], [5000000, 1500000, 800000, 3000000])
+
+    link = TraceLink(trace, clock)
+    buffer_manager = BufferManagerImpl()
+    mpd_provider = MPDProviderImpl(DefaultMPDParser(), update_interval, TraceDownloadManager([], link, origin, clock),
+                                   clock=clock)
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([bandwidth_meter], link, origin, clock, 40960)
+    abr_controller = DashABRController(2, 4, bandwidth_meter, buffer_manager, mpd_provider)
+    scheduler = scheduler_class(20, update_interval, download_manager, bandwidth_meter, buffer_manager, abr_controller,
+                                [], clock=clock)
+    player = DASHPlayer(update_interval, min_rebuffer_duration=1, min_start_buffer_duration=2,
+                        buffer_manager=buffer_manager, mpd_provider=mpd_provider, scheduler=scheduler, listeners=[],
+                        clock=clock)
+
+    wall_start = time.perf_counter()
+    clock.run(player.start(MPD_URL))
+    wall = time.perf_counter() - wall_start
+    simulated = clock.time()
+    clock.close()
+    return player.wakeups, scheduler.wakeups, simulated, wall
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the wakeups of the main loop of the player")
+    parser.add_argument("--duration", type=int, default=1800, help="Duration of the content in seconds")
+    parser.add_argument("--segment-duration", type=int, default=4, help="Duration of the segments in seconds")
+    parser.add_argument("--update-interval", type=float, default=0.05, help="Update interval of the player")
+    args = parser.parse_args()
+
+    print("%-36s %10.0f wakeups/session-hour" % ("Player polling", 3600 / args.update_interval))
+    for name, scheduler_class in [("Polling scheduler", PollingScheduler), ("Draining scheduler", SchedulerImpl)]:
+        player_wakeups, scheduler_wakeups, simulated, wall = run_session(args.duration, args.segment_duration,
+                                                                         args.update_interval, scheduler_class)
+        print("%s, %.0f s simulated in %.2f s" % (name, simulated, wall))
+        print("    %-32s %10.0f wakeups/session-hour" % ("Event-driven player", player_wakeups * 3600 / simulated))
+        print("    %-32s %10.0f wakeups/session-hour" % ("Scheduler with a full buffer",
+                                                          scheduler_wakeups * 3600 / simulated))
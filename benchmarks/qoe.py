@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measure the cost of keeping the QoE metrics of a session up to date with QoEMonitor,
+compared with storing every event and recomputing the metrics for each snapshot.
+
+Run from the root of the repository:
+    python3 -m benchmarks.qoe
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from dash_emulator.models import State
+from dash_emulator.qoe import QoEMonitor
+
+
+class StoringMonitor(object):
+    """
+    Store every event, and recompute the metrics for each snapshot
+    """
+
+    def __init__(self):
+        self.states = []
+        self.buffer_levels = []
+
+    async def on_state_change(self, position, old_state, new_state):
+        self.states.append((time.time(), old_state, new_state))
+
+    async def on_buffer_level_change(self, buffer_level):
+        self.buffer_levels.append(buffer_level)
+
+    def snapshot(self):
+        stall_time = 0.0
+        num_stalls = 0
+        for (start, old_state, new_state), (end, _, _) in zip(self.states, self.states[1:]):
+            if old_state == State.READY and new_state == State.BUFFERING:
+                num_stalls += 1
+                stall_time += end - start
+        return {"num_stalls": num_stalls, "stall_time": stall_time,
+                "buffer_level_quantiles": dict(zip((0.05, 0.5, 0.95),
+                                                   np.quantile(self.buffer_levels, (0.05, 0.5, 0.95))))}
+
+
+async def feed(monitor, events, snapshot_every):
+    for i, (is_state, value) in enumerate(events):
+        if is_state:
+            await monitor.on_state_change(value, State.READY, State.BUFFERING)
+            await monitor.on_state_change(value, State.BUFFERING, State.READY)
+        else:
+            await monitor.on_buffer_level_change(value)
+        if i % snapshot_every == 0:
+            monitor.snapshot()
+
+
+def measure(name, monitor_class, events, snapshot_every, traced_events):
+    monitor = monitor_class()
+    start = time.perf_counter()
+    asyncio.run(feed(monitor, events, snapshot_every))
+    elapsed = time.perf_counter() - start
+    quantiles = monitor.snapshot()["buffer_level_quantiles"]
+
+    # Tracing the allocations slows everything down, the memory is measured over fewer events
+    tracemalloc.start()
+    traced_monitor = monitor_class()
+    asyncio.run(feed(traced_monitor, events[:traced_events], snapshot_every))
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-16s %6.2f s, %8.3f MB retained after %d events, buffer level quantiles %s" % (
+        name, elapsed, retained / 1e6, traced_events,
+        ", ".join("%.2f: %.3f" % (p, value) for p, value in quantiles.items())))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the QoE metrics")
+    parser.add_argument("--events", type=int, default=1000000, help="Number of events")
+    parser.add_argument("--snapshot-every", type=int, default=1000, help="Number of events between two snapshots")
+    args = parser.parse_args()
+
+    random.seed(0)
+    events = [(random.random() < 0.001, random.random() * 30) for _ in range(args.events)]
+    traced_events = min(args.events, 100000)
+    measure("Store events", StoringMonitor, events, args.snapshot_every, traced_events)
+    measure("QoEMonitor", QoEMonitor, events, args.snapshot_every, traced_events)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
+import bisect
 import logging
-from typing import Dict, Optional
+from typing import Dict, Optional, List, Iterable
 
 from dash_emulator.bandwidth import BandwidthMeter
 from dash_emulator.buffer import BufferManager
@@ -27,6 +28,66 @@ class ABRController(ABC):
         """
         pass
 
+    def update_track_selection(self, adaptation_sets: Dict[int, AdaptationSet], adaptation_set_id: int) -> int:
+        """
+        Update the representation selection of one adaptation set, when the adaptation sets are scheduled
+        independently. The selections of the other adaptation sets are left as they are.
+
+        Parameters
+        ----------
+        adaptation_sets: Dict[int, AdaptationSet]
+            The adaptation sets information
+        adaptation_set_id: int
+            The id of the adaptation set to update
+
+        Returns
+        -------
+        selection: int
+            The chosen representation id for the adaptation set
+        """
+        return self.update_selection(adaptation_sets)[adaptation_set_id]
+
+
+class BitrateLadder(object):
+    __slots__ = ("bandwidths", "ids")
+
+    def __init__(self, adaptation_set: AdaptationSet):
+        """
+        The representations of an adaptation set sorted by bandwidth, to choose one by bisection.
+        Among the representations of the same bandwidth, the first one of the adaptation set is chosen.
+
+        Parameters
+        ----------
+        adaptation_set: AdaptationSet
+            The adaptation set to index
+        """
+        representations = list(adaptation_set.representations.values())
+        order = sorted(range(len(representations)), key=lambda i: (representations[i].bandwidth, -i))
+        self.bandwidths: List[int] = [representations[i].bandwidth for i in order]
+        """
+        The bandwidths of the representations in ascending order
+        """
+
+        self.ids: List[int] = [representations[i].id for i in order]
+        """
+        The ids of the representations, in the same order as the bandwidths
+        """
+
+    def choose(self, bw) -> int:
+        """
+        Parameters
+        ----------
+        bw
+            The bandwidth could be allocated to the adaptation set
+
+        Returns
+        -------
+        id: int
+            The id of the representation with the highest bandwidth lower than bw,
+            or the lowest one if there's no such representation
+        """
+        return self.ids[max(bisect.bisect_left(self.bandwidths, bw) - 1, 0)]
+
 
 class DashABRController(ABRController):
     log = logging.getLogger("DashABRController")
@@ -48,6 +109,8 @@ class DashABRController(ABRController):
             A bandwidth meter which could provide the latest bandwidth estimate
         buffer_manager : BufferManager
             A buffer manager which could provide the buffer level estimate
+        mpd_provider: MPDProvider
+            The MPD provider. The bitrate ladders are built again when it delivers a new version of the MPD file.
         """
         self.panic_buffer = panic_buffer
         self.safe_buffer = safe_buffer
@@ -55,7 +118,17 @@ class DashABRController(ABRController):
         self.buffer_manager = buffer_manager
         self.mpd_provider = mpd_provider
 
-        self._last_selections: Optional[Dict[int, int]] = None
+        # The latest selection of each adaptation set
+        self._last_selections: Dict[int, int] = {}
+
+        # The bitrate ladders of the adaptation sets, and the number of video and audio adaptation sets
+        self._ladders: Dict[int, BitrateLadder] = {}
+        self._num_videos = 0
+        self._num_audios = 0
+        # The MPD version and the adaptation sets the ladders were built from. The adaptation sets are kept
+        # and compared by identity, an id() could be reused by other adaptation sets once they are freed.
+        self._ladders_version: Optional[int] = None
+        self._ladders_adaptation_sets: Optional[Dict[int, AdaptationSet]] = None
 
     @staticmethod
     def choose_ideal_selection(adaptation_set, bw) -> int:
@@ -73,75 +146,98 @@ class DashABRController(ABRController):
         id: int
             The representation id
         """
-        representations = sorted(adaptation_set.representations.values(), key=lambda x: x.bandwidth, reverse=True)
-        representation = None
-        for representation in representations:
-            if representation.bandwidth < bw:
-                return representation.id
-        # If there's no representation whose bitrate is lower than the estimate, return the lowest one
-        return representation.id
+        return BitrateLadder(adaptation_set).choose(bw)
+
+    def _update_ladders(self, adaptation_sets: Dict[int, AdaptationSet]):
+        """
+        Build the bitrate ladders again if the MPD provider has delivered a new version of the MPD file,
+        or if the adaptation sets are not the ones the ladders were built from
+        """
+        version = self.mpd_provider.version
+        if version == self._ladders_version and adaptation_sets is self._ladders_adaptation_sets:
+            return
+        self._ladders = {adaptation_set.id: BitrateLadder(adaptation_set)
+                         for adaptation_set in adaptation_sets.values()}
+        # Count the number of video adaptation sets and audio adaptation sets
+        self._num_videos = sum(1 for adaptation_set in adaptation_sets.values()
+                               if adaptation_set.content_type == "video")
+        self._num_audios = len(adaptation_sets) - self._num_videos
+        self._ladders_version = version
+        self._ladders_adaptation_sets = adaptation_sets
+        self.log.debug("Bitrate ladders built for MPD version %d", version)
 
     def update_selection(self, adaptation_sets: Dict[int, AdaptationSet]) -> Dict[int, int]:
+        return self._update_selections(adaptation_sets, adaptation_sets.keys())
+
+    def update_track_selection(self, adaptation_sets: Dict[int, AdaptationSet], adaptation_set_id: int) -> int:
+        return self._update_selections(adaptation_sets, (adaptation_set_id,))[adaptation_set_id]
+
+    def _update_selections(self, adaptation_sets: Dict[int, AdaptationSet],
+                           adaptation_set_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Update the selections of some adaptation sets. The bandwidth is shared among all the adaptation sets,
+        and the selection of each one is compared with its own latest selection.
+        """
         # Only use 70% of measured bandwidth
         available_bandwidth = int(self.bandwidth_meter.bandwidth * 0.7)
 
-        # Count the number of video adaptation sets and audio adaptation sets
-        num_videos = 0
-        num_audios = 0
-        for adaptation_set in adaptation_sets.values():
-            if adaptation_set.content_type == "video":
-                num_videos += 1
-            else:
-                num_audios += 1
+        self._update_ladders(adaptation_sets)
+        ladders = self._ladders
+        num_videos = self._num_videos
+        num_audios = self._num_audios
 
         # Calculate ideal selections
+        ideal_selection: Dict[int, int] = dict()
         if num_videos == 0 or num_audios == 0:
             bw_per_adaptation_set = available_bandwidth / (num_videos + num_audios)
-            ideal_selection: Dict[int, int] = dict()
-            for adaptation_set in adaptation_sets.values():
-                ideal_selection[adaptation_set.id] = self.choose_ideal_selection(adaptation_set, bw_per_adaptation_set)
+            for id_ in adaptation_set_ids:
+                ideal_selection[id_] = ladders[id_].choose(bw_per_adaptation_set)
         else:
             bw_per_video = (available_bandwidth * 0.8) / num_videos
             bw_per_audio = (available_bandwidth * 0.2) / num_audios
-            ideal_selection: Dict[int, int] = dict()
-            for adaptation_set in adaptation_sets.values():
-                if adaptation_set.content_type == "video":
-                    ideal_selection[adaptation_set.id] = self.choose_ideal_selection(adaptation_set, bw_per_video)
+            for id_ in adaptation_set_ids:
+                if adaptation_sets[id_].content_type == "video":
+                    ideal_selection[id_] = ladders[id_].choose(bw_per_video)
                 else:
-                    ideal_selection[adaptation_set.id] = self.choose_ideal_selection(adaptation_set, bw_per_audio)
+                    ideal_selection[id_] = ladders[id_].choose(bw_per_audio)
 
         buffer_level = self.buffer_manager.buffer_level
         final_selections = dict()
-        self.log.info(f"Ideal selection at {self.bandwidth_meter.bandwidth} is {ideal_selection}")
+        # The messages are only formatted when they are logged, the decisions are made at a high rate offline
+        self.log.info("Ideal selection at %s is %s", self.bandwidth_meter.bandwidth, ideal_selection)
 
         # Take the buffer level into considerations
-        if self._last_selections is not None:
-            for id_, adaptation_set in adaptation_sets.items():
-                representations = adaptation_set.representations
-                last_repr = representations[self._last_selections.get(id_)]
-                ideal_repr = representations[ideal_selection.get(id_)]
-                self.log.info(f"buffer_level={buffer_level}, panic_buffer={self.panic_buffer}")
-                if buffer_level < self.panic_buffer:
-                    final_repr_id = last_repr.id if last_repr.bandwidth < ideal_repr.bandwidth else ideal_repr.id
-                elif buffer_level > self.safe_buffer:
-                    if last_repr.bandwidth > ideal_repr.bandwidth:
-                        if adaptation_set.content_type == "video":
-                            bw_per_video = (available_bandwidth * 0.8) / num_videos
-                            next_segment_download_time = (last_repr.bandwidth+ideal_repr.bandwidth)*(self.mpd_provider.mpd.max_segment_duration/bw_per_video)
-                            self.log.info(f"bw_per_video={bw_per_video}, last_repr.bandwidth={last_repr.bandwidth}, next_segment_download_time={next_segment_download_time}, buffer_level={buffer_level}")
-                        else:
-                            bw_per_audio = (available_bandwidth * 0.2) / num_audios
-                            next_segment_download_time = (last_repr.bandwidth+ideal_repr.bandwidth)*(self.mpd_provider.mpd.max_segment_duration/bw_per_audio)
-                        if next_segment_download_time <= buffer_level:
-                            final_repr_id = last_repr.id
-                        else:
-                            final_repr_id = ideal_repr.id
+        for id_, ideal_repr_id in ideal_selection.items():
+            last_repr_id = self._last_selections.get(id_)
+            if last_repr_id is None:
+                final_selections[id_] = ideal_repr_id
+                continue
+            adaptation_set = adaptation_sets[id_]
+            representations = adaptation_set.representations
+            last_repr = representations[last_repr_id]
+            ideal_repr = representations[ideal_repr_id]
+            self.log.info("buffer_level=%s, panic_buffer=%s", buffer_level, self.panic_buffer)
+            if buffer_level < self.panic_buffer:
+                final_repr_id = last_repr.id if last_repr.bandwidth < ideal_repr.bandwidth else ideal_repr.id
+            elif buffer_level > self.safe_buffer:
+                if last_repr.bandwidth > ideal_repr.bandwidth:
+                    if adaptation_set.content_type == "video":
+                        bw_per_video = (available_bandwidth * 0.8) / num_videos
+                        next_segment_download_time = (last_repr.bandwidth+ideal_repr.bandwidth)*(self.mpd_provider.mpd.max_segment_duration/bw_per_video)
+                        self.log.info("bw_per_video=%s, last_repr.bandwidth=%s, next_segment_download_time=%s, "
+                                      "buffer_level=%s", bw_per_video, last_repr.bandwidth,
+                                      next_segment_download_time, buffer_level)
+                    else:
+                        bw_per_audio = (available_bandwidth * 0.2) / num_audios
+                        next_segment_download_time = (last_repr.bandwidth+ideal_repr.bandwidth)*(self.mpd_provider.mpd.max_segment_duration/bw_per_audio)
+                    if next_segment_download_time <= buffer_level:
+                        final_repr_id = last_repr.id
                     else:
                         final_repr_id = ideal_repr.id
                 else:
                     final_repr_id = ideal_repr.id
-                final_selections[id_] = final_repr_id
-        else:
-            final_selections = ideal_selection
-        self._last_selections = final_selections
+            else:
+                final_repr_id = ideal_repr.id
+            final_selections[id_] = final_repr_id
+        self._last_selections.update(final_selections)
         return final_selections
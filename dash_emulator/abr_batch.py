@@ -0,0 +1,357 @@
+import logging
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from dash_emulator.abr import BitrateLadder
+from dash_emulator.models import AdaptationSet, MPD
+from dash_emulator.traces import ThroughputTrace
+
+
+class TraceBatch(object):
+    def __init__(self, traces: Sequence[ThroughputTrace]):
+        """
+        A batch of throughput traces in padded arrays, to compute the transfer times of many sessions at once.
+        It gives the same results as ThroughputTrace.transfer_time, each trace still repeats itself.
+
+        Parameters
+        ----------
+        traces: Sequence[ThroughputTrace]
+            The traces of the batch
+        """
+        num_traces = len(traces)
+        width = max(len(trace.durations) for trace in traces)
+        self.lengths = np.array([len(trace.durations) for trace in traces], dtype=np.int64)
+        self.periods = np.array([trace.period for trace in traces], dtype=np.float64)
+        self.bits_per_period = np.array([trace.bits_per_period for trace in traces], dtype=np.float64)
+
+        # The end time, the cumulative bits at the end and the bandwidth of each interval, padded with the last one
+        self._ends = np.empty((num_traces, width), dtype=np.float64)
+        self._cum_bits = np.empty((num_traces, width), dtype=np.float64)
+        self._bandwidths = np.empty((num_traces, width), dtype=np.float64)
+        for row, trace in enumerate(traces):
+            length = len(trace.durations)
+            self._ends[row, :length] = np.cumsum(trace.durations)
+            self._cum_bits[row, :length] = np.cumsum(np.array(trace.durations) * np.array(trace.bandwidths))
+            self._bandwidths[row, :length] = trace.bandwidths
+            self._ends[row, length:] = self._ends[row, length - 1]
+            self._cum_bits[row, length:] = self._cum_bits[row, length - 1]
+            self._bandwidths[row, length:] = trace.bandwidths[-1]
+
+        # The rows are normalized to [0, 1] and shifted by 2 * row, so that one sorted array can be searched
+        # for all the traces at once
+        offsets = 2.0 * np.arange(num_traces)[:, None]
+        self._width = width
+        self._flat_ends = (self._ends / self.periods[:, None] + offsets).ravel()
+        self._flat_cum_bits = (self._cum_bits / self.bits_per_period[:, None] + offsets).ravel()
+
+    def __len__(self):
+        return len(self.periods)
+
+    def _interval_before(self, values: np.ndarray, rows: np.ndarray, i: np.ndarray) -> np.ndarray:
+        """
+        The values at the end of the intervals before the intervals i, 0 for the first intervals
+        """
+        return np.where(i > 0, values[rows, np.maximum(i - 1, 0)], 0.0)
+
+    def bits_until(self, rows: np.ndarray, t: np.ndarray) -> np.ndarray:
+        """
+        Parameters
+        ----------
+        rows: np.ndarray
+            The trace of each session
+        t: np.ndarray
+            The time since the start of the trace of each session, in seconds
+
+        Returns
+        -------
+        bits: np.ndarray
+            The bits delivered from the start of the traces until the times t
+        """
+        periods, t = np.divmod(t, self.periods[rows])
+        i = np.searchsorted(self._flat_ends, t / self.periods[rows] + 2.0 * rows, side="right") - rows * self._width
+        i = np.minimum(i, self.lengths[rows] - 1)
+        interval_start = self._interval_before(self._ends, rows, i)
+        bits_before = self._interval_before(self._cum_bits, rows, i)
+        return periods * self.bits_per_period[rows] + bits_before + (t - interval_start) * self._bandwidths[rows, i]
+
+    def transfer_time(self, rows: np.ndarray, start: np.ndarray, bits: np.ndarray) -> np.ndarray:
+        """
+        Parameters
+        ----------
+        rows: np.ndarray
+            The trace of each session
+        start: np.ndarray
+            The time since the start of the trace when each transfer starts, in seconds
+        bits: np.ndarray
+            The number of bits to deliver in each session
+
+        Returns
+        -------
+        duration: np.ndarray
+            The time needed to deliver all the bits, in seconds
+        """
+        bits_per_period = self.bits_per_period[rows]
+        target = self.bits_until(rows, start) + bits
+        periods, remaining = np.divmod(target, bits_per_period)
+        # The last bit arrives in the previous period
+        previous = remaining <= 0
+        periods = np.where(previous, periods - 1, periods)
+        remaining = np.where(previous, bits_per_period, remaining)
+        i = np.searchsorted(self._flat_cum_bits, remaining / bits_per_period + 2.0 * rows, side="left")
+        i = np.clip(i - rows * self._width, 0, self.lengths[rows] - 1)
+        interval_start = self._interval_before(self._ends, rows, i)
+        bits_before = self._interval_before(self._cum_bits, rows, i)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            end = periods * self.periods[rows] + interval_start + (remaining - bits_before) / self._bandwidths[rows, i]
+        return np.where(bits > 0, np.maximum(end - start, 0.0), 0.0)
+
+
+class BatchResult(object):
+    def __init__(self, num_sessions: int):
+        """
+        The QoE summaries of a batch of sessions. Each attribute is an array with one value per session.
+        """
+        self.trace_index = np.zeros(num_sessions, dtype=np.int64)
+        """
+        The index of the trace of each session
+        """
+
+        self.panic_buffer = np.zeros(num_sessions)
+        """
+        The panic buffer of each session, in seconds
+        """
+
+        self.safe_buffer = np.zeros(num_sessions)
+        """
+        The safe buffer of each session, in seconds
+        """
+
+        self.average_bitrate = np.zeros(num_sessions)
+        """
+        The average bitrate of the downloaded segments of all the adaptation sets, weighted by their durations, in bps
+        """
+
+        self.num_switches = np.zeros(num_sessions, dtype=np.int64)
+        """
+        The number of representation switches of all the adaptation sets
+        """
+
+        self.stall_time = np.zeros(num_sessions)
+        """
+        The total duration of the stalls after the playback started, in seconds
+        """
+
+        self.num_stalls = np.zeros(num_sessions, dtype=np.int64)
+        """
+        The number of stalls after the playback started
+        """
+
+        self.startup_delay = np.zeros(num_sessions)
+        """
+        The time from the first request to the start of the playback, in seconds
+        """
+
+        self.selections: Dict[int, np.ndarray] = {}
+        """
+        The representation id chosen for each segment, by adaptation set id, if the evaluator was asked to keep them.
+        Each array has a shape of (number of sessions, number of segments).
+        """
+
+    def __len__(self):
+        return len(self.trace_index)
+
+
+class BatchABREvaluator(object):
+    log = logging.getLogger("BatchABREvaluator")
+
+    def __init__(self, adaptation_sets: Dict[int, AdaptationSet], segment_durations: Sequence[float],
+                 max_segment_duration: float, init_bandwidth: float = 1000000, smooth_factor: float = 0,
+                 max_buffer_duration: float = 5, min_start_buffer_duration: float = 2,
+                 min_rebuffer_duration: float = 1):
+        """
+        Simulate the logic of DashABRController over many throughput traces and parameters at once.
+        The sessions are simulated segment by segment, and each step is computed for all the sessions with
+        array operations.
+
+        The model of a session is simpler than the emulator:
+        the segments of all the adaptation sets are downloaded as one transfer, the bandwidth estimate is updated
+        once per segment index with the throughput of that transfer, the initialization segments are ignored,
+        and the scheduler waits exactly until the buffer level goes down to the max buffer duration.
+
+        Parameters
+        ----------
+        adaptation_sets: Dict[int, AdaptationSet]
+            The adaptation sets of the manifest
+        segment_durations: Sequence[float]
+            The duration of each segment, in seconds
+        max_segment_duration: float
+            The max segment duration of the manifest, in seconds
+        init_bandwidth: float
+            The initial bandwidth estimate in bps
+        smooth_factor: float
+            The smooth factor of the bandwidth estimate
+        max_buffer_duration: float
+            The scheduler doesn't download any segment when the buffer level is higher than this, in seconds
+        min_start_buffer_duration: float
+            The playback starts once the buffer level is higher than this, in seconds
+        min_rebuffer_duration: float
+            The playback resumes after a stall once the buffer level is higher than this, in seconds
+        """
+        self.adaptation_set_ids: List[int] = [adaptation_set.id for adaptation_set in adaptation_sets.values()]
+        self.ladders: List[BitrateLadder] = [BitrateLadder(adaptation_set)
+                                             for adaptation_set in adaptation_sets.values()]
+        self.is_video = np.array([adaptation_set.content_type == "video"
+                                  for adaptation_set in adaptation_sets.values()])
+        self.segment_durations = np.asarray(segment_durations, dtype=np.float64)
+        self.max_segment_duration = max_segment_duration
+        self.init_bandwidth = init_bandwidth
+        self.smooth_factor = smooth_factor
+        self.max_buffer_duration = max_buffer_duration
+        self.min_start_buffer_duration = min_start_buffer_duration
+        self.min_rebuffer_duration = min_rebuffer_duration
+
+        # The share of the available bandwidth of each adaptation set
+        num_videos = int(self.is_video.sum())
+        num_audios = len(self.ladders) - num_videos
+        if num_videos == 0 or num_audios == 0:
+            self.shares = np.full(len(self.ladders), 1 / len(self.ladders))
+        else:
+            self.shares = np.where(self.is_video, 0.8 / num_videos, 0.2 / num_audios)
+        # DashABRController always splits the bandwidth 80/20 when it estimates the download time of a segment
+        self.safe_shares = np.where(self.is_video, 0.8 / max(num_videos, 1), 0.2 / max(num_audios, 1))
+
+    @staticmethod
+    def from_mpd(mpd: MPD, max_segments: int = None, **kwargs) -> 'BatchABREvaluator':
+        """
+        Parameters
+        ----------
+        mpd: MPD
+            The parsed manifest. The segment durations are taken from its first representation.
+        max_segments: int, optional
+            Only simulate the first segments
+        kwargs
+            The other arguments of BatchABREvaluator
+
+        Returns
+        -------
+        evaluator: BatchABREvaluator
+        """
+        adaptation_set = next(iter(mpd.adaptation_sets.values()))
+        segments = next(iter(adaptation_set.representations.values())).segments
+        if max_segments is not None:
+            segments = segments[:max_segments]
+        return BatchABREvaluator(mpd.adaptation_sets, [segment.duration for segment in segments],
+                                 mpd.max_segment_duration, **kwargs)
+
+    def evaluate(self, traces: Sequence[ThroughputTrace], panic_buffers: Sequence[float],
+                 safe_buffers: Sequence[float], keep_selections: bool = False) -> BatchResult:
+        """
+        Simulate one session for each combination of a trace, a panic buffer and a safe buffer
+
+        Parameters
+        ----------
+        traces: Sequence[ThroughputTrace]
+            The throughput traces
+        panic_buffers: Sequence[float]
+            The panic buffers to evaluate, in seconds
+        safe_buffers: Sequence[float]
+            The safe buffers to evaluate, in seconds
+        keep_selections: bool
+            Keep the representation chosen for each segment of each session in the result
+
+        Returns
+        -------
+        result: BatchResult
+            The QoE summaries, the sessions are ordered by trace, then by panic buffer, then by safe buffer
+        """
+        trace_batch = TraceBatch(traces)
+        rows, panic, safe = (a.ravel() for a in np.meshgrid(
+            np.arange(len(traces)), np.asarray(panic_buffers, dtype=np.float64),
+            np.asarray(safe_buffers, dtype=np.float64), indexing="ij"))
+        num_sessions = len(rows)
+        num_segments = len(self.segment_durations)
+        ladders = [np.array(ladder.bandwidths, dtype=np.float64) for ladder in self.ladders]
+        ids = [np.array(ladder.ids, dtype=np.int64) for ladder in self.ladders]
+
+        result = BatchResult(num_sessions)
+        result.trace_index = rows
+        result.panic_buffer = panic
+        result.safe_buffer = safe
+        selections = [np.empty((num_sessions, num_segments if keep_selections else 0), dtype=np.int64)
+                      for _ in self.ladders]
+
+        now = np.zeros(num_sessions)
+        buffer_level = np.zeros(num_sessions)
+        bandwidth = np.full(num_sessions, float(self.init_bandwidth))
+        playing = np.zeros(num_sessions, dtype=bool)
+        started = np.zeros(num_sessions, dtype=bool)
+        last = [None] * len(self.ladders)
+        total_bits = np.zeros(num_sessions)
+
+        for index in range(num_segments):
+            duration = self.segment_durations[index]
+
+            # The scheduler waits while the buffer level is higher than the max buffer duration
+            wait = np.where(playing, np.maximum(buffer_level - self.max_buffer_duration, 0.0), 0.0)
+            now += wait
+            buffer_level -= wait
+
+            # Only use 70% of measured bandwidth
+            available_bandwidth = np.floor(bandwidth * 0.7)
+            bits = np.zeros(num_sessions)
+            for a, ladder in enumerate(ladders):
+                share = available_bandwidth * self.shares[a]
+                ideal = np.maximum(np.searchsorted(ladder, share, side="left") - 1, 0)
+                if last[a] is None:
+                    chosen = ideal
+                else:
+                    last_bw = ladder[last[a]]
+                    ideal_bw = ladder[ideal]
+                    is_panic = buffer_level < panic
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        download_time = (last_bw + ideal_bw) * \
+                                        (self.max_segment_duration / (available_bandwidth * self.safe_shares[a]))
+                    keep_last = np.where(is_panic, last_bw < ideal_bw,
+                                         (buffer_level > safe) & (last_bw > ideal_bw) & (download_time <= buffer_level))
+                    chosen = np.where(keep_last, last[a], ideal)
+                    result.num_switches += chosen != last[a]
+                last[a] = chosen
+                if keep_selections:
+                    selections[a][:, index] = ids[a][chosen]
+                bits += ladder[chosen] * duration
+
+            download_time = trace_batch.transfer_time(rows, now, bits)
+            now += download_time
+            total_bits += bits
+            with np.errstate(divide="ignore", invalid="ignore"):
+                measured = np.where(download_time > 0, bits / download_time, bandwidth)
+            bandwidth = bandwidth * self.smooth_factor + measured * (1 - self.smooth_factor)
+
+            # The buffer drains during the download when the playback is running
+            stalled = playing & (download_time > buffer_level)
+            result.stall_time += np.where(stalled, download_time - buffer_level, 0.0)
+            result.num_stalls += stalled
+            buffer_level = np.where(playing, np.maximum(buffer_level - download_time, 0.0), buffer_level)
+            playing &= ~stalled
+            # While rebuffering, the time is counted as a stall too
+            rebuffering = started & ~playing & ~stalled
+            result.stall_time += np.where(rebuffering, download_time, 0.0)
+
+            buffer_level += duration
+            threshold = np.where(started, self.min_rebuffer_duration, self.min_start_buffer_duration)
+            # Like DASHPlayer, the buffer level must exceed the threshold
+            resume = ~playing & (buffer_level > threshold)
+            result.startup_delay = np.where(resume & ~started, now, result.startup_delay)
+            playing |= resume
+            started |= resume
+
+        # The sessions which never started wait until the last segment is downloaded
+        result.startup_delay = np.where(started, result.startup_delay, now)
+        total_duration = self.segment_durations.sum()
+        result.average_bitrate = total_bits / total_duration if total_duration > 0 else total_bits
+        if keep_selections:
+            result.selections = {adaptation_set_id: selection
+                                 for adaptation_set_id, selection in zip(self.adaptation_set_ids, selections)}
+        self.log.info("Evaluated %d sessions of %d segments" % (num_sessions, num_segments))
+        return result
@@ -1,9 +1,9 @@
 import logging
-import operator
-import time
 from abc import ABC, abstractmethod
-from typing import List
+from collections import deque
+from typing import List, Deque, Tuple, Optional
 
+from dash_emulator.clock import Clock, SystemClock
 from dash_emulator.download import DownloadEventListener
 
 
@@ -59,11 +59,16 @@ class BandwidthMeterImpl(BandwidthMeter, DownloadEventListener):
 
     def __init__(self, init_bandwidth: int, smooth_factor: float,
                  bandwidth_update_listeners: List[BandwidthUpdateListener],
-                 cont_bw_window: int = 1, max_packet_delay: float = 10):
+                 cont_bw_window: int = 1, max_packet_delay: float = 10, clock: Clock = None,
+                 min_cont_bw_samples: int = 2, max_cont_bw_samples: int = 65536,
+                 cont_bw_update_interval: float = 0, cont_bw_update_bytes: int = 0):
         """
         The formula to estimate the bandwidth is
             bandwidth = last_bandwidth * smooth_factor + latest_bandwidth * (1-smooth_factor)
 
+        Overlapping transmissions are measured together: the latest bandwidth is estimated when the last
+        running transmission ends, from all the bytes received since the first one started.
+
         Parameters
         ----------
         init_bandwidth: int
@@ -72,6 +77,23 @@ class BandwidthMeterImpl(BandwidthMeter, DownloadEventListener):
             The smooth factor in use.
         bandwidth_update_listeners: List[BandwidthUpdateListener]
             A list of bandwidth update listeners
+        cont_bw_window: int
+            The length of the window of the continuous bandwidth estimate, in seconds
+        clock: Clock
+            The clock to timestamp the transmissions
+        min_cont_bw_samples: int
+            The minimum number of chunks in the window of the continuous bandwidth estimate
+        max_cont_bw_samples: int
+            The maximum number of chunks kept in the window of the continuous bandwidth estimate.
+            The oldest chunks are dropped first when there are too many chunks in the window.
+        cont_bw_update_interval: float
+            If it is greater than 0, the listeners get the continuous bandwidth estimate at most once
+            every cont_bw_update_interval seconds, unless cont_bw_update_bytes are reached first.
+            Every chunk is still measured. The listeners are updated after every chunk if both are 0.
+        cont_bw_update_bytes: int
+            If it is greater than 0, the listeners get the continuous bandwidth estimate once at least
+            cont_bw_update_bytes bytes are received, unless cont_bw_update_interval is reached first.
+            The pending estimate is always sent at the end or the cancellation of a transfer.
         """
         self.last_byte_at = 0
         self._bw = init_bandwidth
@@ -83,23 +105,36 @@ class BandwidthMeterImpl(BandwidthMeter, DownloadEventListener):
         self.transmission_end_time = None
         self.extra_stats = {}
         self.first_byte_in_segment = True
-        self._cont_bw = []
         self.cont_bw_window = cont_bw_window
+        self.min_cont_bw_samples = min_cont_bw_samples
+        self._cont_bw: Deque[Tuple[float, float, int]] = deque(maxlen=max_cont_bw_samples)
+        self._cont_bw_bytes = 0
+        self._cont_bw_time = 0.0
         self.last_cont_bw = None
+        self.cont_bw_update_interval = cont_bw_update_interval
+        self.cont_bw_update_bytes = cont_bw_update_bytes
+        self._last_cont_bw_update: Optional[float] = None
+        # Whether the listeners haven't got the latest estimate yet, and the bytes received since they got one
+        self._cont_bw_pending = False
+        self._cont_bw_pending_bytes = 0
         self.max_packet_delay = max_packet_delay
         self.downloading_url = None
+        self.active_transmissions = 0
+        self.clock = clock if clock is not None else SystemClock()
 
     async def on_transfer_start(self, url) -> None:
-        self.transmission_start_time = time.time()
-        self.bytes_transferred = 0
-        self.first_byte_in_segment = True
+        if self.active_transmissions == 0:
+            self.transmission_start_time = self.clock.time()
+            self.bytes_transferred = 0
+            self.first_byte_in_segment = True
+        self.active_transmissions += 1
         self.downloading_url = url
         self.log.info("Transmission starts. URL: " + url)
 
     async def on_bytes_transferred(self, length: int, url: str, position: int, size: int, content) -> None:
         # if url == self.downloading_url:
         self.bytes_transferred += length
-        t = time.time()
+        t = self.clock.time()
         await self.update_cont_bw(length, t)
 
         # self.log.info(f"Transferred : {length} bytes")
@@ -108,7 +143,12 @@ class BandwidthMeterImpl(BandwidthMeter, DownloadEventListener):
         # self.last_byte_at = t
 
     async def on_transfer_end(self, size: int, url: str) -> None:
-        self.transmission_end_time = time.time()
+        if self._cont_bw_pending:
+            await self._send_cont_bw(self.clock.time())
+        self.active_transmissions = max(self.active_transmissions - 1, 0)
+        if self.active_transmissions > 0:
+            return
+        self.transmission_end_time = self.clock.time()
         self.update_bandwidth()
         self.bytes_transferred = 0
 
@@ -123,35 +163,67 @@ class BandwidthMeterImpl(BandwidthMeter, DownloadEventListener):
         return self._bw
 
     async def update_cont_bw(self, bytes_transferred: int, time_at: float):
-        min_values = 2
+        """
+        Update the continuous bandwidth estimate with one received chunk.
+        The estimate is the mean over the chunks received in the last ``cont_bw_window`` seconds,
+        and over at least the last ``min_cont_bw_samples`` chunks.
+        The window is kept in a bounded ring buffer with running sums, so each call costs O(1).
+        The listeners are updated at most once every ``cont_bw_update_interval`` seconds,
+        or once ``cont_bw_update_bytes`` are received, whichever comes first.
+        """
         if self.first_byte_in_segment:
             self.first_byte_in_segment = False
         else:
-            est_bw = 8*bytes_transferred/(time_at - self.last_byte_at)
-            # if est_bw < 10000000000:
-            # if self.max_packet_delay > (time_at - self.last_byte_at) > 0.001:
-            if True:
-                self._cont_bw.append((self.last_byte_at, time_at, bytes_transferred))
-                if len(self._cont_bw) >= min_values:
-                    window_start = time_at - self.cont_bw_window
-                    window_values = []
-                    for bw in self._cont_bw[::-1]:
-                        if bw[1] < window_start and len(window_values) >= min_values:
-                            break
-                        window_values.append(bw)
-                    # window = self._cont_bw[max(0, len(self._cont_bw)-self.rolling_mean_window):]
-                    total_bytes = sum(list(map(operator.itemgetter(2), window_values)))
-                    total_time = sum(list(map(lambda bw: (bw[1]-bw[0]), window_values)))
-                    window_mean = int(8*total_bytes/total_time)
-                    self.last_cont_bw = window_mean
+            self._append_cont_bw_sample(self.last_byte_at, time_at, bytes_transferred)
+            if len(self._cont_bw) >= self.min_cont_bw_samples and self._cont_bw_time > 0:
+                self.last_cont_bw = int(8 * self._cont_bw_bytes / self._cont_bw_time)
+        self.last_byte_at = time_at
+        if self.cont_bw_update_interval > 0 or self.cont_bw_update_bytes > 0:
+            self._cont_bw_pending = True
+            self._cont_bw_pending_bytes += bytes_transferred
+            if self._last_cont_bw_update is not None and \
+                    not (self.cont_bw_update_bytes > 0 and
+                         self._cont_bw_pending_bytes >= self.cont_bw_update_bytes) and \
+                    not (self.cont_bw_update_interval > 0 and
+                         time_at - self._last_cont_bw_update >= self.cont_bw_update_interval):
+                return
+        await self._send_cont_bw(time_at)
+
+    async def _send_cont_bw(self, time_at: float):
+        self._last_cont_bw_update = time_at
+        self._cont_bw_pending = False
+        self._cont_bw_pending_bytes = 0
         for listener in self.listeners:
             await listener.on_continuous_bw_update(self.last_cont_bw)
-        self.last_byte_at = time_at
 
+    def _append_cont_bw_sample(self, start: float, end: float, num_bytes: int):
+        if len(self._cont_bw) == self._cont_bw.maxlen:
+            self._pop_cont_bw_sample()
+        self._cont_bw.append((start, end, num_bytes))
+        self._cont_bw_bytes += num_bytes
+        self._cont_bw_time += end - start
+
+        # Samples ending before the window are dropped, as long as enough samples are left
+        window_start = end - self.cont_bw_window
+        while len(self._cont_bw) > self.min_cont_bw_samples and self._cont_bw[0][1] < window_start:
+            self._pop_cont_bw_sample()
+
+    def _pop_cont_bw_sample(self):
+        start, end, num_bytes = self._cont_bw.popleft()
+        self._cont_bw_bytes -= num_bytes
+        self._cont_bw_time -= end - start
+        if not self._cont_bw:
+            # Reset the sums to avoid accumulating rounding errors
+            self._cont_bw_time = 0.0
 
     def update_bandwidth(self):
+        elapsed = self.transmission_end_time - self.transmission_start_time
+        if elapsed <= 0:
+            # An empty or instant transfer, e.g. in simulated time, doesn't tell anything about the bandwidth
+            self.log.debug("Skip the bandwidth sample of a transfer taking no time")
+            return
         self._bw = self._bw * self.smooth_factor + \
-                   (8 * self.bytes_transferred) / (self.transmission_end_time - self.transmission_start_time) * \
+                   (8 * self.bytes_transferred) / elapsed * \
                    (1 - self.smooth_factor)
         if self.last_cont_bw is not None:
             self._bw = (self._bw + self.last_cont_bw)/2
@@ -1,4 +1,32 @@
 from abc import ABC, abstractmethod
+from typing import Dict, Optional, List, Set
+
+
+class BufferEventListener(ABC):
+    @abstractmethod
+    def on_buffer_enqueued(self, duration: float, adaptation_set_id: Optional[int]) -> None:
+        """
+        Called synchronously when some buffers are enqueued
+
+        Parameters
+        ----------
+        duration: float
+            The duration enqueued
+        adaptation_set_id: int, optional
+            The adaptation set whose buffer grows. None if the buffers of all adaptation sets grow together.
+        """
+        pass
+
+    def on_track_ended(self, adaptation_set_id: int) -> None:
+        """
+        Called synchronously when an adaptation set has no more segments, the buffer level may grow
+
+        Parameters
+        ----------
+        adaptation_set_id: int
+            The adaptation set which ended
+        """
+        pass
 
 
 class BufferManager(ABC):
@@ -9,12 +37,40 @@ class BufferManager(ABC):
         Returns
         -------
         buffer_level: float
-            Current buffer level in seconds
+            Current buffer level in seconds.
+            If the buffers of several adaptation sets are tracked, it is the lowest buffer level among the ones
+            which haven't ended, or the highest one once they have all ended.
+        """
+        pass
+
+    @property
+    @abstractmethod
+    def position(self) -> float:
+        """
+        Returns
+        -------
+        position: float
+            The position of the playback given by the latest update of the buffer, in seconds
+        """
+        pass
+
+    @abstractmethod
+    def track_buffer_level(self, adaptation_set_id: int) -> float:
+        """
+        Parameters
+        ----------
+        adaptation_set_id: int
+            The id of the adaptation set
+
+        Returns
+        -------
+        buffer_level: float
+            Current buffer level of one adaptation set in seconds
         """
         pass
 
     @abstractmethod
-    def enqueue_buffer(self, duration: float) -> None:
+    def enqueue_buffer(self, duration: float, adaptation_set_id: Optional[int] = None) -> None:
         """
         Enqueue some buffers into the buffer manager
 
@@ -22,6 +78,21 @@ class BufferManager(ABC):
         ----------
         duration: float
             The duration to enqueue
+        adaptation_set_id: int, optional
+            The adaptation set whose buffer grows. None if the buffers of all adaptation sets grow together.
+        """
+        pass
+
+    @abstractmethod
+    def track_ended(self, adaptation_set_id: int) -> None:
+        """
+        Tell the buffer manager that an adaptation set has no more segments.
+        Its buffer doesn't hold the buffer level back any more.
+
+        Parameters
+        ----------
+        adaptation_set_id: int
+            The adaptation set which ended
         """
         pass
 
@@ -37,18 +108,56 @@ class BufferManager(ABC):
         """
         pass
 
+    @abstractmethod
+    def add_listener(self, listener: BufferEventListener) -> None:
+        """
+        Add a listener to the buffer manager
+
+        Parameters
+        ----------
+        listener: BufferEventListener
+            An instance of BufferEventListener
+        """
+        pass
+
 
 class BufferManagerImpl(BufferManager):
     def __init__(self):
-        self._buffer_position = 0
+        # The buffered position of each adaptation set. The key None is used when they grow together.
+        self._buffer_positions: Dict[Optional[int], float] = {}
+        self._ended_tracks: Set[int] = set()
         self._position = 0
+        self._listeners: List[BufferEventListener] = []
 
-    def enqueue_buffer(self, duration: float) -> None:
-        self._buffer_position += duration
+    def enqueue_buffer(self, duration: float, adaptation_set_id: Optional[int] = None) -> None:
+        self._buffer_positions[adaptation_set_id] = self._buffer_positions.get(adaptation_set_id, 0) + duration
+        for listener in self._listeners:
+            listener.on_buffer_enqueued(duration, adaptation_set_id)
+
+    def track_ended(self, adaptation_set_id: int) -> None:
+        self._ended_tracks.add(adaptation_set_id)
+        for listener in self._listeners:
+            listener.on_track_ended(adaptation_set_id)
 
     def update_buffer(self, position: float) -> None:
         self._position = position
 
+    def track_buffer_level(self, adaptation_set_id: int) -> float:
+        return self._buffer_positions.get(adaptation_set_id, 0) - self._position
+
     @property
     def buffer_level(self):
-        return self._buffer_position - self._position
+        positions = [position for adaptation_set_id, position in self._buffer_positions.items()
+                     if adaptation_set_id not in self._ended_tracks]
+        if len(positions) == 0:
+            # All the tracks have ended, the playback goes on until the end of the longest one
+            return max(self._buffer_positions.values(), default=0) - self._position
+        return min(positions) - self._position
+
+    @property
+    def position(self) -> float:
+        return self._position
+
+    def add_listener(self, listener: BufferEventListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
@@ -0,0 +1,177 @@
+import asyncio
+import selectors
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class Clock(ABC):
+    @abstractmethod
+    def time(self) -> float:
+        """
+        Returns
+        -------
+        now: float
+            The current time in seconds
+        """
+        pass
+
+    @abstractmethod
+    async def sleep(self, delay: float) -> None:
+        """
+        Suspend the caller for some time
+
+        Parameters
+        ----------
+        delay: float
+            The time to sleep in seconds
+        """
+        pass
+
+    async def wait_event(self, event: asyncio.Event, timeout: Optional[float]) -> bool:
+        """
+        Suspend the caller until an event is set, or until a timeout expires
+
+        Parameters
+        ----------
+        event: asyncio.Event
+            The event to wait for
+        timeout: float, optional
+            The maximum time to wait in seconds, None to wait for the event only
+
+        Returns
+        -------
+        is_set: bool
+            True if the event is set, False if the timeout expired first
+        """
+        if event.is_set():
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class SystemClock(Clock):
+    """
+    The wall clock. Time passes in real time.
+    """
+
+    def time(self) -> float:
+        return time.time()
+
+    async def sleep(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+
+
+class _VirtualTimeSelector(selectors.BaseSelector):
+    """
+    A selector which never blocks while there are timers scheduled.
+    Instead of waiting for the timeout, it moves the virtual time of the loop forward.
+    """
+
+    def __init__(self, loop: 'VirtualTimeEventLoop', selector: selectors.BaseSelector):
+        self._loop = loop
+        self._selector = selector
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        if timeout is None:
+            # Nothing is scheduled, only I/O could wake the loop up
+            return self._selector.select(None)
+        events = self._selector.select(0)
+        if not events and timeout > 0:
+            self._loop.advance(timeout)
+        return events
+
+    def close(self):
+        self._selector.close()
+
+    def get_key(self, fileobj):
+        return self._selector.get_key(fileobj)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+    An event loop running on simulated time.
+    Whenever all the tasks are waiting for timers, the time jumps to the next timer directly.
+    I/O still works, but it is not aware of the simulated time.
+    """
+
+    def __init__(self, start_time: float = 0.0):
+        super().__init__(_VirtualTimeSelector(self, selectors.DefaultSelector()))
+        self._virtual_time = start_time
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, duration: float) -> None:
+        self._virtual_time += duration
+
+
+class VirtualClock(Clock):
+    """
+    A clock for discrete-event simulations.
+    The coroutines using this clock must run in the event loop of this clock, see :meth:`run`.
+    """
+
+    def __init__(self, start_time: float = 0.0):
+        """
+        Parameters
+        ----------
+        start_time: float
+            The simulated time when the clock is created, in seconds
+        """
+        self.loop = VirtualTimeEventLoop(start_time)
+
+    def time(self) -> float:
+        return self.loop.time()
+
+    async def sleep(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+
+    def run(self, coro):
+        """
+        Run a coroutine to completion in simulated time, like ``asyncio.run``
+
+        Parameters
+        ----------
+        coro
+            The coroutine to run
+
+        Returns
+        -------
+        result
+            The result of the coroutine
+        """
+        asyncio.set_event_loop(self.loop)
+        try:
+            return self.loop.run_until_complete(coro)
+        finally:
+            try:
+                tasks = asyncio.all_tasks(self.loop)
+                for task in tasks:
+                    task.cancel()
+                if tasks:
+                    self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            finally:
+                asyncio.set_event_loop(None)
+
+    def close(self) -> None:
+        """
+        Close the event loop of this clock
+        """
+        self.loop.close()
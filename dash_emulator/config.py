@@ -36,3 +36,46 @@ class Config(object):
 
     # Chunk size
     chunk_size = 40960
+
+    # Max number of segments downloaded at the same time
+    max_concurrent_downloads = 1
+
+    # Schedule the downloads of each adaptation set independently, with its own buffer
+    independent_tracks = False
+
+    # Number of segment indices requested ahead of the one being downloaded
+    pipeline_depth = 0
+
+    # Rate limit shared by all the HTTP downloads (bps), None for no limit
+    rate_limit = None
+
+    # Schedule of the rate limit, e.g. "0:5000000,30:1000000" (seconds:bps), None to keep rate_limit
+    rate_schedule = None
+
+    # Report the received chunks to the download listeners at most once per interval (s), 0 to report every chunk
+    coalesce_interval = 0
+
+    # Report the received chunks to the download listeners once this many bytes are received, 0 to disable
+    coalesce_bytes = 0
+
+    # Minimum interval between two continuous bandwidth updates (s), 0 to update after every chunk
+    cont_bw_update_interval = 0
+
+    # Update the continuous bandwidth once this many bytes are received, 0 to disable
+    cont_bw_update_bytes = 0
+
+    # Where to parse the MPD file: None on the event loop, "thread" in a thread, "process" in another process
+    mpd_parse_executor = None
+
+    # Folder of the cache of the parsed MPD files, None to parse every MPD file.
+    # The entries are pickled, the folder must only be writable by the user running the emulator.
+    mpd_cache_folder = None
+
+    # Maximum size of the cache of the parsed MPD files (bytes)
+    mpd_cache_max_size = 256 * 1024 * 1024
+
+    # Maximum number of connections of the connection pool shared by a fleet of players, 0 for no limit
+    fleet_connection_limit = 0
+
+    # Maximum number of connections to the same host of the connection pool of a fleet, 0 for no limit
+    fleet_connection_limit_per_host = 0
@@ -1,17 +1,25 @@
+import asyncio
+import itertools
 import logging
 from abc import ABC, abstractmethod
+from asyncio import Task
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Dict, Mapping
 
 import aiohttp
 
+from dash_emulator.clock import Clock, SystemClock
+from dash_emulator.rate_limit import TokenBucket
+from dash_emulator.sink import DiskSink, DiskSinkWriter
+
 class DownloadType(Enum):
     SEGMENT = 1
     STREAM_INIT = 2
 
 class DownloadEventListener(ABC):
     @abstractmethod
-    async def on_bytes_transferred(self, length: int, url: str, position: int, size: int, content: bytes) -> None:
+    async def on_bytes_transferred(self, length: int, url: str, position: int, size: int,
+                                   content: memoryview) -> None:
         """
         Parameters
         ----------
@@ -23,8 +31,8 @@ class DownloadEventListener(ABC):
             The current position of the stream, in bytes
         size: int
             The size of the content: in bytes
-            :param content:
-
+        content: memoryview
+            A read-only view of the bytes transferred since last call
         """
         pass
 
@@ -64,6 +72,149 @@ class DownloadEventListener(ABC):
         pass
 
 
+class ReceiveBuffer(object):
+    def __init__(self, size: Optional[int]):
+        """
+        A buffer collecting the bytes of one response.
+        It is preallocated when the size is known, and filled in place through a memoryview.
+
+        Parameters
+        ----------
+        size: int, optional
+            The expected size of the content in bytes, None if unknown
+        """
+        self._buffer = bytearray(size) if size else bytearray()
+        self._view: Optional[memoryview] = memoryview(self._buffer) if size else None
+        self._length = 0
+
+    def append(self, chunk: bytes) -> memoryview:
+        """
+        Parameters
+        ----------
+        chunk: bytes
+            The bytes received
+
+        Returns
+        -------
+        view: memoryview
+            A read-only view of the chunk in the buffer
+        """
+        start = self._length
+        end = start + len(chunk)
+        self._length = end
+        if self._view is not None:
+            if end <= len(self._buffer):
+                self._view[start:end] = chunk
+                return self._view[start:end].toreadonly()
+            # More bytes than expected, keep the bytes in a growing buffer instead
+            self._buffer = bytearray(self._view[:start])
+            self._view.release()
+            self._view = None
+        self._buffer.extend(chunk)
+        return memoryview(chunk).toreadonly()
+
+    def view(self, start: int, end: int) -> memoryview:
+        """
+        Parameters
+        ----------
+        start: int
+            The position of the first byte
+        end: int
+            The position after the last byte
+
+        Returns
+        -------
+        view: memoryview
+            A read-only view of the bytes received between the two positions
+        """
+        if self._view is not None:
+            return self._view[start:end].toreadonly()
+        # The growing buffer can't be exported, or it couldn't grow any more
+        return memoryview(bytes(self._buffer[start:end])).toreadonly()
+
+    def getvalue(self) -> bytearray:
+        """
+        Returns
+        -------
+        content: bytearray
+            The bytes received, without copying them when the buffer is exactly filled
+        """
+        if self._view is not None:
+            # The buffer can be resized by the caller once the listeners release their views
+            self._view.release()
+            self._view = None
+        if self._length == len(self._buffer):
+            return self._buffer
+        try:
+            del self._buffer[self._length:]
+            return self._buffer
+        except BufferError:
+            # Some listeners still hold views of the buffer
+            return self._buffer[:self._length]
+
+
+class DownloadHandle(object):
+    def __init__(self, handle_id: int, url: str):
+        """
+        The handle of one in-flight request
+
+        Parameters
+        ----------
+        handle_id: int
+            The id of the request, unique in its download manager
+        url: str
+            The URL of the request
+        """
+        self.id = handle_id
+        self.url = url
+
+        self.position = 0
+        """
+        The number of bytes received so far
+        """
+
+        self.size: Optional[int] = None
+        """
+        The size of the content in bytes, None if unknown
+        """
+
+        self.canceled = False
+        """
+        If the request has been canceled
+        """
+
+        self.task: Optional[Task] = None
+        """
+        The task running the request, if the request was submitted
+        """
+
+        self.status: Optional[int] = None
+        """
+        The HTTP status of the response, None until the response is received
+        """
+
+        self.headers: Mapping[str, str] = {}
+        """
+        The headers of the response
+        """
+
+    @property
+    def done(self) -> bool:
+        return self.task is not None and self.task.done()
+
+    async def wait(self) -> Optional[bytearray]:
+        """
+        Wait for a submitted request to complete
+
+        Returns
+        -------
+        content: bytearray, optional
+            The content of the request if it was submitted with save=True, None otherwise.
+            See DownloadManager.download.
+        """
+        return await self.task
+
+
 class DownloadManager(ABC):
     @property
     @abstractmethod
@@ -74,7 +225,8 @@ class DownloadManager(ABC):
         pass
 
     @abstractmethod
-    async def download(self, url, save: bool = False, rate: int = None) -> Optional[bytes]:
+    async def download(self, url, save: bool = False, rate: int = None,
+                       headers: Optional[Mapping[str, str]] = None) -> Optional[bytearray]:
         """
         Start download
 
@@ -84,11 +236,42 @@ class DownloadManager(ABC):
             The URL of the source to download from
         save: bool
             if save is True, this method return the bytes received. Return None otherwise.
+        rate: int
+            The rate limit of this download in bps, None for no limit
+        headers: Mapping[str, str], optional
+            Extra headers of the request
 
         Returns
         -------
-        content: bytes, optional
+        content: bytearray, optional
             None if save is False, the content bytes otherwise.
+            The content is returned in the buffer it was received in, to avoid copying it. It is mutable
+            and can't be hashed, use bytes(content) to keep an immutable copy or to use it as a key.
+        """
+        pass
+
+    @abstractmethod
+    def submit(self, url, save: bool = False, rate: int = None,
+               headers: Optional[Mapping[str, str]] = None) -> DownloadHandle:
+        """
+        Start a download in the background. Any number of downloads can run at the same time.
+
+        Parameters
+        ----------
+        url: str
+            The URL of the source to download from
+        save: bool
+            if save is True, the handle returns the bytes received when it completes.
+        rate: int
+            The rate limit of this download in bps, None for no limit
+        headers: Mapping[str, str], optional
+            Extra headers of the request, e.g. to make a conditional request.
+            The status and the headers of the response are set on the handle.
+
+        Returns
+        -------
+        handle: DownloadHandle
+            The handle to wait for or to cancel the request
         """
         pass
 
@@ -103,13 +286,24 @@ class DownloadManager(ABC):
     @abstractmethod
     async def stop(self, url: str):
         """
-        Stop one request
+        Stop all the requests to one URL
 
         url:
             The full request URL to stop
         """
         pass
 
+    @abstractmethod
+    async def cancel(self, handle: DownloadHandle):
+        """
+        Stop one request at once, even if it is waiting for bytes. The handle of a submitted request returns
+        the bytes received so far, or raises asyncio.CancelledError if the response hadn't arrived yet.
+
+        handle:
+            The handle of the request to stop
+        """
+        pass
+
     @abstractmethod
     def add_listener(self, listener: DownloadEventListener):
         """
@@ -129,7 +323,14 @@ class DownloadManagerImpl(DownloadManager):
     def __init__(self,
                  event_listeners: List[DownloadEventListener],
                  write_to_disk=False,
-                 chunk_size=4096
+                 chunk_size=4096,
+                 max_connections=100,
+                 output_folder: Optional[str] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 clock: Clock = None,
+                 coalesce_interval: float = 0,
+                 coalesce_bytes: int = 0,
+                 session: Optional[aiohttp.ClientSession] = None
                  ):
         """
         Parameters
@@ -138,64 +339,216 @@ class DownloadManagerImpl(DownloadManager):
             Listeners to events of some bytes downloaded
             
         write_to_disk: bool
-            Should we write the downloaded bytes to the disk
+            Should we write the downloaded bytes to the disk.
+            The bytes are streamed to files under output_folder while they are received.
 
         chunk_size: int
-            How any bytes should be downloaded at once
+            How any bytes should be downloaded at once when the download is rate limited
+
+        max_connections: int
+            The maximum number of simultaneous connections of the session, 0 for no limit
+
+        output_folder: str, optional
+            The folder to write the downloaded bytes in, required if write_to_disk is True
+
+        rate_limiter: TokenBucket, optional
+            The rate limit shared by all the downloads. It can be shared with other download managers too.
+            The rate argument of each download adds a limit of its own.
+
+        clock: Clock
+            The clock to pace the rate limited downloads and to coalesce the events
+
+        coalesce_interval: float
+            If it is greater than 0, the received chunks are reported to the listeners together,
+            at most once every coalesce_interval seconds, unless coalesce_bytes are reached first.
+
+        coalesce_bytes: int
+            If it is greater than 0, the received chunks are reported to the listeners together,
+            once at least coalesce_bytes bytes are received, unless coalesce_interval is reached first.
+            The pending bytes are always reported before the end or the cancellation of a transfer.
+
+        session: aiohttp.ClientSession, optional
+            An HTTP session shared with other download managers, to share its connection pool.
+            max_connections doesn't apply to it, and it is not closed by this download manager.
         """
         self.event_listeners = event_listeners
         self.write_to_disk = write_to_disk
         self.chunk_size = chunk_size
+        self.max_connections = max_connections
+        self.rate_limiter = rate_limiter
+        self.clock = clock if clock is not None else SystemClock()
+        self.coalesce_interval = coalesce_interval
+        self.coalesce_bytes = coalesce_bytes
 
-        self._busy = False
-        self._session: Optional[aiohttp.ClientSession] = None
-        self._stop = False
+        if write_to_disk and output_folder is None:
+            raise ValueError("An output folder is required to write to the disk")
+        self.sink: Optional[DiskSink] = DiskSink(output_folder) if write_to_disk else None
+        self._session: Optional[aiohttp.ClientSession] = session
+        self._shared_session = session is not None
+        self._transfers: Dict[int, DownloadHandle] = {}
+        # The response of each transfer, to interrupt its reads when it is canceled
+        self._responses: Dict[int, aiohttp.ClientResponse] = {}
+        self._handle_ids = itertools.count()
 
     @property
     def is_busy(self) -> bool:
-        return self._busy
+        return len(self._transfers) > 0
 
-    async def download(self, url: str, save=False, rate=None) -> Optional[bytes]:
-        self._busy = True
-        self._stop = False
+    def _create_handle(self, url: str) -> DownloadHandle:
+        handle = DownloadHandle(next(self._handle_ids), url)
+        self._transfers[handle.id] = handle
+        return handle
+
+    def _interrupt(self, handle: DownloadHandle) -> None:
+        """
+        Cancel a request, without waiting for the read in progress to return
+        """
+        handle.canceled = True
+        resp = self._responses.get(handle.id)
+        if resp is not None:
+            # The pending read raises at once, and the transfer is reported as canceled
+            resp.close()
+        elif handle.task is not None:
+            # The response hasn't arrived yet
+            handle.task.cancel()
+
+    async def download(self, url: str, save=False, rate=None, headers=None) -> Optional[bytearray]:
+        return await self._download(self._create_handle(url), save, rate, headers)
+
+    def submit(self, url: str, save=False, rate=None, headers=None) -> DownloadHandle:
+        handle = self._create_handle(url)
+        handle.task = asyncio.create_task(self._download(handle, save, rate, headers))
+        return handle
+
+    async def _download(self, handle: DownloadHandle, save: bool, rate: Optional[int],
+                        headers: Optional[Mapping[str, str]]) -> Optional[bytearray]:
+        url = handle.url
         self.log.info("Start downloading %s" % url)
 
         if self._session is None:
-            self._session = aiohttp.ClientSession()
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
 
-        content = bytearray()
-        async with self._session.get(url) as resp:
-            position = 0
+        buckets = [bucket for bucket in (self.rate_limiter,) if bucket is not None]
+        if rate is not None:
+            buckets.append(TokenBucket(rate, clock=self.clock))
+
+        content: Optional[ReceiveBuffer] = None
+        writer: Optional[DiskSinkWriter] = None
+        coalescing = self.coalesce_interval > 0 or self.coalesce_bytes > 0
+        # The chunks received but not reported yet
+        pending_chunks: List[bytes] = []
+        pending_start = 0
+        last_report = self.clock.time()
+
+        async def report(size: Optional[int]):
+            """
+            Report the pending chunks to the listeners as one event
+            """
+            nonlocal pending_start, last_report
+            length = handle.position - pending_start
+            if length == 0:
+                return
+            if content is not None:
+                view = content.view(pending_start, handle.position)
+            elif len(pending_chunks) == 1:
+                view = memoryview(pending_chunks[0]).toreadonly()
+            else:
+                view = memoryview(b"".join(pending_chunks)).toreadonly()
+            pending_chunks.clear()
+            pending_start = handle.position
+            last_report = self.clock.time()
             for listener in self.event_listeners:
-                await listener.on_transfer_start(url)
-            while not self._stop:
-                chunk = await resp.content.readany()
-                if not chunk:
-                    # Download complete, call listeners
-                    for listener in self.event_listeners:
-                        await listener.on_transfer_end(resp.content_length, url)
-                    break
-                size = len(chunk)
+                await listener.on_bytes_transferred(length, url, handle.position, size, view)
+
+        # If the listeners got the start of the transfer, and its end or its cancellation
+        started = False
+        finished = False
+        try:
+            async with self._session.get(url, headers=headers) as resp:
+                self._responses[handle.id] = resp
+                handle.status = resp.status
+                handle.headers = resp.headers
+                handle.size = resp.content_length
                 if save:
-                    content.extend(chunk)
-                position += size
+                    content = ReceiveBuffer(resp.content_length)
+                if self.sink is not None:
+                    writer = self.sink.open(url)
+                started = True
                 for listener in self.event_listeners:
-                    await listener.on_bytes_transferred(size, url, position, resp.content_length, chunk)
-            if self._stop:
+                    await listener.on_transfer_start(url)
+                while not handle.canceled:
+                    try:
+                        if len(buckets) > 0:
+                            chunk = await resp.content.read(self.chunk_size)
+                        else:
+                            chunk = await resp.content.readany()
+                    except aiohttp.ClientConnectionError:
+                        if handle.canceled:
+                            # The response was closed to cancel the transfer
+                            break
+                        raise
+                    if not chunk:
+                        if coalescing:
+                            await report(resp.content_length)
+                        # Download complete, call listeners
+                        finished = True
+                        for listener in self.event_listeners:
+                            await listener.on_transfer_end(resp.content_length, url)
+                        break
+                    size = len(chunk)
+                    for bucket in buckets:
+                        await bucket.consume(size * 8)
+                    view = content.append(chunk) if save else memoryview(chunk)
+                    handle.position += size
+                    if writer is not None:
+                        await writer.write(view)
+                    if coalescing:
+                        if not save:
+                            pending_chunks.append(chunk)
+                        if (self.coalesce_bytes > 0 and handle.position - pending_start >= self.coalesce_bytes) or \
+                                (self.coalesce_interval > 0 and
+                                 self.clock.time() - last_report >= self.coalesce_interval):
+                            await report(resp.content_length)
+                    else:
+                        for listener in self.event_listeners:
+                            await listener.on_bytes_transferred(size, url, handle.position, resp.content_length,
+                                                                view)
+                if handle.canceled and not finished:
+                    if coalescing:
+                        await report(resp.content_length)
+                    finished = True
+                    for listener in self.event_listeners:
+                        await listener.on_transfer_canceled(url, handle.position, resp.content_length)
+        except BaseException:
+            # The transfer failed or its task was canceled, the listeners still see it end
+            if started and not finished:
                 for listener in self.event_listeners:
-                    await listener.on_transfer_canceled(url, position, size)
-        self._busy = False
-        return bytes(content) if save else None
+                    await listener.on_transfer_canceled(url, handle.position, handle.size)
+            raise
+        finally:
+            del self._transfers[handle.id]
+            self._responses.pop(handle.id, None)
+            if writer is not None:
+                await writer.close()
+        return content.getvalue() if content is not None else None
 
     async def close(self) -> None:
         """
         You can still download things after you close the session, but it is not recommended.
         """
-        if self._session is not None:
+        if self._session is not None and not self._shared_session:
             await self._session.close()
+            self._session = None
+        if self.sink is not None and not self.is_busy:
+            self.sink.close()
 
     async def stop(self, url):
-        self._stop = True
+        for handle in list(self._transfers.values()):
+            if handle.url == url:
+                self._interrupt(handle)
+
+    async def cancel(self, handle: DownloadHandle):
+        self._interrupt(handle)
 
     def add_listener(self, listener: DownloadEventListener):
         if listener not in self.event_listeners:
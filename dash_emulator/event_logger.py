@@ -5,19 +5,28 @@ from dash_emulator.models import State
 from dash_emulator.mpd import MPDProvider
 from dash_emulator.player import PlayerEventListener
 from dash_emulator.scheduler import SchedulerEventListener
-from exp_common.exp_events import ExpEvent_Progress, ExpEvent_State
-from exp_common.exp_recorder import ExpWriter
+
+try:
+    from exp_common.exp_events import ExpEvent_Progress, ExpEvent_State
+    from exp_common.exp_recorder import ExpWriter
+except ImportError:
+    # The experiment events are optional, see EventRecorder for a built-in recorder
+    ExpEvent_Progress = ExpEvent_State = ExpWriter = None
 
 
 class EventLogger(SchedulerEventListener, PlayerEventListener):
     log = logging.getLogger("EventLogger")
 
-    def __init__(self, mpd_provider: MPDProvider = None, recorder: ExpWriter = None):
+    def __init__(self, mpd_provider: MPDProvider = None, recorder: "ExpWriter" = None):
         """
         Log events to console and events file
         Parameters
         ----------
-        dump_events: file path to write events
+        mpd_provider: MPDProvider
+            The MPD provider, to compute the progress of the playback
+        recorder: ExpWriter
+            The writer of the experiment events, from the optional exp_common package.
+            The events are only logged to the console if it is not given.
         """
         self.recorder = recorder
         self._total_duration = None
@@ -34,11 +43,15 @@ class EventLogger(SchedulerEventListener, PlayerEventListener):
         self.log.debug(f"Buffer level: {buffer_level:.3f}")
 
     async def on_position_change(self, position):
+        if self.recorder is None:
+            return
         progress = position / self.total_duration
         self.recorder.write_event(ExpEvent_Progress(round(time.time() * 1000), progress))
 
     async def on_state_change(self, position: float, old_state: State, new_state: State):
         self.log.info("Switch state. pos: %.3f, from %s to %s" % (position, old_state, new_state))
+        if self.recorder is None:
+            return
         progress = position / self.total_duration
         self.recorder.write_event(ExpEvent_State(round(time.time() * 1000), progress, str(old_state), str(new_state)))
 
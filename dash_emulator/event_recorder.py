@@ -0,0 +1,224 @@
+import logging
+import os
+import struct
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from dash_emulator.bandwidth import BandwidthUpdateListener
+from dash_emulator.clock import Clock, SystemClock
+from dash_emulator.models import State
+from dash_emulator.player import PlayerEventListener
+from dash_emulator.scheduler import SchedulerEventListener
+
+# The header of an events file: a magic string, the version of the format and the size of a record
+HEADER = struct.Struct("<8sII")
+MAGIC = b"DASHEVTS"
+VERSION = 1
+
+# One event: time, type, three integers and a value. The meaning of the fields depends on the type.
+RECORD = struct.Struct("<dB3xiiid")
+EVENT_DTYPE = np.dtype({
+    "names": ["time", "type", "a", "b", "c", "value"],
+    "formats": ["<f8", "u1", "<i4", "<i4", "<i4", "<f8"],
+    "offsets": [0, 8, 12, 16, 20, 24],
+    "itemsize": RECORD.size,
+})
+
+# The types of events
+# a: old state, b: new state, value: position
+EVENT_STATE = 0
+# value: position
+EVENT_POSITION = 1
+# value: buffer level
+EVENT_BUFFER_LEVEL = 2
+# a: segment index, b: adaptation set id, c: representation id. One record per adaptation set.
+EVENT_SEGMENT_START = 3
+# a: segment index
+EVENT_SEGMENT_COMPLETE = 4
+# value: bandwidth estimate in bps
+EVENT_BANDWIDTH = 5
+# value: continuous bandwidth estimate in bps
+EVENT_CONTINUOUS_BANDWIDTH = 6
+
+
+class EventRecorder(PlayerEventListener, SchedulerEventListener, BandwidthUpdateListener):
+    log = logging.getLogger("EventRecorder")
+
+    def __init__(self, path: str, clock: Clock = None, batch_size: int = 4096):
+        """
+        Record the events of a player as fixed-width binary records, appended to a file.
+        The records are packed into a buffer, and the buffer is written when it is full, when the playback
+        ends and when the recorder is closed. The file can be loaded with load_events.
+
+        Parameters
+        ----------
+        path: str
+            The path of the events file. The records are appended to it if it exists.
+        clock: Clock
+            The clock to timestamp the events
+        batch_size: int
+            The number of records written at once
+        """
+        self.path = path
+        self.clock = clock if clock is not None else SystemClock()
+        self.batch_size = batch_size
+
+        self._buffer = bytearray(batch_size * RECORD.size)
+        self._count = 0
+        self._file = open(path, "ab", buffering=0)
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        else:
+            _check_header(path)
+
+    def record(self, event_type: int, a: int = 0, b: int = 0, c: int = 0, value: float = 0.0) -> None:
+        """
+        Append one record, timestamped with the current time
+
+        Parameters
+        ----------
+        event_type: int
+            The type of the event, one of the EVENT_* constants
+        a, b, c: int
+            The integer fields of the event
+        value: float
+            The value of the event
+        """
+        RECORD.pack_into(self._buffer, self._count * RECORD.size, self.clock.time(), event_type, a, b, c, value)
+        self._count += 1
+        if self._count == self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered records to the file
+        """
+        if self._count > 0:
+            self._file.write(memoryview(self._buffer)[:self._count * RECORD.size])
+            self._count = 0
+
+    def close(self) -> None:
+        """
+        Write the buffered records and close the file
+        """
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    async def on_state_change(self, position: float, old_state: State, new_state: State):
+        self.record(EVENT_STATE, old_state.value, new_state.value, value=position)
+        if new_state == State.END:
+            self.flush()
+
+    async def on_buffer_level_change(self, buffer_level):
+        self.record(EVENT_BUFFER_LEVEL, value=buffer_level)
+
+    async def on_position_change(self, position):
+        self.record(EVENT_POSITION, value=position)
+
+    async def on_segment_download_start(self, index, selections):
+        for adaptation_set_id, representation_id in selections.items():
+            self.record(EVENT_SEGMENT_START, index, adaptation_set_id, representation_id)
+
+    async def on_segment_download_complete(self, index):
+        self.record(EVENT_SEGMENT_COMPLETE, index)
+
+    async def on_bandwidth_update(self, bw: int, extra_stats: dict) -> None:
+        self.record(EVENT_BANDWIDTH, value=bw)
+
+    async def on_continuous_bw_update(self, bw: int) -> None:
+        # There's no estimate until the bandwidth meter has enough samples
+        if bw is not None:
+            self.record(EVENT_CONTINUOUS_BANDWIDTH, value=bw)
+
+
+def _check_header(path: str) -> None:
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError("%s is not an events file" % path)
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError("%s is not an events file of version %d" % (path, VERSION))
+
+
+def load_events(path: str) -> np.ndarray:
+    """
+    Load an events file without copying it, the records are mapped in memory.
+    A record which was only partially written is ignored.
+
+    Parameters
+    ----------
+    path: str
+        The path of the events file
+
+    Returns
+    -------
+    events: np.ndarray
+        A read-only structured array of EVENT_DTYPE, one element per record
+    """
+    _check_header(path)
+    count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+    if count == 0:
+        return np.empty(0, dtype=EVENT_DTYPE)
+    return np.memmap(path, dtype=EVENT_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+
+def load_many(paths: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Load the events files of several sessions into one array
+
+    Parameters
+    ----------
+    paths: Sequence[str]
+        The paths of the events files
+
+    Returns
+    -------
+    events: np.ndarray
+        The records of all the files, in the order of the paths
+    sessions: np.ndarray
+        The index in paths of the file of each record
+    """
+    arrays = [load_events(path) for path in paths]
+    if len(arrays) == 0:
+        return np.empty(0, dtype=EVENT_DTYPE), np.empty(0, dtype=np.int64)
+    sessions = np.repeat(np.arange(len(arrays)), [len(events) for events in arrays])
+    return np.concatenate(arrays), sessions
+
+
+def stalls(events: np.ndarray, sessions: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the stalls, when the player goes from READY to BUFFERING, and their durations
+
+    Parameters
+    ----------
+    events: np.ndarray
+        The records, see load_events
+    sessions: np.ndarray, optional
+        The session of each record if the records come from several sessions, see load_many
+
+    Returns
+    -------
+    start_times: np.ndarray
+        The time each stall started
+    durations: np.ndarray
+        The duration of each stall, NaN if the session ended while stalling
+    positions: np.ndarray
+        The position of the playback during each stall
+    """
+    is_state = events["type"] == EVENT_STATE
+    states = events[is_state]
+    starts = np.flatnonzero((states["a"] == State.READY.value) & (states["b"] == State.BUFFERING.value))
+    # The state change after a stall ends it, if it belongs to the same session
+    ends = starts + 1
+    has_end = ends < len(states)
+    if sessions is not None:
+        state_sessions = sessions[is_state]
+        has_end[has_end] &= state_sessions[ends[has_end]] == state_sessions[starts[has_end]]
+    start_times = states["time"][starts]
+    durations = np.full(len(starts), np.nan)
+    durations[has_end] = states["time"][ends[has_end]] - start_times[has_end]
+    return start_times, durations, states["value"][starts]
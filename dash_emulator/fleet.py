@@ -0,0 +1,318 @@
+import asyncio
+import csv
+import logging
+import random
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+import aiohttp
+
+from dash_emulator.clock import Clock, SystemClock
+from dash_emulator.download import DownloadEventListener
+from dash_emulator.models import State
+from dash_emulator.mpd import MPDProvider
+from dash_emulator.player import Player
+from dash_emulator.player_factory import build_dash_player
+from dash_emulator.qoe import QoEMonitor
+
+
+class SessionStats(QoEMonitor, DownloadEventListener):
+    def __init__(self, clock: Clock = None, mpd_provider: Optional[MPDProvider] = None):
+        """
+        The statistics of one playback session, updated by the events of the player, the scheduler and the
+        segment download manager. The startup delay, the stalls and the average bitrate are the QoE metrics
+        of QoEMonitor.
+
+        Parameters
+        ----------
+        clock: Clock
+            The clock of the player
+        mpd_provider: MPDProvider, optional
+            The MPD provider of the player, to know the bitrates of the chosen representations
+        """
+        super().__init__(clock, mpd_provider)
+
+        self.start_time: Optional[float] = None
+        """
+        The time the session started
+        """
+
+        self.end_time: Optional[float] = None
+        """
+        The time the session ended
+        """
+
+        self.bytes_downloaded = 0
+        """
+        The bytes of the segments downloaded
+        """
+
+        self.segments_downloaded = 0
+        """
+        The number of segment indices downloaded
+        """
+
+        self.bitrate = 0
+        """
+        The total bitrate of the latest representations of the adaptation sets, in bps
+        """
+
+        self.buffer_level = 0.0
+        """
+        The latest buffer level in seconds
+        """
+
+    def end(self):
+        now = self.clock.time()
+        self._end_stall(now)
+        self.end_time = now
+
+    async def on_buffer_level_change(self, buffer_level):
+        await super().on_buffer_level_change(buffer_level)
+        self.buffer_level = buffer_level
+
+    async def on_segment_download_start(self, index, selections):
+        await super().on_segment_download_start(index, selections)
+        self.bitrate = sum(self._last_bandwidths.values())
+
+    async def on_segment_download_complete(self, index):
+        await super().on_segment_download_complete(index)
+        self.segments_downloaded += 1
+
+    async def on_transfer_start(self, url) -> None:
+        pass
+
+    async def on_bytes_transferred(self, length: int, url: str, position: int, size: int, content) -> None:
+        self.bytes_downloaded += length
+
+    async def on_transfer_end(self, size: int, url: str) -> None:
+        pass
+
+    async def on_transfer_canceled(self, url: str, position: int, size: int) -> None:
+        pass
+
+
+class FleetSession(object):
+    def __init__(self, session_id: int, mpd_url: str, params: Dict[str, Any], stats: SessionStats):
+        """
+        One playback session of a fleet
+
+        Parameters
+        ----------
+        session_id: int
+            The index of the session in the fleet
+        mpd_url: str
+            The URL of the MPD file
+        params: Dict[str, Any]
+            The parameters of the session. "duration" limits the duration of the session in seconds,
+            the other parameters are given to the player builder.
+        stats: SessionStats
+            The statistics of the session
+        """
+        self.id = session_id
+        self.mpd_url = mpd_url
+        self.params = params
+        self.stats = stats
+
+        self.timed_out = False
+        """
+        If the session was stopped after its duration
+        """
+
+        self.error: Optional[str] = None
+        """
+        The error which ended the session, if any
+        """
+
+
+# Build a player which uses the HTTP session shared by the fleet and updates the statistics of a session
+PlayerBuilder = Callable[[aiohttp.ClientSession, Dict[str, Any], SessionStats], Player]
+
+
+def build_fleet_dash_player(session: aiohttp.ClientSession, params: Dict[str, Any], stats: SessionStats) -> Player:
+    """
+    Build a MPEG-DASH Player of a fleet, see FleetRunner
+
+    Parameters
+    ----------
+    session: aiohttp.ClientSession
+        The HTTP session shared by the players of the fleet
+    params: Dict[str, Any]
+        The parameters of the session. "rate_limit" is the rate limit of the player in bps.
+    stats: SessionStats
+        The statistics of the session
+
+    Returns
+    -------
+    player: Player
+        A MPEG-DASH Player
+    """
+    player = build_dash_player(session=session, listeners=[stats], rate_limit=params.get("rate_limit"))
+    stats.mpd_provider = player.mpd_provider
+    return player
+
+
+class FleetRunner(object):
+    log = logging.getLogger("FleetRunner")
+
+    # The columns of the results
+    result_fields = ["session", "mpd", "start_time", "end_time", "state", "timed_out", "error", "startup_delay",
+                     "num_stalls", "stall_time", "segments", "bytes", "average_bitrate"]
+
+    def __init__(self,
+                 build_player: PlayerBuilder,
+                 sessions: Sequence[Tuple[str, Dict[str, Any]]],
+                 num_players: int,
+                 arrival_rate: float = 0,
+                 poisson: bool = True,
+                 connection_limit: int = 0,
+                 connection_limit_per_host: int = 0,
+                 dns_cache_ttl: int = 300,
+                 clock: Clock = None,
+                 seed: Optional[int] = None,
+                 session_ids: Optional[Sequence[int]] = None):
+        """
+        Run many players in one event loop. The players share one HTTP session, and its connection pool.
+
+        Parameters
+        ----------
+        build_player: PlayerBuilder
+            The function building each player
+        sessions: Sequence[Tuple[str, Dict[str, Any]]]
+            The MPD URLs and the parameters of the sessions. The players take them in turn.
+        num_players: int
+            The number of players to start, ignored if session_ids is given
+        arrival_rate: float
+            The number of players started per second, 0 to start all of them at once
+        poisson: bool
+            If the players arrive as a Poisson process. Otherwise, they arrive at a constant interval.
+        connection_limit: int
+            The maximum number of connections of the pool, 0 for no limit
+        connection_limit_per_host: int
+            The maximum number of connections to the same host, 0 for no limit
+        dns_cache_ttl: int
+            How long the resolved addresses are cached, in seconds
+        clock: Clock
+            The clock to pace the arrivals and to timestamp the sessions
+        seed: int, optional
+            The seed of the arrivals
+        session_ids: Sequence[int], optional
+            The ids of the sessions to run, range(num_players) by default.
+            The session of id i takes the MPD URL and the parameters sessions[i % len(sessions)].
+        """
+        if len(sessions) == 0:
+            raise ValueError("A fleet needs at least one MPD URL")
+        self.build_player = build_player
+        self.sessions = sessions
+        self.num_players = num_players
+        self.arrival_rate = arrival_rate
+        self.poisson = poisson
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.clock = clock if clock is not None else SystemClock()
+        self.random = random.Random(seed)
+        self.session_ids: List[int] = list(session_ids) if session_ids is not None else list(range(num_players))
+
+        self.results: List[FleetSession] = []
+
+    def _inter_arrival_time(self) -> float:
+        if self.arrival_rate <= 0:
+            return 0
+        if self.poisson:
+            return self.random.expovariate(self.arrival_rate)
+        return 1 / self.arrival_rate
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """
+        Returns
+        -------
+        session: aiohttp.ClientSession
+            The HTTP session shared by the players, with a connection pool tuned for many concurrent players
+        """
+        connector = aiohttp.TCPConnector(limit=self.connection_limit, limit_per_host=self.connection_limit_per_host,
+                                         ttl_dns_cache=self.dns_cache_ttl)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None))
+
+    async def run(self) -> List[FleetSession]:
+        """
+        Start the players and wait until all of them end
+
+        Returns
+        -------
+        results: List[FleetSession]
+            The sessions, in the order they started
+        """
+        self.results = []
+        tasks = []
+        session = self.create_session()
+        try:
+            for i, session_id in enumerate(self.session_ids):
+                if i > 0:
+                    await self.clock.sleep(self._inter_arrival_time())
+                mpd_url, params = self.sessions[session_id % len(self.sessions)]
+                fleet_session = FleetSession(session_id, mpd_url, params, SessionStats(self.clock))
+                self.results.append(fleet_session)
+                tasks.append(asyncio.create_task(self._run_session(session, fleet_session)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await session.close()
+        self.log.info("Fleet ended: %s" % self.summary())
+        return self.results
+
+    async def _run_session(self, session: aiohttp.ClientSession, fleet_session: FleetSession):
+        stats = fleet_session.stats
+        stats.start()
+        try:
+            player = self.build_player(session, fleet_session.params, stats)
+            duration = fleet_session.params.get("duration")
+            if duration is not None:
+                await asyncio.wait_for(player.start(fleet_session.mpd_url), duration)
+            else:
+                await player.start(fleet_session.mpd_url)
+        except asyncio.TimeoutError:
+            fleet_session.timed_out = True
+        except Exception as e:
+            self.log.error("Session %d failed: %r" % (fleet_session.id, e))
+            fleet_session.error = repr(e)
+        finally:
+            stats.end()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        summary: Dict[str, Any]
+            The statistics aggregated over the sessions
+        """
+        started = [fleet_session.stats for fleet_session in self.results
+                   if fleet_session.stats.startup_delay is not None]
+        return {
+            "sessions": len(self.results),
+            "ended": sum(1 for fleet_session in self.results if fleet_session.stats.state == State.END),
+            "timed_out": sum(1 for fleet_session in self.results if fleet_session.timed_out),
+            "errors": sum(1 for fleet_session in self.results if fleet_session.error is not None),
+            "bytes": sum(fleet_session.stats.bytes_downloaded for fleet_session in self.results),
+            "stalls": sum(fleet_session.stats.num_stalls for fleet_session in self.results),
+            "mean_startup_delay": sum(stats.startup_delay for stats in started) / len(started) if started else None,
+        }
+
+    def write_results(self, path: str):
+        """
+        Write the results of the sessions to a CSV file
+
+        Parameters
+        ----------
+        path: str
+            The path of the CSV file
+        """
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.result_fields)
+            for fleet_session in self.results:
+                stats = fleet_session.stats
+                writer.writerow([fleet_session.id, fleet_session.mpd_url, stats.start_time, stats.end_time,
+                                 stats.state.name, fleet_session.timed_out, fleet_session.error or "",
+                                 stats.startup_delay, stats.num_stalls, stats.stall_time, stats.segments_downloaded,
+                                 stats.bytes_downloaded, stats.average_bitrate])
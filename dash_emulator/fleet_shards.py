@@ -0,0 +1,251 @@
+import asyncio
+import csv
+import logging
+import multiprocessing
+import time
+from multiprocessing.context import BaseContext
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dash_emulator.config import Config
+from dash_emulator.fleet import FleetRunner, FleetSession, PlayerBuilder
+from dash_emulator.models import State
+
+# The counters of each session in the shared memory, one row per session
+SESSION_FIELDS = ("status", "state", "bytes", "bitrate", "buffer_level", "stalls", "stall_time", "segments",
+                  "startup_delay")
+STATUS, STATE, BYTES, BITRATE, BUFFER_LEVEL, STALLS, STALL_TIME, SEGMENTS, STARTUP_DELAY = range(len(SESSION_FIELDS))
+
+# The values of the status counter
+STATUS_PENDING = 0
+STATUS_RUNNING = 1
+STATUS_ENDED = 2
+STATUS_TIMED_OUT = 3
+STATUS_FAILED = 4
+STATUS_NAMES = ["pending", "running", "ended", "timed_out", "failed"]
+
+
+def counters_view(counters) -> np.ndarray:
+    """
+    Parameters
+    ----------
+    counters
+        The shared array of the counters, a multiprocessing.RawArray of doubles
+
+    Returns
+    -------
+    view: np.ndarray
+        A view of the counters with one row per session and one column per field of SESSION_FIELDS
+    """
+    return np.frombuffer(counters, dtype=np.float64).reshape(-1, len(SESSION_FIELDS))
+
+
+def publish(view: np.ndarray, results: List[FleetSession]):
+    """
+    Copy the statistics of the sessions of a worker to their rows of the shared counters
+    """
+    for fleet_session in results:
+        stats = fleet_session.stats
+        if fleet_session.error is not None:
+            status = STATUS_FAILED
+        elif fleet_session.timed_out:
+            status = STATUS_TIMED_OUT
+        elif stats.end_time is not None:
+            status = STATUS_ENDED
+        else:
+            status = STATUS_RUNNING
+        view[fleet_session.id] = (status, stats.state.value, stats.bytes_downloaded, stats.bitrate,
+                                  stats.buffer_level, stats.num_stalls, stats.stall_time, stats.segments_downloaded,
+                                  stats.startup_delay if stats.startup_delay is not None else -1)
+
+
+async def _run_shard_async(runner: FleetRunner, view: np.ndarray, publish_interval: float):
+    async def publish_repeatedly():
+        while True:
+            await asyncio.sleep(publish_interval)
+            publish(view, runner.results)
+
+    publisher = asyncio.create_task(publish_repeatedly())
+    try:
+        await runner.run()
+    finally:
+        publisher.cancel()
+        publish(view, runner.results)
+
+
+def run_shard(build_player: PlayerBuilder, sessions: Sequence[Tuple[str, Dict[str, Any]]], session_ids: List[int],
+              counters, config: Dict[str, Any], arrival_rate: float, poisson: bool, connection_limit: int,
+              connection_limit_per_host: int, seed: Optional[int], publish_interval: float):
+    """
+    Run the sessions of one worker process in its own event loop.
+    It is a module function so that it can be the target of a process.
+    """
+    # The configuration of the parent is applied again, in case the worker didn't inherit it
+    for name, value in config.items():
+        setattr(Config, name, value)
+    runner = FleetRunner(build_player, sessions, len(session_ids), arrival_rate=arrival_rate, poisson=poisson,
+                         connection_limit=connection_limit, connection_limit_per_host=connection_limit_per_host,
+                         seed=seed, session_ids=session_ids)
+    asyncio.run(_run_shard_async(runner, counters_view(counters), publish_interval))
+
+
+class ShardedFleetRunner(object):
+    log = logging.getLogger("ShardedFleetRunner")
+
+    def __init__(self,
+                 build_player: PlayerBuilder,
+                 sessions: Sequence[Tuple[str, Dict[str, Any]]],
+                 num_players: int,
+                 num_workers: int = None,
+                 arrival_rate: float = 0,
+                 poisson: bool = True,
+                 connection_limit: int = 0,
+                 connection_limit_per_host: int = 0,
+                 seed: Optional[int] = None,
+                 publish_interval: float = 0.2,
+                 mp_context: Optional[BaseContext] = None):
+        """
+        Run a fleet of players over several worker processes, each one with its own event loop and connection pool.
+        The players are dealt to the workers in turn, and each worker starts its players at its share of the
+        arrival rate.
+
+        Each worker publishes the counters of its sessions in an array in shared memory, every publish_interval
+        seconds and when its sessions end, so that the parent can aggregate them at any time without
+        exchanging messages. A row can be read while it is written, the live counters are only a snapshot.
+
+        Parameters
+        ----------
+        build_player: PlayerBuilder
+            The function building each player. It must be picklable, e.g. a module function.
+        sessions: Sequence[Tuple[str, Dict[str, Any]]]
+            The MPD URLs and the parameters of the sessions, see FleetRunner
+        num_players: int
+            The number of players to start
+        num_workers: int
+            The number of worker processes, the number of CPUs by default
+        arrival_rate: float
+            The number of players started per second over all the workers, 0 to start all of them at once
+        poisson: bool
+            If the players arrive as a Poisson process. Otherwise, they arrive at a constant interval in each worker.
+        connection_limit: int
+            The maximum number of connections of the pool of each worker, 0 for no limit
+        connection_limit_per_host: int
+            The maximum number of connections to the same host of the pool of each worker, 0 for no limit
+        seed: int, optional
+            The seed of the arrivals, each worker adds its index to it
+        publish_interval: float
+            The interval between two publications of the counters by a worker, in seconds
+        mp_context: BaseContext, optional
+            The multiprocessing context of the workers, the default one if it is not given
+        """
+        self.build_player = build_player
+        self.sessions = sessions
+        self.num_players = num_players
+        self.num_workers = min(num_workers if num_workers is not None else multiprocessing.cpu_count(), num_players)
+        self.arrival_rate = arrival_rate
+        self.poisson = poisson
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.seed = seed
+        self.publish_interval = publish_interval
+        self.mp_context = mp_context if mp_context is not None else multiprocessing.get_context()
+
+        self.counters = self.mp_context.RawArray("d", num_players * len(SESSION_FIELDS))
+        self.view = counters_view(self.counters)
+        self._processes: List[multiprocessing.Process] = []
+
+    def start(self):
+        """
+        Start the worker processes
+        """
+        config = {name: value for name, value in vars(Config).items() if not name.startswith("_")}
+        for worker in range(self.num_workers):
+            session_ids = list(range(worker, self.num_players, self.num_workers))
+            seed = self.seed + worker if self.seed is not None else None
+            process = self.mp_context.Process(
+                target=run_shard, name="FleetShard-%d" % worker,
+                args=(self.build_player, self.sessions, session_ids, self.counters, config,
+                      self.arrival_rate / self.num_workers, self.poisson, self.connection_limit,
+                      self.connection_limit_per_host, seed, self.publish_interval))
+            process.start()
+            self._processes.append(process)
+
+    @property
+    def is_running(self) -> bool:
+        return any(process.is_alive() for process in self._processes)
+
+    def join(self, report_interval: float = 1, on_report: Callable[[Dict[str, Any]], None] = None):
+        """
+        Wait until the workers end, and report the aggregated counters every report_interval seconds
+
+        Parameters
+        ----------
+        report_interval: float
+            The interval between two reports, in seconds
+        on_report: Callable[[Dict[str, Any]], None]
+            Called with each report. The reports are logged if it is not given.
+        """
+        while self.is_running:
+            time.sleep(report_interval)
+            report = self.snapshot()
+            if on_report is not None:
+                on_report(report)
+            else:
+                self.log.info("Fleet: %s" % report)
+        for process in self._processes:
+            process.join()
+            if process.exitcode != 0:
+                self.log.error("%s exited with code %d" % (process.name, process.exitcode))
+
+    def run(self, report_interval: float = 1, on_report: Callable[[Dict[str, Any]], None] = None) -> np.ndarray:
+        """
+        Start the workers and wait until they end
+
+        Returns
+        -------
+        counters: np.ndarray
+            A copy of the final counters, see snapshot
+        """
+        self.start()
+        self.join(report_interval, on_report)
+        return self.view.copy()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        report: Dict[str, Any]
+            The counters aggregated over the sessions
+        """
+        view = self.view.copy()
+        status = view[:, STATUS].astype(np.int64)
+        running = view[status == STATUS_RUNNING]
+        report: Dict[str, Any] = {name: int(np.count_nonzero(status == i)) for i, name in enumerate(STATUS_NAMES)}
+        report.update({
+            "playing": int(np.count_nonzero(running[:, STATE] == State.READY.value)),
+            "bytes": int(view[:, BYTES].sum()),
+            "stalls": int(view[:, STALLS].sum()),
+            "stall_time": float(view[:, STALL_TIME].sum()),
+            "mean_bitrate": float(running[:, BITRATE].mean()) if len(running) > 0 else 0.0,
+            "mean_buffer_level": float(running[:, BUFFER_LEVEL].mean()) if len(running) > 0 else 0.0,
+        })
+        return report
+
+    def write_results(self, path: str):
+        """
+        Write the counters of the sessions to a CSV file
+
+        Parameters
+        ----------
+        path: str
+            The path of the CSV file
+        """
+        view = self.view.copy()
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("session", "mpd") + SESSION_FIELDS)
+            for session_id, row in enumerate(view):
+                mpd_url = self.sessions[session_id % len(self.sessions)][0]
+                writer.writerow([session_id, mpd_url, STATUS_NAMES[int(row[STATUS])], State(int(row[STATE])).name] +
+                                [float(value) for value in row[BYTES:]])
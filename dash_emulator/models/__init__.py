@@ -1,2 +1,2 @@
-from dash_emulator.models.mpd_objects import MPD, AdaptationSet, Segment, Representation
+from dash_emulator.models.mpd_objects import MPD, AdaptationSet, Segment, Representation, SegmentTimeline
 from dash_emulator.models.player_objects import State
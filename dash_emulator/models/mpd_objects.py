@@ -1,19 +1,28 @@
-from typing import List, Literal, Dict
+import bisect
+import math
+import re
+from array import array
+from collections.abc import Sequence
+from typing import Literal, Dict, Iterator, Union, List, Optional
 
 
 class MPD(object):
+    __slots__ = ("content", "url", "type", "media_presentation_duration", "min_buffer_time", "max_segment_duration",
+                 "adaptation_sets", "minimum_update_period")
+
     def __init__(self,
-                 content: str,
+                 content: Optional[str],
                  url: str,
                  type_: Literal["static", "dynamic"],
                  media_presentation_duration: float,
                  max_segment_duration: float,
                  min_buffer_time: float,
-                 adaptation_sets: Dict[int, 'AdaptationSet']
+                 adaptation_sets: Dict[int, 'AdaptationSet'],
+                 minimum_update_period: float = 0
                  ):
         self.content = content
         """
-        The raw content of the MPD file
+        The raw content of the MPD file, None if the parser doesn't keep it
         """
 
         self.url = url
@@ -46,8 +55,15 @@ class MPD(object):
         All the adaptation sets
         """
 
+        self.minimum_update_period = minimum_update_period
+        """
+        The minimum interval between two refreshes of a dynamic MPD file in seconds, 0 if it is not given
+        """
+
 
 class AdaptationSet(object):
+    __slots__ = ("id", "content_type", "frame_rate", "max_width", "max_height", "par", "representations")
+
     def __init__(self,
                  adaptation_set_id: int,
                  content_type: Literal["video", "audio"],
@@ -94,9 +110,11 @@ class AdaptationSet(object):
 
 
 class Representation(object):
+    __slots__ = ("id", "mime_type", "codecs", "bandwidth", "width", "height", "initialization", "segments")
+
     def __init__(self, id_: int, mime_type: str,
                  codecs: str, bandwidth: int, width: int, height: int,
-                 initialization: str, segments: List['Segment']):
+                 initialization: str, segments: 'Sequence[Segment]'):
         self.id = id_
         """
         The id of the representation
@@ -132,13 +150,15 @@ class Representation(object):
         The initialization URL
         """
 
-        self.segments: List[Segment] = segments
+        self.segments: Sequence[Segment] = segments
         """
-        The video segments
+        The video segments. It is a list, or a SegmentTimeline building the segments when they are accessed.
         """
 
 
 class Segment(object):
+    __slots__ = ("url", "duration")
+
     def __init__(self, url: str, duration: float):
         self.url = url
         """
@@ -149,3 +169,204 @@ class Segment(object):
         """
         The duration of the segment in seconds
         """
+
+
+class SegmentTimeline(Sequence):
+    __slots__ = ("base_url", "media", "start_number", "timescale", "_url_format", "_url_pattern", "_starts",
+                 "_durations", "_ends")
+
+    _template_variable = re.compile(r"\$(Number|Time)(%0?\d*d)?\$")
+
+    def __init__(self, base_url: str, media: str, start_number: int, timescale: int):
+        """
+        The segments of a SegmentTemplate with a SegmentTimeline.
+        The timeline is kept as runs of segments of the same duration, in arrays,
+        and the segments are built when they are accessed.
+
+        Parameters
+        ----------
+        base_url: str
+            The URL the media template is relative to
+        media: str
+            The media template, with $RepresentationID$ already replaced
+        start_number: int
+            The number of the first segment
+        timescale: int
+            The number of ticks per second of the start times and durations
+        """
+        self.base_url = base_url
+        self.media = media
+        self.start_number = start_number
+        self.timescale = timescale
+
+        self._url_format = self.compile_template(media)
+        self._url_pattern = self.compile_pattern(base_url + media)
+
+        # The start time, the duration, and the index after the last segment of each run, in ticks
+        self._starts = array('d')
+        self._durations = array('d')
+        self._ends = array('q')
+
+    @classmethod
+    def compile_template(cls, media: str) -> str:
+        """
+        Compile a media template to a %-format string with the named keys "Number" and "Time"
+
+        Parameters
+        ----------
+        media: str
+            The media template
+
+        Returns
+        -------
+        url_format: str
+            The format string
+        """
+        parts = []
+        position = 0
+        for match in cls._template_variable.finditer(media):
+            parts.append(media[position:match.start()].replace("%", "%%").replace("$$", "$"))
+            width = match.group(2)[1:] if match.group(2) is not None else "d"
+            parts.append("%%(%s)%s" % (match.group(1), width))
+            position = match.end()
+        parts.append(media[position:].replace("%", "%%").replace("$$", "$"))
+        return "".join(parts)
+
+    @classmethod
+    def compile_pattern(cls, media: str) -> 're.Pattern':
+        """
+        Compile a media template to a regular expression matching the URLs of the segments,
+        with the named groups "Number" and "Time"
+        """
+        parts = []
+        position = 0
+        for match in cls._template_variable.finditer(media):
+            parts.append(re.escape(media[position:match.start()].replace("$$", "$")))
+            name = match.group(1)
+            # A variable appearing twice must have the same value
+            parts.append("(?P=%s)" % name if "(?P<%s>" % name in "".join(parts) else "(?P<%s>\\d+)" % name)
+            position = match.end()
+        parts.append(re.escape(media[position:].replace("$$", "$")))
+        return re.compile("".join(parts))
+
+    def index_of(self, url: str) -> Optional[int]:
+        """
+        Find a segment by its URL without building the segments
+
+        Parameters
+        ----------
+        url: str
+            The URL of the segment
+
+        Returns
+        -------
+        index: int, optional
+            The index of the segment, None if no segment of the timeline has this URL
+        """
+        match = self._url_pattern.fullmatch(url)
+        if match is None or len(self) == 0:
+            return None
+        variables = match.groupdict()
+        if "Number" in variables:
+            index = int(variables["Number"]) - self.start_number
+        elif "Time" in variables:
+            time = int(variables["Time"])
+            run = max(bisect.bisect_right(self._starts, time) - 1, 0)
+            index = (self._ends[run - 1] if run > 0 else 0) + round((time - self._starts[run]) / self._durations[run])
+        else:
+            return None
+        if index < 0 or index >= len(self) or self[index].url != url:
+            return None
+        return index
+
+    def add_run(self, start: float, duration: float, count: int) -> None:
+        """
+        Add segments of the same duration at the end of the timeline
+
+        Parameters
+        ----------
+        start: float
+            The start time of the first segment, in ticks
+        duration: float
+            The duration of each segment, in ticks
+        count: int
+            The number of segments
+        """
+        if count <= 0:
+            return
+        if len(self._ends) > 0 and self._durations[-1] == duration and self.end_time == start:
+            # The segments continue the last run
+            self._ends[-1] += count
+            return
+        self._starts.append(start)
+        self._durations.append(duration)
+        self._ends.append(len(self) + count)
+
+    @property
+    def end_time(self) -> float:
+        """
+        The end time of the last segment in ticks, 0 if there are no segments
+        """
+        if len(self._ends) == 0:
+            return 0
+        count = self._ends[-1] - (self._ends[-2] if len(self._ends) > 1 else 0)
+        return self._starts[-1] + self._durations[-1] * count
+
+    def extend(self, other: 'SegmentTimeline') -> int:
+        """
+        Append the segments of a newer version of the timeline which start after the end of this one.
+        The segments already in this timeline keep their indices.
+
+        Parameters
+        ----------
+        other: SegmentTimeline
+            The newer timeline
+
+        Returns
+        -------
+        count: int
+            The number of segments appended
+        """
+        # Compare the times in the ticks of this timeline
+        scale = self.timescale / other.timescale
+        end_time = self.end_time
+        num_segments = len(self)
+        other_start = 0
+        for start, duration, other_end in zip(other._starts, other._durations, other._ends):
+            count = other_end - other_start
+            other_start = other_end
+            start *= scale
+            duration *= scale
+            if len(self) > 0 and start < end_time:
+                # Skip the segments already known. A small tolerance absorbs the rounding of the ticks.
+                skipped = min(math.ceil((end_time - start) / duration - 1e-6), count)
+                start += skipped * duration
+                count -= skipped
+            self.add_run(start, duration, count)
+        return len(self) - num_segments
+
+    def __len__(self) -> int:
+        return self._ends[-1] if len(self._ends) > 0 else 0
+
+    def _segment(self, run: int, index: int) -> 'Segment':
+        offset = index - (self._ends[run - 1] if run > 0 else 0)
+        duration = self._durations[run]
+        time = self._starts[run] + duration * offset
+        url = self.base_url + self._url_format % {"Number": self.start_number + index, "Time": time}
+        return Segment(url, duration / self.timescale)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union['Segment', List['Segment']]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("segment index out of range")
+        return self._segment(bisect.bisect_right(self._ends, index), index)
+
+    def __iter__(self) -> Iterator['Segment']:
+        index = 0
+        for run, end in enumerate(self._ends):
+            while index < end:
+                yield self._segment(run, index)
+                index += 1
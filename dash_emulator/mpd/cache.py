@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+import zlib
+from typing import Optional, Union
+
+from dash_emulator.models import MPD
+from dash_emulator.mpd.parser import MPDParser
+
+# Bump it whenever the model classes change, so that the entries of older versions are never loaded
+CACHE_VERSION = 3
+
+
+class MPDCache(object):
+    log = logging.getLogger("MPDCache")
+
+    # The suffix of the cache entries
+    suffix = ".mpd.z"
+
+    def __init__(self, folder: str, max_size: int = 256 * 1024 * 1024, compress_level: int = 1,
+                 scan_interval: int = 64):
+        """
+        An on-disk cache of parsed MPD objects, which can be shared by several processes.
+        The entries are pickled and compressed. They are written to a temporary file first, then renamed,
+        so that the other processes never read a partial entry.
+        The least recently used entries are evicted when the cache grows beyond its size.
+        The folder is only scanned when the size of the entries, estimated from the last scan and the entries
+        written since, goes beyond the maximum size, or every scan_interval writes to count the entries
+        written by the other processes.
+
+        Loading an entry unpickles it, which can run arbitrary code, so the folder must only be writable by
+        the user running the emulator. It is created with 0700 permissions, and an existing folder writable
+        by other users is refused.
+
+        Parameters
+        ----------
+        folder: str
+            The folder of the cache entries, only writable by the current user
+        max_size: int
+            The maximum total size of the entries, in bytes
+        compress_level: int
+            The zlib compression level of the entries
+        scan_interval: int
+            The maximum number of writes between two scans of the folder
+        """
+        self.folder = pathlib.Path(folder)
+        self.max_size = max_size
+        self.compress_level = compress_level
+        self.scan_interval = scan_interval
+
+        # The total size of the entries at the last scan plus the size of the entries written since,
+        # None until the first scan
+        self._size_estimate: Optional[int] = None
+        self._writes_since_scan = 0
+
+        self.folder.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.check_folder()
+
+    def check_folder(self) -> None:
+        """
+        Raises
+        ------
+        PermissionError
+            If the folder is owned or writable by another user, who could plant entries in it
+        """
+        stat = self.folder.stat()
+        if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+            raise PermissionError("The MPD cache folder %s is owned by another user" % self.folder)
+        if stat.st_mode & 0o022:
+            raise PermissionError("The MPD cache folder %s is writable by other users" % self.folder)
+
+    @staticmethod
+    def key(content: Union[str, bytes, bytearray], url: str, parser: str) -> str:
+        """
+        Parameters
+        ----------
+        content: str or bytes-like
+            The content of the MPD file
+        url: str
+            The URL of the MPD file, the segment URLs depend on it
+        parser: str
+            The cache key of the parser, see MPDParser.cache_key
+
+        Returns
+        -------
+        key: str
+            The key of the parsed MPD file
+        """
+        digest = hashlib.sha256()
+        digest.update(("%d\0%s\0%s\0" % (CACHE_VERSION, parser, url)).encode("utf-8"))
+        digest.update(content.encode("utf-8") if isinstance(content, str) else content)
+        return digest.hexdigest()
+
+    def path_of(self, key: str) -> pathlib.Path:
+        return self.folder / (key + self.suffix)
+
+    def get(self, key: str) -> Optional[MPD]:
+        """
+        Parameters
+        ----------
+        key: str
+            The key of the entry
+
+        Returns
+        -------
+        mpd: MPD, optional
+            The cached MPD object, None if it is not in the cache
+        """
+        path = self.path_of(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        try:
+            return pickle.loads(zlib.decompress(data))
+        except Exception as e:
+            self.log.warning("Drop the unreadable cache entry %s: %s" % (path, e))
+            self._remove(path)
+            return None
+
+    def put(self, key: str, mpd: MPD) -> None:
+        """
+        Parameters
+        ----------
+        key: str
+            The key of the entry
+        mpd: MPD
+            The MPD object to cache
+        """
+        data = zlib.compress(pickle.dumps(mpd, protocol=pickle.HIGHEST_PROTOCOL), self.compress_level)
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self.path_of(key))
+        except BaseException:
+            self._remove(pathlib.Path(temp_path))
+            raise
+        self._writes_since_scan += 1
+        if self._size_estimate is not None:
+            # A replaced entry is still counted, it only makes the next scan come earlier
+            self._size_estimate += len(data)
+        if self._size_estimate is None or self._size_estimate > self.max_size or \
+                self._writes_since_scan >= self.scan_interval:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache is not larger than its size
+        """
+        entries = []
+        total_size = 0
+        for path in self.folder.glob("*" + self.suffix):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
+        self._size_estimate = total_size
+        self._writes_since_scan = 0
+
+    @staticmethod
+    def _remove(path: pathlib.Path) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class CachingMPDParser(MPDParser):
+    log = logging.getLogger("CachingMPDParser")
+
+    def __init__(self, parser: MPDParser, cache: MPDCache):
+        """
+        A parser returning the MPD objects from a cache when it has already parsed the same MPD file,
+        without parsing the XML at all. When the parser keeps the content as it is given, the content isn't
+        stored in the cache, it is set on the cached MPD object again when it is loaded.
+        The entries are kept apart by the cache key of the parser, so parsers configured differently never
+        share them.
+
+        Parameters
+        ----------
+        parser: MPDParser
+            The parser of the MPD files missing in the cache
+        cache: MPDCache
+            The cache of the parsed MPD objects
+        """
+        self.parser = parser
+        self.cache = cache
+
+    def parse(self, content: str, url: str) -> MPD:
+        key = self.cache.key(content, url, self.parser.cache_key)
+        mpd = self.cache.get(key)
+        if mpd is not None:
+            self.log.info("Cache hit for %s" % url)
+            if mpd.content == "":
+                mpd.content = content
+            return mpd
+        mpd = self.parser.parse(content, url)
+        raw_content = mpd.content
+        if raw_content is not None and raw_content == content:
+            # An empty content tells that the parser keeps the content as it is given.
+            # A content the parser changed, e.g. without its namespace, is stored as it is.
+            mpd.content = ""
+        try:
+            self.cache.put(key, mpd)
+        except Exception as e:
+            # The MPD file is parsed anyway, the next parse of the same file only misses the cache
+            self.log.warning("Cannot cache the MPD file %s: %s" % (url, e))
+        finally:
+            mpd.content = raw_content
+        return mpd
@@ -2,11 +2,11 @@ import logging
 import os
 import re
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Dict, Optional, Union
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
 
-from dash_emulator.models import MPD, AdaptationSet, Representation, Segment
+from dash_emulator.models import MPD, AdaptationSet, Representation, SegmentTimeline
 
 
 class MPDParsingException(Exception):
@@ -18,6 +18,14 @@ class MPDParser(ABC):
     def parse(self, content: str, url: str) -> MPD:
         pass
 
+    @property
+    def cache_key(self) -> str:
+        """
+        The name of the parser and of its configuration.
+        Parsers with the same cache key must parse the same content to the same MPD objects.
+        """
+        return type(self).__name__
+
 
 class DefaultMPDParser(MPDParser):
     log = logging.getLogger("DefaultMPDParser")
@@ -75,8 +83,11 @@ class DefaultMPDParser(MPDParser):
             adaptation_set: AdaptationSet = self.parse_adaptation_set(adaptation_set_xml, base_url)
             adaptation_sets[adaptation_set.id] = adaptation_set
 
+        # minimum update period
+        minimum_update_period = self.parse_iso8601_time(root.attrib.get("minimumUpdatePeriod", ""))
+
         return MPD(content, url, type_, media_presentation_duration, max_segment_duration, min_buffer_time,
-                   adaptation_sets)
+                   adaptation_sets, minimum_update_period)
 
     def parse_adaptation_set(self, tree: Element, base_url) -> AdaptationSet:
         id_ = tree.attrib.get("id")
@@ -111,24 +122,164 @@ class DefaultMPDParser(MPDParser):
         segment_template: Element = tree.find("SegmentTemplate")
         initialization = segment_template.attrib.get("initialization").replace("$RepresentationID$", id_)
         initialization = base_url + initialization
-        segments: List[Segment] = []
 
         timescale = int(segment_template.attrib.get("timescale"))
         media = segment_template.attrib.get("media").replace("$RepresentationID$", id_)
         start_number = int(segment_template.attrib.get('startNumber'))
+        segments = SegmentTimeline(base_url, media, start_number, timescale)
 
         segment_timeline = segment_template.find("SegmentTimeline")
 
-        num = start_number
         for segment in segment_timeline:  # type: Element
-            duration = float(segment.attrib.get("d")) / timescale
-            url = base_url + re.sub(r"\$Number(%\d+d)\$", r"\1", media) % num
-            segments.append(Segment(url, duration))
-            num += 1
-
-            if 'r' in segment.attrib:  # repeat
-                for _ in range(int(segment.attrib.get('r'))):
-                    url = base_url + re.sub(r"\$Number(%\d+d)\$", r"\1", media) % num
-                    segments.append(Segment(url, duration))
-                    num += 1
+            duration = float(segment.attrib.get("d"))
+            start = float(segment.attrib["t"]) if "t" in segment.attrib else segments.end_time
+            # The segment itself and its repeats
+            segments.add_run(start, duration, 1 + max(int(segment.attrib.get('r', 0)), 0))
         return Representation(int(id_), mime, codec, bandwidth, width, height, initialization, segments)
+
+
+class _StreamingMPDTarget(object):
+    """
+    The target of the XML parser of StreamingMPDParser.
+    It receives the start and the end of each element, and builds the MPD objects without any document tree.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+        self.root: Optional[Dict[str, str]] = None
+        self.num_periods = 0
+        self.in_period = False
+        self.adaptation_sets: Dict[int, AdaptationSet] = {}
+
+        self._adaptation_set: Optional[Dict[str, str]] = None
+        self._representations: Dict[int, Representation] = {}
+        self._representation: Optional[Dict[str, str]] = None
+        self._segment_template: Optional[Dict[str, str]] = None
+        self._segments: Optional[SegmentTimeline] = None
+        self._in_timeline = False
+        self._names: Dict[str, str] = {}
+
+    def _local_name(self, tag: str) -> str:
+        name = self._names.get(tag)
+        if name is None:
+            # Remove the namespace
+            name = self._names[tag] = tag.rpartition("}")[2]
+        return name
+
+    def start(self, tag: str, attrib: Dict[str, str]):
+        name = self._local_name(tag)
+        if name == "S":
+            if self._in_timeline:
+                segments = self._segments
+                start = float(attrib["t"]) if "t" in attrib else segments.end_time
+                # The segment itself and its repeats
+                segments.add_run(start, float(attrib.get("d")), 1 + max(int(attrib.get('r', 0)), 0))
+        elif self.root is None:
+            self.root = attrib
+        elif name == "Period":
+            self.num_periods += 1
+            # Only the first period is played
+            self.in_period = self.num_periods == 1
+        elif not self.in_period:
+            return
+        elif name == "AdaptationSet":
+            self._adaptation_set = attrib
+            self._representations = {}
+        elif name == "Representation":
+            self._representation = attrib
+        elif name == "SegmentTemplate" and self._representation is not None:
+            self._segment_template = attrib
+        elif name == "SegmentTimeline" and self._segment_template is not None:
+            template = self._segment_template
+            media = template.get("media").replace("$RepresentationID$", self._representation["id"])
+            self._segments = SegmentTimeline(self.base_url, media, int(template.get("startNumber")),
+                                             int(template.get("timescale")))
+            self._in_timeline = True
+
+    def end(self, tag: str):
+        name = self._local_name(tag)
+        if name == "S" or not self.in_period:
+            return
+        if name == "SegmentTimeline":
+            self._in_timeline = False
+        elif name == "Representation":
+            representation = self._build_representation()
+            self._representations[representation.id] = representation
+            self._representation = None
+            self._segment_template = None
+            self._segments = None
+        elif name == "AdaptationSet":
+            adaptation_set = self._build_adaptation_set()
+            self.adaptation_sets[adaptation_set.id] = adaptation_set
+            self._adaptation_set = None
+        elif name == "Period":
+            self.in_period = False
+
+    def _build_adaptation_set(self) -> AdaptationSet:
+        attrib = self._adaptation_set
+        max_width = attrib.get("maxWidth")
+        max_height = attrib.get("maxHeight")
+        return AdaptationSet(int(attrib.get("id")), attrib.get("contentType"), attrib.get("frameRate", None),
+                             int(max_width) if max_width is not None else 0,
+                             int(max_height) if max_height is not None else 0,
+                             attrib.get("par", None), self._representations)
+
+    def _build_representation(self) -> Representation:
+        attrib = self._representation
+        template = self._segment_template
+        if template is None or self._segments is None:
+            raise MPDParsingException("The MPD support is not complete yet")
+        id_ = attrib['id']
+        initialization = self.base_url + template.get("initialization").replace("$RepresentationID$", id_)
+        return Representation(int(id_), attrib['mimeType'], attrib['codecs'], int(attrib['bandwidth']),
+                              int(attrib['width']), int(attrib['height']), initialization, self._segments)
+
+    def close(self):
+        pass
+
+
+class StreamingMPDParser(DefaultMPDParser):
+    log = logging.getLogger("StreamingMPDParser")
+
+    # The number of characters fed to the XML parser at once
+    feed_size = 65536
+
+    def __init__(self, keep_content: bool = True):
+        """
+        An MPD parser for very large manifests. It feeds the manifest to the XML parser piece by piece,
+        handles the XML namespaces, and builds the MPD objects from the parser events,
+        so the document tree never exists in memory. It supports the same subset of MPEG-DASH as DefaultMPDParser.
+
+        Parameters
+        ----------
+        keep_content: bool
+            If it is False, the raw content is not kept on the MPD object, and MPD.content is None.
+        """
+        self.keep_content = keep_content
+
+    @property
+    def cache_key(self) -> str:
+        return "%s(keep_content=%s)" % (type(self).__name__, self.keep_content)
+
+    def parse(self, content: Union[str, bytes], url: str) -> MPD:
+        target = _StreamingMPDTarget(os.path.dirname(url) + '/')
+        parser = ElementTree.XMLParser(target=target)
+        for position in range(0, len(content), self.feed_size):
+            parser.feed(content[position:position + self.feed_size])
+        parser.close()
+
+        if target.root is None:
+            raise MPDParsingException("The MPD file is empty")
+        if target.num_periods == 0:
+            error_msg = """Cannot find "Period" tag"""
+            self.log.error(error_msg)
+            raise MPDParsingException(error_msg)
+
+        root = target.root
+        return MPD(content if self.keep_content else None, url, root["type"],
+                   self.parse_iso8601_time(root.get("mediaPresentationDuration", "")),
+                   self.parse_iso8601_time(root.get("maxSegmentDuration", "")),
+                   self.parse_iso8601_time(root.get("minBufferTime", "")),
+                   target.adaptation_sets,
+                   self.parse_iso8601_time(root.get("minimumUpdatePeriod", "")))
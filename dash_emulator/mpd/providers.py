@@ -1,19 +1,35 @@
 import asyncio
+import logging
+import time
 from abc import ABC, abstractmethod
 from asyncio import Task
-from typing import Optional
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Dict, Tuple, Union
 
+from dash_emulator.clock import Clock, SystemClock
 from dash_emulator.download import DownloadManager
-from dash_emulator.models import MPD
+from dash_emulator.models import MPD, SegmentTimeline
 from dash_emulator.mpd.parser import MPDParser
 
 
+class MPDDownloadException(Exception):
+    pass
+
+
 class MPDProvider(ABC):
     @property
     @abstractmethod
     def mpd(self) -> MPD:
         pass
 
+    @property
+    def version(self) -> int:
+        """
+        The version of the MPD object. It changes whenever the provider delivers a new version of the MPD file,
+        so that the users can invalidate what they computed from the previous one.
+        """
+        return 0
+
     @abstractmethod
     async def start(self, mpd_url):
         """
@@ -33,40 +49,218 @@ class MPDProvider(ABC):
         pass
 
 
+def parse_timed(parser: MPDParser, content: Union[bytes, bytearray], url: str) -> Tuple[MPD, float]:
+    """
+    Decode and parse an MPD file, and measure how long it takes.
+    It is a module function so that it can run in a process pool.
+
+    Returns
+    -------
+    mpd: MPD
+        The parsed MPD object
+    parse_time: float
+        The time the parsing took, in seconds
+    """
+    start = time.perf_counter()
+    mpd = parser.parse(content.decode("utf-8"), url=url)
+    return mpd, time.perf_counter() - start
+
+
+class MPDParseStats(object):
+    def __init__(self):
+        """
+        The statistics of the MPD parsing of a provider
+        """
+        self.num_parses = 0
+        """
+        The number of times the MPD file was parsed
+        """
+
+        self.num_not_modified = 0
+        """
+        The number of refreshes skipped because the MPD file had not changed
+        """
+
+        self.num_failed = 0
+        """
+        The number of refreshes skipped because the server answered with an error, or because the MPD file
+        couldn't be downloaded or parsed
+        """
+
+        self.last_parse_time = 0.0
+        """
+        The duration of the last parse in seconds
+        """
+
+        self.total_parse_time = 0.0
+        """
+        The total duration of the parses in seconds
+        """
+
+        self.lag_avoided = 0.0
+        """
+        The total time of the parses run in a process pool, which would have blocked the event loop otherwise,
+        in seconds. The parses run in a thread pool are not counted, they still hold the interpreter lock
+        and slow the event loop down.
+        """
+
+
 class MPDProviderImpl(MPDProvider):
-    def __init__(self, parser: MPDParser, update_interval: float, download_manager: DownloadManager):
+    log = logging.getLogger("MPDProviderImpl")
+
+    def __init__(self, parser: MPDParser, update_interval: float, download_manager: DownloadManager,
+                 clock: Clock = None, parse_executor: Optional[Executor] = None, shutdown_executor: bool = False):
         """
+        The MPD file of a dynamic stream is refreshed with conditional requests, and it is not parsed again
+        if it has not changed. When it has changed, the new segments are appended to the timelines of the
+        current MPD object, so the segment indices stay valid.
+        A changed MPD file is still parsed in full, only the merge is incremental: the parser has no way
+        to read the new segments of a timeline alone. Use a parse executor to keep large MPD files
+        off the event loop.
+
         Parameters
         ----------
         parser: MPDParser
             An MPDParser instance which parse the MPD text to MPD objects
         update_interval: float
-            The interval between updating intervals if the mpd file is dynamic
+            The interval between updating intervals if the mpd file is dynamic,
+            unless the MPD file gives a minimumUpdatePeriod
         download_manager : DownloadManager
             The download manager instance
             This download manager should be a different instance from the one used to download video payloads
+        clock: Clock
+            The clock used to wait between updates
+        parse_executor: Executor, optional
+            If it is given, the MPD file is parsed in this executor instead of on the event loop,
+            and the new MPD object is swapped in when the parsing is done.
+            With a process pool, the parser must be picklable, and the event loop is never blocked.
+            With a thread pool, the event loop still shares the interpreter with the parsing thread.
+        shutdown_executor: bool
+            If the provider owns the parse executor and shuts it down when it stops.
+            An executor shared by many providers is shut down by its owner instead.
         """
         self.parser = parser
         self.update_interval = update_interval
         self.download_manager = download_manager
+        self.clock = clock if clock is not None else SystemClock()
+        self.parse_executor = parse_executor
+        self.shutdown_executor = shutdown_executor
+        self.parse_stats = MPDParseStats()
 
         self.mpd_url: Optional[str] = None
         self._mpd: Optional[MPD] = None
         self._task: Optional[Task] = None
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._version = 0
 
     @property
     def mpd(self) -> MPD:
         return self._mpd
 
+    @property
+    def version(self) -> int:
+        return self._version
+
     async def update(self):
-        content = await self.download_manager.download(self.mpd_url, save=True)
-        text = content.decode("utf-8")
-        self._mpd = self.parser.parse(text, url=self.mpd_url)
+        """
+        Download the MPD file, and parse it if it has changed.
+        If the server answers with an error, the current MPD object and its validators are kept.
+
+        Raises
+        ------
+        MPDDownloadException
+            If the server answers the first request with an error
+        """
+        headers: Dict[str, str] = {}
+        if self._etag is not None:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified is not None:
+            headers["If-Modified-Since"] = self._last_modified
+        handle = self.download_manager.submit(self.mpd_url, save=True, headers=headers)
+        content = await handle.wait()
+        if handle.status == 304 and self._mpd is not None:
+            # Not modified
+            self.parse_stats.num_not_modified += 1
+            return
+        if handle.status is not None and not 200 <= handle.status < 300:
+            if self._mpd is None:
+                raise MPDDownloadException("Cannot download the MPD file %s: HTTP %d" % (self.mpd_url, handle.status))
+            # Keep the current MPD and its validators, the next refresh tries again
+            self.parse_stats.num_failed += 1
+            self.log.warning("Cannot refresh the MPD file %s: HTTP %d" % (self.mpd_url, handle.status))
+            return
+        self._etag = handle.headers.get("ETag")
+        self._last_modified = handle.headers.get("Last-Modified")
+        if self.parse_executor is not None:
+            mpd, parse_time = await asyncio.get_running_loop().run_in_executor(
+                self.parse_executor, parse_timed, self.parser, content, self.mpd_url)
+            if isinstance(self.parse_executor, ProcessPoolExecutor):
+                self.parse_stats.lag_avoided += parse_time
+        else:
+            mpd, parse_time = parse_timed(self.parser, content, self.mpd_url)
+        self.parse_stats.num_parses += 1
+        self.parse_stats.last_parse_time = parse_time
+        self.parse_stats.total_parse_time += parse_time
+        self.log.info("MPD parsed in %.3f s%s" % (parse_time, " in an executor" if self.parse_executor else ""))
+        # The new MPD is swapped in at once, on the event loop
+        if self._mpd is None:
+            self._mpd = mpd
+        else:
+            self.merge(mpd)
+        self._version += 1
+
+    def merge(self, mpd: MPD):
+        """
+        Merge a newer version of the MPD file into the current MPD object.
+        The new segments are appended to the segment timelines, the other values are replaced.
+
+        Parameters
+        ----------
+        mpd: MPD
+            The newer version of the MPD file
+        """
+        current = self._mpd
+        current.content = mpd.content
+        current.type = mpd.type
+        current.media_presentation_duration = mpd.media_presentation_duration
+        current.min_buffer_time = mpd.min_buffer_time
+        current.max_segment_duration = mpd.max_segment_duration
+        current.minimum_update_period = mpd.minimum_update_period
+        num_segments = 0
+        for adaptation_set_id, adaptation_set in mpd.adaptation_sets.items():
+            current_adaptation_set = current.adaptation_sets.get(adaptation_set_id)
+            if current_adaptation_set is None:
+                current.adaptation_sets[adaptation_set_id] = adaptation_set
+                continue
+            for representation_id, representation in adaptation_set.representations.items():
+                current_representation = current_adaptation_set.representations.get(representation_id)
+                if current_representation is not None and \
+                        isinstance(current_representation.segments, SegmentTimeline) and \
+                        isinstance(representation.segments, SegmentTimeline):
+                    num_segments += current_representation.segments.extend(representation.segments)
+                else:
+                    current_adaptation_set.representations[representation_id] = representation
+        self.log.info("MPD refreshed, %d new segments" % num_segments)
+
+    @property
+    def refresh_interval(self) -> float:
+        """
+        The interval between two refreshes of the MPD file, in seconds
+        """
+        if self._mpd is not None and self._mpd.minimum_update_period > 0:
+            return self._mpd.minimum_update_period
+        return self.update_interval
 
     async def update_repeatedly(self):
         while True:
-            await self.update()
-            await asyncio.sleep(self.update_interval)
+            await self.clock.sleep(self.refresh_interval)
+            try:
+                await self.update()
+            except Exception as e:
+                # Keep the current MPD, the next refresh tries again
+                self.parse_stats.num_failed += 1
+                self.log.warning("Cannot refresh the MPD file %s: %r" % (self.mpd_url, e))
 
     async def start(self, mpd_url):
         self.mpd_url = mpd_url
@@ -80,3 +274,5 @@ class MPDProviderImpl(MPDProvider):
         if self._task is not None:
             self._task.cancel()
         await self.download_manager.close()
+        if self.shutdown_executor and self.parse_executor is not None:
+            self.parse_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,147 @@
+from typing import Dict, Optional, List, Tuple
+
+from dash_emulator.models import MPD, Representation, SegmentTimeline
+from dash_emulator.mpd.parser import MPDParser, DefaultMPDParser
+
+
+class OriginException(Exception):
+    pass
+
+
+class SyntheticOrigin(object):
+    def __init__(self, init_segment_size: int = 1000):
+        """
+        An in-memory origin server. It serves the registered contents as they are, and synthetic
+        bytes for the media segments, sized after the bitrate and the duration of each segment.
+
+        Parameters
+        ----------
+        init_segment_size: int
+            The size of the initialization segments in bytes
+        """
+        self.init_segment_size = init_segment_size
+
+        self._contents: Dict[str, bytes] = {}
+        self._sizes: Dict[str, int] = {}
+        # The representations whose segments are sized when they are requested, and the latest size found
+        self._timelines: List[Representation] = []
+        self._last_lookup: Optional[Tuple[str, int]] = None
+
+    def add_content(self, url: str, content: bytes) -> None:
+        """
+        Serve some bytes at a URL
+
+        Parameters
+        ----------
+        url: str
+            The full URL of the content
+        content: bytes
+            The content to serve
+        """
+        self._contents[url] = content
+        self._sizes[url] = len(content)
+
+    def add_size(self, url: str, size: int) -> None:
+        """
+        Serve synthetic bytes at a URL
+
+        Parameters
+        ----------
+        url: str
+            The full URL of the content
+        size: int
+            The number of bytes to serve
+        """
+        self._sizes[url] = size
+
+    def add_mpd(self, mpd: MPD) -> None:
+        """
+        Serve synthetic media segments and initialization segments for all the representations of an MPD.
+        The segments of a SegmentTimeline are not built, they are found and sized when they are requested.
+
+        Parameters
+        ----------
+        mpd: MPD
+            The MPD object whose segments should be served
+        """
+        for adaptation_set in mpd.adaptation_sets.values():
+            for representation in adaptation_set.representations.values():
+                self._sizes.setdefault(representation.initialization, self.init_segment_size)
+                if isinstance(representation.segments, SegmentTimeline):
+                    self._timelines.append(representation)
+                    continue
+                for segment in representation.segments:
+                    self._sizes[segment.url] = int(representation.bandwidth * segment.duration / 8)
+
+    def add_mpd_content(self, url: str, content: str, parser: Optional[MPDParser] = None) -> MPD:
+        """
+        Serve an MPD file, together with synthetic segments for everything it references
+
+        Parameters
+        ----------
+        url: str
+            The URL of the MPD file
+        content: str
+            The content of the MPD file
+        parser: MPDParser
+            The parser used to find the segments, DefaultMPDParser by default
+
+        Returns
+        -------
+        mpd: MPD
+            The parsed MPD object
+        """
+        parser = parser if parser is not None else DefaultMPDParser()
+        mpd = parser.parse(content, url)
+        self.add_content(url, content.encode("utf-8"))
+        self.add_mpd(mpd)
+        return mpd
+
+    def size(self, url: str) -> int:
+        """
+        Parameters
+        ----------
+        url: str
+            The requested URL
+
+        Returns
+        -------
+        size: int
+            The size of the content in bytes
+        """
+        size = self._sizes.get(url)
+        if size is not None:
+            return size
+        # The chunks of a segment are read one after another
+        if self._last_lookup is not None and self._last_lookup[0] == url:
+            return self._last_lookup[1]
+        for representation in self._timelines:
+            index = representation.segments.index_of(url)
+            if index is not None:
+                size = int(representation.bandwidth * representation.segments[index].duration / 8)
+                self._last_lookup = (url, size)
+                return size
+        raise OriginException("Not found: %s" % url)
+
+    def read(self, url: str, position: int, length: int) -> bytes:
+        """
+        Read a part of the content
+
+        Parameters
+        ----------
+        url: str
+            The requested URL
+        position: int
+            The position to read from, in bytes
+        length: int
+            The number of bytes to read
+
+        Returns
+        -------
+        content: bytes
+            The bytes read
+        """
+        content = self._contents.get(url)
+        if content is not None:
+            return content[position:position + length]
+        return bytes(max(min(length, self.size(url) - position), 0))
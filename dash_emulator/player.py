@@ -1,12 +1,12 @@
 import asyncio
-import time
 from abc import ABC, abstractmethod
 from typing import Optional, List
 
-from dash_emulator.buffer import BufferManager
+from dash_emulator.buffer import BufferManager, BufferEventListener
+from dash_emulator.clock import Clock, SystemClock
 from dash_emulator.models import State, MPD
 from dash_emulator.mpd import MPDProvider
-from dash_emulator.scheduler import Scheduler
+from dash_emulator.scheduler import Scheduler, SchedulerEventListener
 from dash_emulator.service import AsyncService
 
 
@@ -65,7 +65,13 @@ class Player(ABC):
         pass
 
 
-class DASHPlayer(Player):
+class DASHPlayer(Player, BufferEventListener, SchedulerEventListener):
+    # The interval between two position reports to the listeners, in seconds
+    position_report_interval = 1
+
+    # The deadlines closer than this are considered reached, in seconds, so that rounding errors can't stall the loop
+    time_tolerance = 1e-6
+
     def __init__(self,
                  update_interval: float,
                  min_rebuffer_duration: float,
@@ -74,12 +80,16 @@ class DASHPlayer(Player):
                  mpd_provider: MPDProvider,
                  scheduler: Scheduler,
                  listeners: List[PlayerEventListener],
-                 services: List[AsyncService] = None):
+                 services: List[AsyncService] = None,
+                 clock: Clock = None):
         """
         Parameters
         ----------
         update_interval
-            The interval between each loop
+            The interval between two checks of the end of the scheduler while the player is buffering,
+            only used if the scheduler doesn't support listeners. Otherwise, the main loop only wakes up when
+            a segment is enqueued, when the scheduler ends, when the buffer runs out, or when the position must
+            be reported.
 
         min_rebuffer_duration
             The buffer level needed to restore the playback from stalls
@@ -90,9 +100,14 @@ class DASHPlayer(Player):
         scheduler
             The scheduler which controls the segment downloads
         buffer_manager
-            The buffer manager
+            The buffer manager.
+            When it tracks several adaptation sets, the playback depends on the lowest buffer level among them.
         listeners:
             A list of player event listeners
+        services:
+            A list of services started with the playback
+        clock:
+            The clock driving the playback. Use a VirtualClock to emulate in simulated time.
         """
         self.update_interval = update_interval
 
@@ -104,6 +119,7 @@ class DASHPlayer(Player):
         self.mpd_provider = mpd_provider
         self.listeners = listeners
         self.services = services if services is not None else []
+        self.clock = clock if clock is not None else SystemClock()
 
         # MPD related
         self._mpd_obj: Optional[MPD] = None
@@ -118,11 +134,27 @@ class DASHPlayer(Player):
         self._playback_started = False
         self._position = 0.0
 
+        # The buffer level last given to the listeners
+        self._buffer_level: Optional[float] = None
+
+        # Set when a segment is enqueued or when the scheduler ends, to wake the main loop up
+        self._buffer_event = asyncio.Event()
+        self.buffer_manager.add_listener(self)
+        # If the scheduler doesn't tell its end, the main loop checks it every update interval while buffering
+        self._scheduler_end_notified = self.scheduler.add_listener(self)
+
+        self.wakeups = 0
+        """
+        The number of times the main loop woke up
+        """
+
     @property
     def state(self) -> State:
         return self._state
 
     async def _switch_state(self, old_state: State, new_state: State):
+        # The buffer only drains while playing
+        self.scheduler.notify_playback(self._position, 1 if new_state == State.READY else 0)
         for listener in self.listeners:
             await listener.on_state_change(self._position, old_state, new_state)
 
@@ -131,21 +163,25 @@ class DASHPlayer(Player):
         for service in self.services:
             asyncio.create_task(service.start())
 
-        # If the player doesn't have an MPD object, the player waits for it
-        # Else the player doesn't wait for it
-        if self._mpd_obj is None:
-            await self.mpd_provider.start(mpd_url)
-            self._mpd_obj = self.mpd_provider.mpd
-        else:
-            asyncio.create_task(self.mpd_provider.start(mpd_url))
-
-        # Start the scheduler
-        self._state = State.BUFFERING
-        self.scheduler.start(adaptation_sets=self._mpd_obj.adaptation_sets)
-
-        self._main_loop_task = await self.main_loop()
-
-        await self.scheduler.stop()
+        try:
+            # If the player doesn't have an MPD object, the player waits for it
+            # Else the player doesn't wait for it
+            if self._mpd_obj is None:
+                await self.mpd_provider.start(mpd_url)
+                self._mpd_obj = self.mpd_provider.mpd
+            else:
+                asyncio.create_task(self.mpd_provider.start(mpd_url))
+
+            # Start the scheduler
+            self._state = State.BUFFERING
+            self.scheduler.notify_playback(self._position, 0)
+            self.scheduler.start(adaptation_sets=self._mpd_obj.adaptation_sets)
+
+            self._main_loop_task = await self.main_loop()
+        finally:
+            # The downloads and the MPD updates are stopped even if the playback is canceled or fails to start
+            await self.scheduler.stop()
+            await self.mpd_provider.stop()
 
     def stop(self) -> None:
         raise NotImplementedError
@@ -153,15 +189,36 @@ class DASHPlayer(Player):
     def pause(self) -> None:
         raise NotImplementedError
 
+    def on_buffer_enqueued(self, duration: float, adaptation_set_id: Optional[int]) -> None:
+        self._buffer_event.set()
+
+    def on_track_ended(self, adaptation_set_id: int) -> None:
+        self._buffer_event.set()
+
+    async def on_segment_download_start(self, index, selections):
+        pass
+
+    async def on_segment_download_complete(self, index):
+        pass
+
+    async def on_scheduler_end(self):
+        self._buffer_event.set()
+
     async def main_loop(self):
         """
         The main loop.
         This method coordinate work between different components.
+        It wakes up when a segment is enqueued, a track ends or the scheduler ends, when the buffer is predicted
+        to run out during the playback, and when the position must be reported.
+        The listeners only get the buffer level when it has changed.
         """
         timestamp = 0
-        last_position_update = -1
+        next_position_update = 0
         while True:
-            now = time.time()
+            self.wakeups += 1
+            # The segments enqueued from now on wake the loop up again
+            self._buffer_event.clear()
+            now = self.clock.time()
             interval = now - timestamp
             timestamp = now
 
@@ -170,15 +227,17 @@ class DASHPlayer(Player):
 
             if self._state == State.READY:
                 self._position += interval
-                if (now - last_position_update) > 1:
+                if now >= next_position_update - self.time_tolerance:
                     for listener in self.listeners:
                         await listener.on_position_change(self._position)
-                    last_position_update = now
+                    next_position_update = now + self.position_report_interval
 
             self.buffer_manager.update_buffer(self._position)
             buffer_level = self.buffer_manager.buffer_level
-            for listener in self.listeners:
-                await listener.on_buffer_level_change(buffer_level)
+            if buffer_level != self._buffer_level:
+                self._buffer_level = buffer_level
+                for listener in self.listeners:
+                    await listener.on_buffer_level_change(buffer_level)
 
             if self._state == State.READY:
                 if buffer_level <= 0:
@@ -191,9 +250,11 @@ class DASHPlayer(Player):
                         self._state = State.BUFFERING
             elif self._state == State.BUFFERING:
                 if self.scheduler.is_end:
+                    # No more segments will come, play the rest of the buffer
+                    self._playback_started = True
                     await self._switch_state(self._state, State.READY)
                     self._state = State.READY
-                if not self._playback_started:
+                elif not self._playback_started:
                     if buffer_level > self.min_start_buffer_duration:
                         self._playback_started = True
                         await self._switch_state(self._state, State.READY)
@@ -203,4 +264,12 @@ class DASHPlayer(Player):
                         await self._switch_state(self._state, State.READY)
                         self._state = State.READY
 
-            await asyncio.sleep(min(buffer_level, self.update_interval) if buffer_level > 0 else self.update_interval)
+            if self._state == State.READY:
+                # The buffer runs out or the position must be reported, unless a segment is enqueued first
+                timeout = max(min(buffer_level, next_position_update - now), self.time_tolerance)
+            elif self._scheduler_end_notified:
+                # Only a segment or the end of the scheduler can change the state
+                timeout = None
+            else:
+                timeout = self.update_interval
+            await self.clock.wait_event(self._buffer_event, timeout)
@@ -1,33 +1,157 @@
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Sequence, Any
+
+import aiohttp
+
 from dash_emulator.abr import DashABRController
-from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.bandwidth import BandwidthMeterImpl, BandwidthUpdateListener
 from dash_emulator.buffer import BufferManagerImpl, BufferManager
+from dash_emulator.clock import Clock, SystemClock
 from dash_emulator.config import Config
-from dash_emulator.download import DownloadManagerImpl
+from dash_emulator.download import DownloadManagerImpl, DownloadManager, DownloadEventListener
 from dash_emulator.event_logger import EventLogger
-from dash_emulator.mpd.parser import DefaultMPDParser
+from dash_emulator.mpd.cache import MPDCache, CachingMPDParser
+from dash_emulator.mpd.parser import DefaultMPDParser, MPDParser
 from dash_emulator.mpd.providers import MPDProviderImpl, MPDProvider
-from dash_emulator.player import Player, DASHPlayer
-from dash_emulator.scheduler import SchedulerImpl, Scheduler
+from dash_emulator.origin import SyntheticOrigin
+from dash_emulator.player import Player, DASHPlayer, PlayerEventListener
+from dash_emulator.rate_limit import TokenBucket, RateSchedule
+from dash_emulator.scheduler import SchedulerImpl, Scheduler, SchedulerEventListener
+from dash_emulator.trace_download import TraceDownloadManager, TraceLink
+from dash_emulator.traces import ThroughputTrace
+
+
+def create_parse_executor() -> Optional[Executor]:
+    """
+    Returns
+    -------
+    executor: Executor, optional
+        A new executor to parse the MPD files as configured, None to parse them on the event loop
+    """
+    if Config.mpd_parse_executor == "thread":
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix="MPDParser")
+    elif Config.mpd_parse_executor == "process":
+        return ProcessPoolExecutor(max_workers=1)
+    return None
 
 
-def build_dash_player() -> Player:
+def build_dash_player(clock: Clock = None,
+                      mpd_download_manager: DownloadManager = None,
+                      download_manager: DownloadManager = None,
+                      output_folder: Optional[str] = None,
+                      session: Optional[aiohttp.ClientSession] = None,
+                      listeners: Sequence[Any] = (),
+                      rate_limit: Optional[float] = None,
+                      parse_executor: Optional[Executor] = None) -> DASHPlayer:
     """
     Build a MPEG-DASH Player
 
+    Parameters
+    ----------
+    clock: Clock
+        The clock shared by all the components. The wall clock is used if it is not given.
+    mpd_download_manager: DownloadManager
+        The download manager to fetch the MPD file. An HTTP download manager is used if it is not given.
+    download_manager: DownloadManager
+        The download manager to fetch the segments. An HTTP download manager is used if it is not given.
+    output_folder: str, optional
+        If it is given, the HTTP download managers write everything they download under this folder.
+    session: aiohttp.ClientSession, optional
+        If it is given, the HTTP download managers use this session and its connection pool,
+        which can be shared by many players.
+    listeners: Sequence
+        More listeners of the player. Each one is added to the player, the scheduler, the bandwidth meter and
+        the segment download manager, depending on the listener interfaces it implements.
+    rate_limit: float, optional
+        The rate limit of this player in bps, instead of the one of the configuration
+    parse_executor: Executor, optional
+        The executor to parse the MPD file in, which can be shared by many players. The caller owns it and
+        shuts it down. If it is not given, the player creates its own executor as configured, and shuts it down
+        when it stops.
+
     Returns
     -------
     player: Player
         A MPEG-DASH Player
     """
     cfg = Config
+    clock = clock if clock is not None else SystemClock()
+    write_to_disk = output_folder is not None
+    # The HTTP download managers share one rate limit, like the downloads on one access link
+    rate_limiter = None
+    if rate_limit is not None:
+        rate_limiter = TokenBucket(rate_limit, clock=clock)
+    elif cfg.rate_limit is not None or cfg.rate_schedule is not None:
+        schedule = RateSchedule.parse(cfg.rate_schedule) if cfg.rate_schedule is not None else None
+        rate_limiter = TokenBucket(cfg.rate_limit, clock=clock, schedule=schedule)
+    if mpd_download_manager is None:
+        mpd_download_manager = DownloadManagerImpl([], write_to_disk=write_to_disk, output_folder=output_folder,
+                                                   rate_limiter=rate_limiter, clock=clock,
+                                                   coalesce_interval=cfg.coalesce_interval,
+                                                   coalesce_bytes=cfg.coalesce_bytes, session=session)
+    if download_manager is None:
+        download_manager = DownloadManagerImpl([], write_to_disk=write_to_disk, output_folder=output_folder,
+                                               rate_limiter=rate_limiter, clock=clock,
+                                               coalesce_interval=cfg.coalesce_interval,
+                                               coalesce_bytes=cfg.coalesce_bytes, session=session)
     buffer_manager: BufferManager = BufferManagerImpl()
     event_logger = EventLogger()
-    mpd_provider: MPDProvider = MPDProviderImpl(DefaultMPDParser(), cfg.update_interval, DownloadManagerImpl([]))
-    bandwidth_meter = BandwidthMeterImpl(cfg.max_initial_bitrate, cfg.smoothing_factor, [])
-    download_manager = DownloadManagerImpl([bandwidth_meter])
+    own_executor = parse_executor is None
+    if own_executor:
+        parse_executor = create_parse_executor()
+    mpd_parser: MPDParser = DefaultMPDParser()
+    if cfg.mpd_cache_folder is not None:
+        mpd_parser = CachingMPDParser(mpd_parser, MPDCache(cfg.mpd_cache_folder, cfg.mpd_cache_max_size))
+    mpd_provider: MPDProvider = MPDProviderImpl(mpd_parser, cfg.update_interval, mpd_download_manager,
+                                                clock=clock, parse_executor=parse_executor,
+                                                shutdown_executor=own_executor)
+    bandwidth_meter = BandwidthMeterImpl(cfg.max_initial_bitrate, cfg.smoothing_factor, [], clock=clock,
+                                         cont_bw_update_interval=cfg.cont_bw_update_interval,
+                                         cont_bw_update_bytes=cfg.cont_bw_update_bytes)
+    download_manager.add_listener(bandwidth_meter)
+    for listener in listeners:
+        if isinstance(listener, DownloadEventListener):
+            download_manager.add_listener(listener)
+        if isinstance(listener, BandwidthUpdateListener):
+            bandwidth_meter.add_listener(listener)
     abr_controller = DashABRController(2, 4, bandwidth_meter, buffer_manager, mpd_provider)
     scheduler: Scheduler = SchedulerImpl(5, cfg.update_interval, download_manager, bandwidth_meter, buffer_manager,
-                                         abr_controller, [event_logger])
+                                         abr_controller,
+                                         [event_logger] + [listener for listener in listeners
+                                                           if isinstance(listener, SchedulerEventListener)],
+                                         clock=clock,
+                                         max_concurrent_downloads=cfg.max_concurrent_downloads,
+                                         independent_tracks=cfg.independent_tracks,
+                                         pipeline_depth=cfg.pipeline_depth)
     return DASHPlayer(cfg.update_interval, min_rebuffer_duration=1, min_start_buffer_duration=2,
                       buffer_manager=buffer_manager, mpd_provider=mpd_provider, scheduler=scheduler,
-                      listeners=[event_logger])
+                      listeners=[event_logger] + [listener for listener in listeners
+                                                  if isinstance(listener, PlayerEventListener)],
+                      clock=clock)
+
+
+def build_trace_dash_player(trace: ThroughputTrace, origin: SyntheticOrigin, clock: Clock = None) -> Player:
+    """
+    Build a MPEG-DASH Player which downloads from a synthetic origin at the rate of a throughput trace
+
+    Parameters
+    ----------
+    trace: ThroughputTrace
+        The throughput trace to replay
+    origin: SyntheticOrigin
+        The origin serving the MPD file and the segments
+    clock: Clock
+        The clock shared by all the components. Use a VirtualClock to emulate the session in simulated time.
+
+    Returns
+    -------
+    player: Player
+        A MPEG-DASH Player
+    """
+    cfg = Config
+    clock = clock if clock is not None else SystemClock()
+    # The MPD file and the segments are downloaded on the same link
+    link = TraceLink(trace, clock)
+    return build_dash_player(clock,
+                             mpd_download_manager=TraceDownloadManager([], link, origin, clock, cfg.chunk_size),
+                             download_manager=TraceDownloadManager([], link, origin, clock, cfg.chunk_size))
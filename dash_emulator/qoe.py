@@ -0,0 +1,303 @@
+import bisect
+import logging
+from typing import Dict, Any, Optional, Sequence, List, Tuple
+
+from dash_emulator.clock import Clock, SystemClock
+from dash_emulator.models import State
+from dash_emulator.mpd import MPDProvider
+from dash_emulator.player import PlayerEventListener
+from dash_emulator.scheduler import SchedulerEventListener
+
+
+class P2Quantile(object):
+    __slots__ = ("p", "count", "_heights", "_positions", "_initial_desired", "_increments")
+
+    def __init__(self, p: float):
+        """
+        Estimate a quantile of a stream of values in constant memory, with the P² algorithm of Jain and Chlamtac.
+        Five markers follow the minimum, the p/2, p and (1+p)/2 quantiles and the maximum, and are moved
+        along a parabola through their neighbours as the values arrive.
+
+        Parameters
+        ----------
+        p: float
+            The quantile to estimate, between 0 and 1
+        """
+        self.p = p
+
+        self.count = 0
+        """
+        The number of values added
+        """
+
+        self._heights: List[float] = []
+        self._positions = [0, 1, 2, 3, 4]
+        # The desired positions of the markers grow by the increments with every value after the fifth one
+        self._initial_desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float) -> None:
+        """
+        Add a value to the stream
+
+        Parameters
+        ----------
+        x: float
+            The value
+        """
+        self.count += 1
+        q = self._heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Find the cell of the value, and extend the extreme markers
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x, 1, 4) - 1
+
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        extra = self.count - 5
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self._initial_desired[i] + extra * self._increments[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                        (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                        (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    # The parabola leaves the cell, move the marker linearly instead
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self) -> Optional[float]:
+        """
+        The estimate of the quantile, exact while there are at most 5 values. None if there's no value.
+        """
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            return self._heights[min(int(round(self.p * (self.count - 1))), self.count - 1)]
+        return self._heights[2]
+
+
+class QoEMonitor(PlayerEventListener, SchedulerEventListener):
+    log = logging.getLogger("QoEMonitor")
+
+    def __init__(self,
+                 clock: Clock = None,
+                 mpd_provider: Optional[MPDProvider] = None,
+                 buffer_quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+                 buffer_sample_interval: float = 0.1):
+        """
+        Keep the QoE metrics of a playback session up to date as the events arrive, in constant memory,
+        so that a snapshot can be taken at any time
+
+        Parameters
+        ----------
+        clock: Clock
+            The clock of the player
+        mpd_provider: MPDProvider, optional
+            The MPD provider of the player, to know the bitrates of the representations and the durations
+            of the segments. The bitrate and switch metrics are not computed without it.
+        buffer_quantiles: Sequence[float]
+            The quantiles of the buffer level over time to estimate
+        buffer_sample_interval: float
+            The buffer level is sampled every buffer_sample_interval seconds for the quantiles, however often
+            the player reports it. Between two reports, it drains from the last one at the playback rate.
+        """
+        self.clock = clock if clock is not None else SystemClock()
+        self.mpd_provider = mpd_provider
+
+        self.start_time = self.clock.time()
+        """
+        The time the session started, when the monitor is created or when start is called
+        """
+
+        self.state = State.IDLE
+        """
+        The latest state of the player
+        """
+
+        self.startup_delay: Optional[float] = None
+        """
+        The time from the start of the session to the start of the playback, in seconds
+        """
+
+        self.num_stalls = 0
+        """
+        The number of stalls after the playback started
+        """
+
+        self.num_switches = 0
+        """
+        The number of representation switches, over all the adaptation sets
+        """
+
+        self.buffer_quantiles = [P2Quantile(p) for p in buffer_quantiles]
+        self.buffer_sample_interval = buffer_sample_interval
+
+        self._stall_time = 0.0
+        self._stall_start: Optional[float] = None
+        self._switch_magnitude = 0
+        # The bitrate and the duration of the segment of each adaptation set, for each segment index being
+        # downloaded. The tracks scheduled independently start the same index separately.
+        self._pending_segments: Dict[int, Dict[int, Tuple[int, float]]] = {}
+        # The latest representation id and bitrate of each adaptation set
+        self._last_representations: Dict[int, int] = {}
+        self._last_bandwidths: Dict[int, int] = {}
+        # The sums of the total bitrates and of the durations of the downloaded segments
+        self._bitrate_time = 0.0
+        self._content_time = 0.0
+        # The latest buffer level and when it was reported, and the time of the first sample and the number of
+        # samples taken since
+        self._buffer_level: Optional[float] = None
+        self._buffer_level_time = 0.0
+        self._buffer_sample_start = 0.0
+        self._buffer_sample_count = 0
+
+    def start(self):
+        """
+        Start the session now
+        """
+        self.start_time = self.clock.time()
+
+    @property
+    def stall_time(self) -> float:
+        """
+        The total duration of the stalls, including the current one, in seconds
+        """
+        if self._stall_start is not None:
+            return self._stall_time + self.clock.time() - self._stall_start
+        return self._stall_time
+
+    @property
+    def average_bitrate(self) -> float:
+        """
+        The total bitrate of the downloaded segments weighted by their durations, in bps
+        """
+        return self._bitrate_time / self._content_time if self._content_time > 0 else 0.0
+
+    @property
+    def mean_switch_magnitude(self) -> float:
+        """
+        The mean of the absolute bitrate changes of the switches, in bps
+        """
+        return self._switch_magnitude / self.num_switches if self.num_switches > 0 else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        snapshot: Dict[str, Any]
+            The current QoE metrics of the session
+        """
+        self._sample_buffer_level(self.clock.time())
+        return {
+            "state": self.state.name,
+            "startup_delay": self.startup_delay,
+            "num_stalls": self.num_stalls,
+            "stall_time": self.stall_time,
+            "average_bitrate": self.average_bitrate,
+            "num_switches": self.num_switches,
+            "mean_switch_magnitude": self.mean_switch_magnitude,
+            "buffer_level_quantiles": {quantile.p: quantile.value for quantile in self.buffer_quantiles},
+        }
+
+    def _predict_buffer_level(self, time: float) -> float:
+        """
+        The buffer level at some time after the latest report, draining at the playback rate
+        """
+        if self.state != State.READY:
+            return self._buffer_level
+        return max(self._buffer_level - (time - self._buffer_level_time), 0.0)
+
+    def _sample_buffer_level(self, now: float):
+        """
+        Add the samples of the buffer level due before now to the quantile estimators
+        """
+        if self._buffer_level is None:
+            return
+        while True:
+            time = self._buffer_sample_start + self._buffer_sample_count * self.buffer_sample_interval
+            if time >= now:
+                return
+            buffer_level = self._predict_buffer_level(time)
+            for quantile in self.buffer_quantiles:
+                quantile.add(buffer_level)
+            self._buffer_sample_count += 1
+
+    def _end_stall(self, now: float):
+        if self._stall_start is not None:
+            self._stall_time += now - self._stall_start
+            self._stall_start = None
+
+    async def on_state_change(self, position: float, old_state: State, new_state: State):
+        now = self.clock.time()
+        # The buffer level drains at the rate of the old state until now
+        self._sample_buffer_level(now)
+        if self._buffer_level is not None:
+            self._buffer_level = self._predict_buffer_level(now)
+            self._buffer_level_time = now
+        if new_state == State.READY:
+            if self.startup_delay is None:
+                self.startup_delay = now - self.start_time
+            else:
+                self._end_stall(now)
+        elif new_state == State.BUFFERING and old_state == State.READY:
+            self.num_stalls += 1
+            self._stall_start = now
+        elif new_state == State.END:
+            self._end_stall(now)
+        self.state = new_state
+
+    async def on_buffer_level_change(self, buffer_level):
+        now = self.clock.time()
+        if self._buffer_level is None:
+            self._buffer_sample_start = now
+        else:
+            self._sample_buffer_level(now)
+        self._buffer_level = buffer_level
+        self._buffer_level_time = now
+
+    async def on_position_change(self, position):
+        pass
+
+    async def on_segment_download_start(self, index, selections):
+        if self.mpd_provider is None or self.mpd_provider.mpd is None:
+            return
+        adaptation_sets = self.mpd_provider.mpd.adaptation_sets
+        for adaptation_set_id, representation_id in selections.items():
+            representation = adaptation_sets[adaptation_set_id].representations[representation_id]
+            bandwidth = representation.bandwidth
+            # The duration is taken now, the scheduler ends at the index after the last segment
+            if index < len(representation.segments):
+                self._pending_segments.setdefault(index, {})[adaptation_set_id] = \
+                    (bandwidth, representation.segments[index].duration)
+            last_representation_id = self._last_representations.get(adaptation_set_id)
+            if last_representation_id is not None and last_representation_id != representation_id:
+                self.num_switches += 1
+                self._switch_magnitude += abs(bandwidth - self._last_bandwidths[adaptation_set_id])
+            self._last_representations[adaptation_set_id] = representation_id
+            self._last_bandwidths[adaptation_set_id] = bandwidth
+
+    async def on_segment_download_complete(self, index):
+        # The index completes once all the adaptation sets downloaded it
+        pending = self._pending_segments.pop(index, None)
+        if not pending:
+            return
+        for bandwidth, duration in pending.values():
+            self._bitrate_time += bandwidth * duration
+        self._content_time += max(duration for _, duration in pending.values())
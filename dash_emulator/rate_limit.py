@@ -0,0 +1,142 @@
+import bisect
+from typing import List, Optional, Tuple
+
+from dash_emulator.clock import Clock, SystemClock
+
+
+class RateSchedule(object):
+    def __init__(self, steps: List[Tuple[float, Optional[float]]]):
+        """
+        A rate limit changing over time. Each rate holds until the next step, and the last one holds forever.
+
+        Parameters
+        ----------
+        steps: List[Tuple[float, Optional[float]]]
+            Pairs of (start time, rate). The start time is in seconds from the start of the schedule,
+            the rate is a positive number of bps, or None for no limit. Before the first step, there is no limit.
+        """
+        steps = sorted(steps, key=lambda step: step[0])
+        self._starts = [start for start, _ in steps]
+        self._rates = [rate for _, rate in steps]
+
+    @staticmethod
+    def parse(text: str) -> 'RateSchedule':
+        """
+        Parse a schedule written as comma-separated "<start time>:<rate>" steps, e.g. "0:5000000,30:1000000".
+        A rate of "none" removes the limit.
+
+        Parameters
+        ----------
+        text: str
+            The schedule
+
+        Returns
+        -------
+        schedule: RateSchedule
+            The parsed schedule
+        """
+        steps = []
+        for step in text.split(","):
+            try:
+                start, rate = step.split(":")
+                steps.append((float(start), None if rate.strip().lower() == "none" else float(rate)))
+            except ValueError:
+                raise ValueError("Cannot parse the rate schedule step \"%s\"" % step)
+        return RateSchedule(steps)
+
+    def rate_at(self, elapsed: float) -> Optional[float]:
+        """
+        Parameters
+        ----------
+        elapsed: float
+            The time since the start of the schedule, in seconds
+
+        Returns
+        -------
+        rate: float, optional
+            The rate limit at that time in bps, None for no limit
+        """
+        i = bisect.bisect_right(self._starts, elapsed) - 1
+        if i < 0:
+            return None
+        return self._rates[i]
+
+
+class TokenBucket(object):
+    # The default burst size, in seconds of the rate
+    default_burst_duration = 0.05
+
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None, clock: Clock = None,
+                 schedule: Optional[RateSchedule] = None):
+        """
+        A token bucket pacing transfers at chunk granularity.
+        The transfers take tokens after each chunk, and wait while the bucket is in debt.
+        Several transfers can share one bucket, then they share its rate.
+
+        Parameters
+        ----------
+        rate: float, optional
+            The rate limit in bps, a positive number, or None for no limit
+        burst: float, optional
+            The size of the bucket in bits. By default, it holds default_burst_duration seconds of the rate.
+        clock: Clock
+            The clock to refill the bucket and to wait for the tokens
+        schedule: RateSchedule, optional
+            If it is given, the rate follows the schedule, which starts with the first chunk.
+        """
+        self.burst = burst
+        self.clock = clock if clock is not None else SystemClock()
+        self.schedule = schedule
+
+        self._rate = rate
+        self._tokens: Optional[float] = None
+        self._last: Optional[float] = None
+        self._schedule_start: Optional[float] = None
+
+    @property
+    def rate(self) -> Optional[float]:
+        """
+        The current rate limit in bps, None for no limit
+        """
+        if self.schedule is not None and self._schedule_start is not None:
+            return self.schedule.rate_at(self.clock.time() - self._schedule_start)
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: Optional[float]):
+        self._refill()
+        self._rate = rate
+        self.schedule = None
+
+    def _capacity(self, rate: float) -> float:
+        return self.burst if self.burst is not None else rate * self.default_burst_duration
+
+    def _refill(self) -> None:
+        now = self.clock.time()
+        if self._schedule_start is None:
+            self._schedule_start = now
+        rate = self.rate
+        if rate is None:
+            self._tokens = None
+        elif self._tokens is None:
+            # Start with a full bucket
+            self._tokens = self._capacity(rate)
+        else:
+            self._tokens = min(self._tokens + (now - self._last) * rate, self._capacity(rate))
+        self._last = now
+
+    async def consume(self, bits: float) -> None:
+        """
+        Take some tokens, and wait until the bucket is not in debt any more
+
+        Parameters
+        ----------
+        bits: float
+            The number of bits transferred
+        """
+        self._refill()
+        if self._tokens is None:
+            return
+        self._tokens -= bits
+        if self._tokens < 0:
+            await self.clock.sleep(-self._tokens / self.rate)
@@ -2,11 +2,12 @@ import asyncio
 from abc import abstractmethod, ABC
 from asyncio import Task
 import logging
-from typing import Optional, Dict, Set, List
+from typing import Optional, Dict, Set, List, Tuple
 
 from dash_emulator.abr import ABRController
 from dash_emulator.bandwidth import BandwidthMeter
 from dash_emulator.buffer import BufferManager
+from dash_emulator.clock import Clock, SystemClock
 from dash_emulator.download import DownloadManager
 from dash_emulator.models import AdaptationSet
 
@@ -39,6 +40,12 @@ class SchedulerEventListener(ABC):
         """
         pass
 
+    async def on_scheduler_end(self):
+        """
+        Callback when the scheduler has found no more segments to download
+        """
+        pass
+
 
 class Scheduler(ABC):
     @abstractmethod
@@ -66,10 +73,43 @@ class Scheduler(ABC):
     def is_end(self):
         pass
 
+    def add_listener(self, listener: SchedulerEventListener) -> bool:
+        """
+        Add a listener to the scheduler
+
+        Parameters
+        ----------
+        listener: SchedulerEventListener
+            The listener to add
+
+        Returns
+        -------
+        added: bool
+            False if the scheduler doesn't support adding listeners, then the listener gets no events
+        """
+        return False
+
+    def notify_playback(self, position: float, rate: float) -> None:
+        """
+        Tell the scheduler the position and the rate of the playback, when the player changes its state,
+        seeks or pauses. The rate stays the same until the next notification.
+
+        Parameters
+        ----------
+        position: float
+            The position of the playback in seconds
+        rate: float
+            The playback rate, 1 while playing and 0 while buffering or paused
+        """
+        pass
+
 
 class SchedulerImpl(Scheduler):
     log = logging.getLogger("BETAManagerImpl")
-    
+
+    # The buffer within this duration over max_buffer_duration has room, so that rounding errors can't stall the loop
+    time_tolerance = 1e-6
+
     def __init__(self,
                  max_buffer_duration: float,
                  update_interval: float,
@@ -77,7 +117,11 @@ class SchedulerImpl(Scheduler):
                  bandwidth_meter: BandwidthMeter,
                  buffer_manager: BufferManager,
                  abr_controller: ABRController,
-                 listeners: List[SchedulerEventListener]):
+                 listeners: List[SchedulerEventListener],
+                 clock: Clock = None,
+                 max_concurrent_downloads: int = 1,
+                 independent_tracks: bool = False,
+                 pipeline_depth: int = 0):
         """
         Parameters
         ----------
@@ -85,7 +129,9 @@ class SchedulerImpl(Scheduler):
             The maximum buffer duration.
             When available buffer longer than this value, the scheduler won't start new segment transmissions.
         update_interval
-            The interval between updates if there's no download sessions
+            The interval between two checks of a full buffer, until the player notifies the playback.
+            Afterwards, the scheduler sleeps until the buffer drains below max_buffer_duration at the playback rate,
+            or until the playback changes.
         download_manager
             A download manager to download video payloads
         bandwidth_meter
@@ -96,6 +142,24 @@ class SchedulerImpl(Scheduler):
             ABR Controller to update the representation selections.
         listeners
             A list of SchedulerEventHandler
+        clock
+            The clock used to wait when the buffer is full, and to predict the position of the playback
+        max_concurrent_downloads
+            The maximum number of segments downloaded at the same time.
+            When it is greater than 1, the segments of all the adaptation sets for one index,
+            and the initialization segments they need, are downloaded concurrently.
+        independent_tracks
+            If True, each adaptation set runs its own scheduling loop, with its own segment index,
+            its own buffer level and its own ABR selection. The listeners get the start of each download
+            of each adaptation set separately, with the selection of that adaptation set only. They get the completion
+            of each index once, when all the adaptation sets have downloaded it, except the ones which ended before.
+        pipeline_depth
+            The number of segment indices requested ahead of the one being downloaded, with the latest selections.
+            The requests ahead never take the buffer over max_buffer_duration, and they share the
+            max_concurrent_downloads slots with the downloads of the current index, which get the slots first.
+            An index is requested ahead only if all the adaptation sets have a segment at this index.
+            When the selections change, the requests ahead which don't match them any more are canceled
+            and requested again. It doesn't apply to independent tracks.
         """
 
         self.max_buffer_duration = max_buffer_duration
@@ -106,21 +170,83 @@ class SchedulerImpl(Scheduler):
         self.buffer_manager = buffer_manager
         self.abr_controller = abr_controller
         self.listeners = listeners
+        self.clock = clock if clock is not None else SystemClock()
+        self.max_concurrent_downloads = max_concurrent_downloads
+        self.independent_tracks = independent_tracks
+        self.pipeline_depth = pipeline_depth
 
         self.adaptation_sets: Optional[Dict[int, AdaptationSet]] = None
         self.started = False
 
         self._task: Optional[Task] = None
+        self._track_tasks: List[Task] = []
+        # The next segment index to download, or with independent tracks the next one to complete
         self._index = 0
+        # The next segment index to download of each independent track
+        self._track_indices: Dict[int, int] = {}
         self._representation_initialized: Set[str] = set()
+        # The tasks of the requests ahead, by URL
+        self._prefetches: Dict[str, Task] = {}
+        # Shared by the downloads of the current index and the requests ahead
+        self._download_slots = asyncio.Semaphore(max_concurrent_downloads)
 
         self._end = False
+        self._ended_tracks: Set[int] = set()
+
+        # The playback given by the latest notification: its position, its rate and when it was notified.
+        # The rate is None until the player notifies the scheduler, the full buffer is polled meanwhile.
+        self._playback_position = 0.0
+        self._playback_rate: Optional[float] = None
+        self._playback_time = 0.0
+        # Set when the playback changes, to wake up the loops waiting for the buffer to drain
+        self._playback_event = asyncio.Event()
+
+        self.wakeups = 0
+        """
+        The number of times the scheduling loops woke up while the buffer was full
+        """
+
+    def notify_playback(self, position: float, rate: float) -> None:
+        self._playback_position = position
+        self._playback_rate = rate
+        self._playback_time = self.clock.time()
+        self._playback_event.set()
+
+    def _buffer_level(self, adaptation_set_id: Optional[int] = None) -> float:
+        """
+        The buffer level now, at the position predicted from the latest playback notification
+        """
+        if adaptation_set_id is None:
+            buffer_level = self.buffer_manager.buffer_level
+        else:
+            buffer_level = self.buffer_manager.track_buffer_level(adaptation_set_id)
+        if self._playback_rate is None:
+            return buffer_level
+        position = self._playback_position + self._playback_rate * (self.clock.time() - self._playback_time)
+        return buffer_level - max(position - self.buffer_manager.position, 0)
+
+    async def _wait_for_room(self, buffer_level: float):
+        """
+        Wait until the buffer drains below max_buffer_duration at the current playback rate,
+        or until the playback changes
+        """
+        self._playback_event.clear()
+        if self._playback_rate is None:
+            timeout = self.update_interval
+        elif self._playback_rate > 0:
+            timeout = (buffer_level - self.max_buffer_duration) / self._playback_rate
+        else:
+            # The buffer doesn't drain until the playback changes
+            timeout = None
+        await self.clock.wait_event(self._playback_event, timeout)
+        self.wakeups += 1
 
     async def loop(self):
         while True:
             # Check buffer level
-            if self.buffer_manager.buffer_level > self.max_buffer_duration:
-                await asyncio.sleep(self.update_interval)
+            buffer_level = self._buffer_level()
+            if buffer_level > self.max_buffer_duration + self.time_tolerance:
+                await self._wait_for_room(buffer_level)
                 continue
 
             # Download one segment from each adaptation set
@@ -128,29 +254,192 @@ class SchedulerImpl(Scheduler):
             self.log.info(f"selection: {selections} for index {self._index}")
             for listener in self.listeners:
                 await listener.on_segment_download_start(self._index, selections)
+            segment_urls = self._segment_urls(selections)
+            if segment_urls is None:
+                await self._finish()
+                return
+            urls, duration, initialized = segment_urls
+            if self.max_concurrent_downloads > 1 or self.pipeline_depth > 0:
+                await self._download_concurrently(urls, selections)
+            else:
+                for url in urls:
+                    await self._download(url)
+            # Only the initialization segments downloaded completely are not needed any more
+            self._representation_initialized.update(initialized)
+            for listener in self.listeners:
+                await listener.on_segment_download_complete(self._index)
+            self._index += 1
+            self.buffer_manager.enqueue_buffer(duration)
+
+    def _segment_urls(self, selections: Dict[int, int]) -> Optional[Tuple[List[str], float, List[str]]]:
+        """
+        The URLs to download for the current segment index with the given selections, the duration
+        of the segments, and the representations whose initialization segments are among the URLs.
+        The initialization segments not downloaded yet come before the segments which need them.
+        None if there is no segment at this index.
+        """
+        urls = []
+        duration = 0
+        initialized = []
+        for adaptation_set_id, selection in selections.items():
+            representation = self.adaptation_sets[adaptation_set_id].representations.get(selection)
+            try:
+                segment = representation.segments[self._index]
+            except IndexError:
+                return None
+            representation_str = "%d:%d" % (adaptation_set_id, representation.id)
+            if representation_str not in self._representation_initialized:
+                urls.append(representation.initialization)
+                initialized.append(representation_str)
+            urls.append(segment.url)
+            duration = segment.duration
+        return urls, duration, initialized
+
+    async def _download(self, url: str):
+        """
+        Download one URL in a download slot, or wait for it if it has been requested ahead
+        """
+        task = self._prefetches.pop(url, None)
+        if task is not None:
+            # The request ahead holds a slot of its own
+            await task
+            return
+        async with self._download_slots:
+            await self.download_manager.download(url)
+
+    async def _download_concurrently(self, urls: List[str], selections: Dict[int, int]):
+        """
+        Download all the URLs, with at most max_concurrent_downloads downloads at the same time,
+        and revise the requests ahead
+        """
+        # The downloads of the current index wait for the slots before the requests ahead
+        downloads = asyncio.gather(*[self._download(url) for url in urls])
+        if self.pipeline_depth > 0:
+            await self._revise_prefetches(selections)
+        await downloads
+
+    async def _prefetch(self, url: str):
+        async with self._download_slots:
+            await self.download_manager.download(url)
+
+    def _pipeline_urls(self, selections: Dict[int, int]) -> List[List[str]]:
+        """
+        The URLs of the current segment index and of the indices to request ahead, with the given selections,
+        one list per index. The list stops before the first index missing in any adaptation set,
+        the scheduler ends there, so that none of its segments is requested.
+        """
+        indices = []
+        buffer_level = self._buffer_level()
+        for offset in range(self.pipeline_depth + 1):
+            if offset > 0 and buffer_level > self.max_buffer_duration:
+                break
+            index = self._index + offset
+            urls = []
             duration = 0
             for adaptation_set_id, selection in selections.items():
-                adaptation_set = self.adaptation_sets[adaptation_set_id]
-                representation = adaptation_set.representations.get(selection)
-                representation_str = "%d:%d" % (adaptation_set_id, representation.id)
-                if representation_str not in self._representation_initialized:
-                    await self.download_manager.download(representation.initialization)
-                    self._representation_initialized.add(representation_str)
-                try:
-                    segment = representation.segments[self._index]
-                except IndexError:
-                    self._end = True
-                    return
-                await self.download_manager.download(segment.url)
+                representation = self.adaptation_sets[adaptation_set_id].representations.get(selection)
+                if index >= len(representation.segments):
+                    break
+                segment = representation.segments[index]
+                urls.append(segment.url)
                 duration = segment.duration
+            if len(urls) < len(selections):
+                # An adaptation set ends before this index
+                break
+            indices.append(urls)
+            buffer_level += duration
+        return indices
+
+    async def _revise_prefetches(self, selections: Dict[int, int]):
+        """
+        Cancel the requests ahead which don't match the selections any more, and request the missing ones
+        """
+        indices = self._pipeline_urls(selections)
+        wanted = set(url for urls in indices for url in urls)
+        for url in list(self._prefetches.keys()):
+            if url not in wanted:
+                self.log.info(f"Cancel the request ahead of {url}")
+                self._prefetches.pop(url).cancel()
+        for urls in indices[1:]:
+            for url in urls:
+                if url not in self._prefetches:
+                    self._prefetches[url] = asyncio.create_task(self._prefetch(url))
+
+    async def track_loop(self, adaptation_set_id: int):
+        """
+        The scheduling loop of one adaptation set, used when the tracks are independent
+        """
+        self._track_indices[adaptation_set_id] = 0
+        # Register the buffer of this track, so that the player waits for it
+        self.buffer_manager.enqueue_buffer(0, adaptation_set_id)
+        while True:
+            # Check buffer level
+            buffer_level = self._buffer_level(adaptation_set_id)
+            if buffer_level > self.max_buffer_duration + self.time_tolerance:
+                await self._wait_for_room(buffer_level)
+                continue
+
+            index = self._track_indices[adaptation_set_id]
+            selection = self.abr_controller.update_track_selection(self.adaptation_sets, adaptation_set_id)
+            self.log.info(f"selection: {selection} for index {index} of adaptation set {adaptation_set_id}")
+            representation = self.adaptation_sets[adaptation_set_id].representations.get(selection)
+            try:
+                segment = representation.segments[index]
+            except IndexError:
+                self._ended_tracks.add(adaptation_set_id)
+                self.buffer_manager.track_ended(adaptation_set_id)
+                await self._complete_track_indices()
+                if len(self._ended_tracks) == len(self.adaptation_sets):
+                    await self._finish()
+                return
             for listener in self.listeners:
-                await listener.on_segment_download_complete(self._index)
+                await listener.on_segment_download_start(index, {adaptation_set_id: selection})
+            representation_str = "%d:%d" % (adaptation_set_id, representation.id)
+            if representation_str not in self._representation_initialized:
+                await self.download_manager.download(representation.initialization)
+                self._representation_initialized.add(representation_str)
+            await self.download_manager.download(segment.url)
+            self._track_indices[adaptation_set_id] = index + 1
+            await self._complete_track_indices()
+            self.buffer_manager.enqueue_buffer(segment.duration, adaptation_set_id)
+
+    async def _complete_track_indices(self):
+        """
+        Call the listeners once for each segment index downloaded by all the independent tracks,
+        except the tracks which ended before it
+        """
+        while True:
+            downloaded = False
+            for adaptation_set_id in self.adaptation_sets.keys():
+                if self._track_indices.get(adaptation_set_id, 0) > self._index:
+                    downloaded = True
+                elif adaptation_set_id not in self._ended_tracks:
+                    return
+            if not downloaded:
+                return
+            # The index is taken before calling the listeners, the other tracks may complete the next one meanwhile
+            index = self._index
             self._index += 1
-            self.buffer_manager.enqueue_buffer(duration)
+            for listener in self.listeners:
+                await listener.on_segment_download_complete(index)
+
+    async def _finish(self):
+        self._end = True
+        for listener in self.listeners:
+            await listener.on_scheduler_end()
+
+    def add_listener(self, listener: SchedulerEventListener) -> bool:
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+        return True
 
     def start(self, adaptation_sets: Dict[int, AdaptationSet]):
         self.adaptation_sets = adaptation_sets
-        self._task = asyncio.create_task(self.loop())
+        if self.independent_tracks:
+            self._track_tasks = [asyncio.create_task(self.track_loop(adaptation_set_id))
+                                 for adaptation_set_id in adaptation_sets.keys()]
+        else:
+            self._task = asyncio.create_task(self.loop())
 
     def update(self, adaptation_sets: Dict[int, AdaptationSet]):
         self.adaptation_sets = adaptation_sets
@@ -159,6 +448,11 @@ class SchedulerImpl(Scheduler):
         await self.download_manager.close()
         if self._task is not None:
             self._task.cancel()
+        for task in self._track_tasks:
+            task.cancel()
+        for task in self._prefetches.values():
+            task.cancel()
+        self._prefetches.clear()
 
     @property
     def is_end(self):
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import pathlib
+from asyncio import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
+from urllib.parse import urlparse
+
+
+class DiskSink(object):
+    def __init__(self, output_folder: str, batch_size: int = 1048576, max_pending: int = 4194304,
+                 max_workers: int = 4):
+        """
+        Stream the received bytes to files under an output folder.
+        The bytes are written in batches by a thread pool, so that the event loop never waits for the disk.
+
+        Parameters
+        ----------
+        output_folder: str
+            The folder to write the files in. A URL is saved at <output_folder>/<host>/<path>.
+        batch_size: int
+            The number of bytes collected before they are written, in bytes
+        max_pending: int
+            The maximum number of bytes of each file waiting to be written, in bytes.
+            The download waits for the disk when it is reached, so the memory use stays bounded.
+        max_workers: int
+            The number of threads writing to the disk
+        """
+        self.output_folder = pathlib.Path(output_folder)
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_workers = max_workers
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def path_of(self, url: str) -> pathlib.Path:
+        """
+        Parameters
+        ----------
+        url: str
+            The URL of the content
+
+        Returns
+        -------
+        path: pathlib.Path
+            The path of the file to write the content in
+        """
+        parsed = urlparse(url)
+        parts = [part for part in parsed.path.split("/") if part not in ("", ".", "..")]
+        if len(parts) == 0 or parsed.path.endswith("/"):
+            parts.append("index")
+        return self.output_folder.joinpath(parsed.netloc.replace(":", "_"), *parts)
+
+    def open(self, url: str) -> 'DiskSinkWriter':
+        """
+        Parameters
+        ----------
+        url: str
+            The URL of the content to write
+
+        Returns
+        -------
+        writer: DiskSinkWriter
+            The writer of one file
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="DiskSink")
+        return DiskSinkWriter(self.path_of(url), self._executor, self.batch_size, self.max_pending)
+
+    def close(self) -> None:
+        """
+        Stop the writing threads once the pending writes are done
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class DiskSinkWriter(object):
+    def __init__(self, path: pathlib.Path, executor: ThreadPoolExecutor, batch_size: int, max_pending: int):
+        """
+        Write one file in batches, at the offset of each batch, from a thread pool
+
+        Parameters
+        ----------
+        path: pathlib.Path
+            The path of the file
+        executor: ThreadPoolExecutor
+            The thread pool running the writes
+        batch_size: int
+            The number of bytes collected before they are written
+        max_pending: int
+            The maximum number of bytes waiting to be written
+        """
+        self.path = path
+        self.executor = executor
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        self._fd: Optional[Future] = None
+        self._batch = bytearray()
+        self._offset = 0
+        self._writes: List[Future] = []
+        self._pending = 0
+
+    @staticmethod
+    def _open(path: pathlib.Path) -> int:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    @staticmethod
+    def _write(fd: int, data: bytearray, offset: int) -> int:
+        view = memoryview(data)
+        while len(view) > 0:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+        return len(data)
+
+    async def write(self, chunk) -> None:
+        """
+        Parameters
+        ----------
+        chunk: bytes-like
+            The next bytes of the file
+        """
+        self._batch.extend(chunk)
+        if len(self._batch) >= self.batch_size:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if len(self._batch) == 0:
+            return
+        loop = asyncio.get_running_loop()
+        if self._fd is None:
+            self._fd = loop.run_in_executor(self.executor, self._open, self.path)
+        fd = await self._fd
+        batch, self._batch = self._batch, bytearray()
+        self._writes.append(loop.run_in_executor(self.executor, self._write, fd, batch, self._offset))
+        self._offset += len(batch)
+        self._pending += len(batch)
+        # Wait for the disk when too many bytes are waiting
+        while self._pending > self.max_pending:
+            self._pending -= await self._writes.pop(0)
+
+    async def close(self) -> None:
+        """
+        Write the remaining bytes and close the file
+        """
+        await self._flush()
+        if self._fd is None:
+            # Nothing was received, write an empty file anyway
+            self._fd = asyncio.get_running_loop().run_in_executor(self.executor, self._open, self.path)
+        fd = await self._fd
+        try:
+            await asyncio.gather(*self._writes)
+        finally:
+            self._writes.clear()
+            self._pending = 0
+            await asyncio.get_running_loop().run_in_executor(self.executor, os.close, fd)
@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import logging
+from typing import List, Optional, Dict, Union
+
+from dash_emulator.clock import Clock, SystemClock
+from dash_emulator.download import DownloadManager, DownloadEventListener, DownloadHandle, ReceiveBuffer
+from dash_emulator.origin import SyntheticOrigin
+from dash_emulator.traces import ThroughputTrace
+
+
+class TraceLink(object):
+    def __init__(self, trace: ThroughputTrace, clock: Clock = None):
+        """
+        An access link replaying a throughput trace. The download managers of a player share one link,
+        so that all their transfers see the same point of the trace and share its bandwidth.
+
+        Parameters
+        ----------
+        trace: ThroughputTrace
+            The throughput trace to replay. The trace starts with the first transfer on the link.
+        clock: Clock
+            The clock to pace the transfers
+        """
+        self.trace = trace
+        self.clock = clock if clock is not None else SystemClock()
+
+        self._start: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """
+        The lock held while a chunk is on the link, only one chunk is on the link at any time
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def time(self) -> float:
+        """
+        Returns
+        -------
+        time: float
+            The time since the start of the trace, in seconds. The trace starts at the first call.
+        """
+        if self._start is None:
+            self._start = self.clock.time()
+        return self.clock.time() - self._start
+
+    async def transfer(self, bits: float, interrupt: Optional[asyncio.Future] = None) -> float:
+        """
+        Deliver some bits at the rate of the trace
+
+        Parameters
+        ----------
+        bits: float
+            The number of bits to deliver
+        interrupt: asyncio.Future, optional
+            If it is given, the delivery stops as soon as this future is done, and the link is freed at once.
+            The timer runs in the event loop, which is the loop of the clock.
+
+        Returns
+        -------
+        duration: float
+            The time spent delivering the bits, in seconds
+        """
+        async with self.lock:
+            duration = self.trace.transfer_time(self.time(), bits)
+            if interrupt is None:
+                await self.clock.sleep(duration)
+                return duration
+            if interrupt.done():
+                return 0
+            start = self.clock.time()
+            timer = asyncio.get_running_loop().call_later(duration, _set_done, interrupt)
+            try:
+                await interrupt
+            finally:
+                timer.cancel()
+            return self.clock.time() - start
+
+
+def _set_done(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class TraceDownloadManager(DownloadManager):
+    log = logging.getLogger('TraceDownloadManager')
+
+    def __init__(self,
+                 event_listeners: List[DownloadEventListener],
+                 trace: Union[ThroughputTrace, TraceLink],
+                 origin: SyntheticOrigin,
+                 clock: Clock = None,
+                 chunk_size: int = 4096,
+                 latency: float = 0
+                 ):
+        """
+        A download manager which serves the contents of a synthetic origin at the rate of a throughput trace.
+        Concurrent downloads share the traced bandwidth chunk by chunk.
+
+        Parameters
+        ----------
+        event_listeners: List[DownloadEventListener]
+            Listeners to events of some bytes downloaded
+        trace: Union[ThroughputTrace, TraceLink]
+            The throughput trace to replay, or the link replaying it. Give the same link to the download managers
+            of a player so that they replay the trace from the same start. A trace gets a link of its own,
+            which starts with the first download.
+        origin: SyntheticOrigin
+            The origin providing the contents
+        clock: Clock
+            The clock to pace the transfers. Use a VirtualClock to download in simulated time.
+        chunk_size: int
+            How many bytes should be delivered at once
+        latency: float
+            The delay before the first byte of each request, in seconds
+        """
+        self.event_listeners = event_listeners
+        self.clock = clock if clock is not None else SystemClock()
+        self.link = trace if isinstance(trace, TraceLink) else TraceLink(trace, self.clock)
+        self.trace = self.link.trace
+        self.origin = origin
+        self.chunk_size = chunk_size
+        self.latency = latency
+
+        self._transfers: Dict[int, DownloadHandle] = {}
+        # The future ending the delivery of the current chunk of each transfer, set to interrupt it
+        self._interrupts: Dict[int, asyncio.Future] = {}
+        self._handle_ids = itertools.count()
+
+    @property
+    def is_busy(self) -> bool:
+        return len(self._transfers) > 0
+
+    def _create_handle(self, url: str) -> DownloadHandle:
+        handle = DownloadHandle(next(self._handle_ids), url)
+        self._transfers[handle.id] = handle
+        return handle
+
+    async def download(self, url: str, save=False, rate=None, headers=None) -> Optional[bytearray]:
+        return await self._download(self._create_handle(url), save, rate)
+
+    def submit(self, url: str, save=False, rate=None, headers=None) -> DownloadHandle:
+        handle = self._create_handle(url)
+        handle.task = asyncio.create_task(self._download(handle, save, rate))
+        return handle
+
+    async def _download(self, handle: DownloadHandle, save: bool, rate: Optional[int]) -> Optional[bytearray]:
+        url = handle.url
+        self.log.info("Start downloading %s" % url)
+
+        content: Optional[ReceiveBuffer] = None
+        # If the listeners got the start of the transfer, and its end or its cancellation
+        started = False
+        finished = False
+        try:
+            size = self.origin.size(url)
+            # The contents of the origin never change, the request headers are ignored
+            handle.status = 200
+            handle.size = size
+            if save:
+                content = ReceiveBuffer(size)
+            started = True
+            for listener in self.event_listeners:
+                await listener.on_transfer_start(url)
+            if self.latency > 0:
+                await self.clock.sleep(self.latency)
+            while not handle.canceled:
+                if handle.position >= size:
+                    # Download complete, call listeners
+                    finished = True
+                    for listener in self.event_listeners:
+                        await listener.on_transfer_end(size, url)
+                    break
+                length = min(self.chunk_size, size - handle.position)
+                interrupt = asyncio.get_running_loop().create_future()
+                self._interrupts[handle.id] = interrupt
+                duration = await self.link.transfer(length * 8, interrupt)
+                if handle.canceled:
+                    # The chunk was interrupted, it is not delivered
+                    break
+                if rate is not None and length * 8 / rate > duration:
+                    await self.clock.sleep(length * 8 / rate - duration)
+                chunk = self.origin.read(url, handle.position, length)
+                view = content.append(chunk) if save else memoryview(chunk)
+                handle.position += length
+                for listener in self.event_listeners:
+                    await listener.on_bytes_transferred(length, url, handle.position, size, view)
+            if handle.canceled and not finished:
+                finished = True
+                for listener in self.event_listeners:
+                    await listener.on_transfer_canceled(url, handle.position, size)
+        except BaseException:
+            # The task of the transfer was canceled, the listeners still see the transfer end
+            if started and not finished:
+                for listener in self.event_listeners:
+                    await listener.on_transfer_canceled(url, handle.position, handle.size)
+            raise
+        finally:
+            del self._transfers[handle.id]
+            self._interrupts.pop(handle.id, None)
+        return content.getvalue() if content is not None else None
+
+    async def close(self):
+        pass
+
+    def _interrupt(self, handle: DownloadHandle):
+        handle.canceled = True
+        # Free the link at once instead of after the chunk on it
+        interrupt = self._interrupts.get(handle.id)
+        if interrupt is not None:
+            _set_done(interrupt)
+
+    async def stop(self, url):
+        for handle in list(self._transfers.values()):
+            if handle.url == url:
+                self._interrupt(handle)
+
+    async def cancel(self, handle: DownloadHandle):
+        self._interrupt(handle)
+
+    def add_listener(self, listener: DownloadEventListener):
+        if listener not in self.event_listeners:
+            self.event_listeners.append(listener)
@@ -0,0 +1,242 @@
+import bisect
+from typing import List
+
+
+class TraceParsingException(Exception):
+    pass
+
+
+class ThroughputTrace(object):
+    def __init__(self, durations: List[float], bandwidths: List[float]):
+        """
+        A piecewise-constant throughput trace. The trace repeats itself after the last interval.
+
+        Parameters
+        ----------
+        durations: List[float]
+            The duration of each interval in seconds
+        bandwidths: List[float]
+            The bandwidth of each interval in bps (bits per second)
+        """
+        if len(durations) != len(bandwidths) or len(durations) == 0:
+            raise TraceParsingException("A trace needs the same positive number of durations and bandwidths")
+        if any(duration <= 0 for duration in durations) or any(bw < 0 for bw in bandwidths):
+            raise TraceParsingException("Durations must be positive and bandwidths must not be negative")
+
+        self.durations = list(durations)
+        self.bandwidths = list(bandwidths)
+
+        # The end time and the cumulative bits at the end of each interval, used for bisection
+        self._ends: List[float] = []
+        self._cum_bits: List[float] = []
+        end = 0.0
+        bits = 0.0
+        for duration, bw in zip(self.durations, self.bandwidths):
+            end += duration
+            bits += duration * bw
+            self._ends.append(end)
+            self._cum_bits.append(bits)
+
+        if bits <= 0:
+            raise TraceParsingException("The trace never delivers any bits")
+
+    @property
+    def period(self) -> float:
+        """
+        Returns
+        -------
+        period: float
+            The length of the trace in seconds, before it repeats itself
+        """
+        return self._ends[-1]
+
+    @property
+    def bits_per_period(self) -> float:
+        return self._cum_bits[-1]
+
+    def bandwidth_at(self, t: float) -> float:
+        """
+        Parameters
+        ----------
+        t: float
+            The time since the start of the trace in seconds
+
+        Returns
+        -------
+        bw: float
+            The bandwidth at the given time in bps
+        """
+        t = t % self.period
+        return self.bandwidths[min(bisect.bisect_right(self._ends, t), len(self._ends) - 1)]
+
+    def _bits_until(self, t: float) -> float:
+        """
+        The bits delivered from the start of the trace until the time t
+        """
+        periods, t = divmod(t, self.period)
+        i = min(bisect.bisect_right(self._ends, t), len(self._ends) - 1)
+        interval_start = self._ends[i - 1] if i > 0 else 0.0
+        bits_before = self._cum_bits[i - 1] if i > 0 else 0.0
+        return periods * self.bits_per_period + bits_before + (t - interval_start) * self.bandwidths[i]
+
+    def transfer_time(self, start: float, bits: float) -> float:
+        """
+        Compute how long it takes to deliver some bits
+
+        Parameters
+        ----------
+        start: float
+            The time since the start of the trace when the transfer starts, in seconds
+        bits: float
+            The number of bits to deliver
+
+        Returns
+        -------
+        duration: float
+            The time needed to deliver all the bits, in seconds
+        """
+        if bits <= 0:
+            return 0.0
+        target = self._bits_until(start) + bits
+        periods, remaining = divmod(target, self.bits_per_period)
+        if remaining <= 0:
+            # The last bit arrives in the previous period
+            periods -= 1
+            remaining = self.bits_per_period
+        # The first interval reaching the target always has a positive bandwidth
+        i = min(bisect.bisect_left(self._cum_bits, remaining), len(self._cum_bits) - 1)
+        interval_start = self._ends[i - 1] if i > 0 else 0.0
+        bits_before = self._cum_bits[i - 1] if i > 0 else 0.0
+        end = periods * self.period + interval_start + (remaining - bits_before) / self.bandwidths[i]
+        return max(end - start, 0.0)
+
+    @staticmethod
+    def constant(bandwidth: float) -> 'ThroughputTrace':
+        """
+        Parameters
+        ----------
+        bandwidth: float
+            The constant bandwidth in bps
+
+        Returns
+        -------
+        trace: ThroughputTrace
+            A trace with a constant bandwidth
+        """
+        return ThroughputTrace([1.0], [bandwidth])
+
+    @staticmethod
+    def from_mahimahi(path: str, packet_size: int = 1500, resolution: float = 0.001) -> 'ThroughputTrace':
+        """
+        Load a Mahimahi trace. Each line is the time in milliseconds at which one packet could be delivered.
+
+        Parameters
+        ----------
+        path: str
+            The path of the trace file
+        packet_size: int
+            The size of each packet delivery opportunity, in bytes
+        resolution: float
+            The length of the intervals the packets are grouped into, in seconds
+
+        Returns
+        -------
+        trace: ThroughputTrace
+        """
+        timestamps = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    timestamps.append(int(line) / 1000)
+        if len(timestamps) == 0:
+            raise TraceParsingException("Empty Mahimahi trace: %s" % path)
+
+        num_intervals = max(int(round(timestamps[-1] / resolution)), 1)
+        packets = [0] * num_intervals
+        for timestamp in timestamps:
+            packets[min(int(timestamp / resolution), num_intervals - 1)] += 1
+
+        # Merge the consecutive intervals with the same bandwidth
+        durations = []
+        bandwidths = []
+        for count in packets:
+            bw = count * packet_size * 8 / resolution
+            if bandwidths and bandwidths[-1] == bw:
+                durations[-1] += resolution
+            else:
+                durations.append(resolution)
+                bandwidths.append(bw)
+        return ThroughputTrace(durations, bandwidths)
+
+    @staticmethod
+    def from_cooked(path: str) -> 'ThroughputTrace':
+        """
+        Load a two-column trace where each line is "<timestamp in seconds> <throughput in Mbps>".
+        This is the format of the FCC and 3G/HSDPA traces as distributed with most ABR experiments.
+
+        Parameters
+        ----------
+        path: str
+            The path of the trace file
+
+        Returns
+        -------
+        trace: ThroughputTrace
+        """
+        timestamps = []
+        bandwidths = []
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 2:
+                    continue
+                timestamp = float(fields[0])
+                bandwidth = float(fields[1]) * 1000000
+                if timestamps and timestamp < timestamps[-1]:
+                    raise TraceParsingException("Timestamps go backwards in %s: %s" % (path, line.strip()))
+                if timestamps and timestamp == timestamps[-1]:
+                    # A sample with the timestamp of the previous one replaces it, it would last zero seconds
+                    bandwidths[-1] = bandwidth
+                    continue
+                timestamps.append(timestamp)
+                bandwidths.append(bandwidth)
+        if len(timestamps) == 0:
+            raise TraceParsingException("Empty trace: %s" % path)
+
+        durations = [end - start for start, end in zip(timestamps, timestamps[1:])]
+        # The last sample lasts as long as the one before it
+        durations.append(durations[-1] if durations else 1.0)
+        return ThroughputTrace(durations, bandwidths)
+
+    @staticmethod
+    def from_hsdpa(path: str) -> 'ThroughputTrace':
+        """
+        Load a raw 3G/HSDPA log (Riiser et al.). Each line is
+        "<unix time> <ms since start> <latitude> <longitude> <bytes received> <ms elapsed>".
+
+        Parameters
+        ----------
+        path: str
+            The path of the trace file
+
+        Returns
+        -------
+        trace: ThroughputTrace
+        """
+        durations = []
+        bandwidths = []
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 6:
+                    continue
+                num_bytes = int(fields[4])
+                elapsed = int(fields[5]) / 1000
+                if elapsed <= 0:
+                    continue
+                durations.append(elapsed)
+                bandwidths.append(num_bytes * 8 / elapsed)
+        if len(durations) == 0:
+            raise TraceParsingException("Empty HSDPA trace: %s" % path)
+        return ThroughputTrace(durations, bandwidths)
@@ -0,0 +1,22 @@
+Feature: ABR controller
+
+  Scenario: Choose the representations from the bitrate ladders
+    Given We have a DashABRController for a video and an audio adaptation set
+    When The controller chooses the representations at many bandwidths
+    Then The choices are the representations with the highest bitrate below the bandwidth of each adaptation set
+    And The bitrate ladders are only built once
+
+  Scenario: Build the bitrate ladders again for a new MPD version
+    Given We have a DashABRController for a video and an audio adaptation set
+    When The MPD provider delivers a new version with a higher video representation
+    Then The controller chooses the new representation
+
+  Scenario: Compare each track with its own latest selection
+    Given We have a DashABRController with a panic buffer of 2 seconds for a video and an audio track
+    When The video track switches up, then the buffer drops below the panic buffer before the audio track selects
+    Then The audio track doesn't switch up in panic
+
+  Scenario: Build the bitrate ladders again for other adaptation sets of the same MPD version
+    Given We have a DashABRController for a video and an audio adaptation set
+    When The controller chooses for new adaptation sets built after the previous ones were freed
+    Then The controller chooses from the new adaptation sets
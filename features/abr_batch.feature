@@ -0,0 +1,16 @@
+Feature: Batch evaluation of the ABR logic
+
+  Scenario: Compute the transfer times of a batch of traces
+    Given We have a batch of throughput traces with idle intervals
+    When The transfer times of many transfers are computed for the batch
+    Then They are the transfer times of the traces
+
+  Scenario: Evaluate the ABR logic over traces and buffer thresholds
+    Given We have a video and an audio adaptation set of 60 segments and three throughput traces
+    When The batch evaluator simulates every trace with every panic buffer and safe buffer
+    Then Each session gives the same QoE as DashABRController simulated segment by segment
+
+  Scenario: Start the playback only when the buffer level exceeds the threshold
+    Given We have an adaptation set of one representation of 1 Mbps in segments of 2 seconds
+    When The batch evaluator simulates a constant trace of 8 Mbps with a start buffer of 2 seconds
+    Then The playback starts after the second segment, when the buffer level exceeds 2 seconds
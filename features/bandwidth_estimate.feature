@@ -14,4 +14,29 @@ Feature: Estimate the bandwidth correctly
   Scenario: Estimate a mock bandwidth profile with more than one transmissions
     Given We have a default bandwidth meter
     When The two transmissions complete
-    Then The bandwidth should be estimated correctly for 2 transmissions
\ No newline at end of file
+    Then The bandwidth should be estimated correctly for 2 transmissions
+
+  Scenario: Estimate the continuous bandwidth over a bounded window
+    Given We have a bandwidth meter with a continuous bandwidth window of 1 second
+    When 10000 chunks of 1000 bytes are received every 10 milliseconds
+    Then The continuous bandwidth is 800 kbps and the window holds only the last second
+
+  Scenario: Throttle the continuous bandwidth updates
+    Given We have a bandwidth meter updating its listeners at most every 100 milliseconds
+    When 1000 chunks of 1000 bytes are received every 1 millisecond
+    Then The listeners get 10 continuous updates and the estimate still uses every chunk
+
+  Scenario: Send the pending continuous bandwidth at the end of a transfer
+    Given We have a bandwidth meter updating its listeners every 100000 bytes
+    When 950 chunks of 1000 bytes are received every 1 millisecond before the transfer is ended
+    Then The listeners get an update every 100 chunks and the last estimate at the end of the transfer
+
+  Scenario: Send the pending continuous bandwidth at the cancellation of a transfer
+    Given We have a bandwidth meter updating its listeners every 100000 bytes
+    When 950 chunks of 1000 bytes are received every 1 millisecond before the transfer is canceled
+    Then The listeners get an update every 100 chunks and the last estimate at the end of the transfer
+
+  Scenario: Skip the bandwidth sample of a transfer taking no time
+    Given We have a bandwidth meter on a virtual clock
+    When A transfer starts and ends at the same simulated time
+    Then The bandwidth estimate is kept
@@ -0,0 +1,11 @@
+Feature: Run the components on a virtual clock
+
+  Scenario: Sleep for a long time in simulated time
+    Given We have a virtual clock
+    When A coroutine sleeps for 2 hours on the virtual clock
+    Then The simulated time advances by 2 hours without waiting
+
+  Scenario: Timers fire in order in simulated time
+    Given We have a virtual clock
+    When Several coroutines sleep for different durations
+    Then They wake up in the order of their deadlines at the exact simulated times
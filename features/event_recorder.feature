@@ -0,0 +1,11 @@
+Feature: Record the events of a player in a binary file
+
+  Scenario: Record a session and load its events
+    Given We have a player on a virtual clock recording its events to a file
+    When The recorded session is played
+    Then The loaded events match the state changes, the segments and the stalls of the session
+
+  Scenario: Append to an events file and load several files
+    Given We have an events file with 5 records written in batches of 2
+    When 3 more records are appended to it, followed by a partial record
+    Then The file loads 8 records and loads with another file as 2 sessions
@@ -0,0 +1,14 @@
+Feature: Fleet of players
+
+  Scenario: Run several players sharing one HTTP session
+    Given We have a local origin serving a static MPD file of 3 one-second segments
+    When A fleet of 4 players plays it, with a duration of 0.5 seconds for every other player
+    Then The players share the HTTP session of the fleet
+    And The players without a duration play to the end and the others are stopped
+    And The results of every session are written
+
+  Scenario: Shard a fleet over worker processes
+    Given We have a local origin serving a static MPD file of 3 one-second segments in a thread
+    When A fleet of 6 players plays it in 2 worker processes
+    Then The parent sees the live counters of the sessions in shared memory
+    And The final counters of every session are published
@@ -2,4 +2,44 @@ Feature: Download using HTTP GET requests
   Scenario: Download Google's Logo
     Given We have an HTTP download manager
     When The HTTP download manager starts to download Google's Logo
-    Then It is downloaded and also called listeners
\ No newline at end of file
+    Then It is downloaded and also called listeners
+
+  Scenario: Download concurrently and cancel one request
+    Given We have an HTTP download manager and a local slow origin
+    When Three downloads are submitted and the second one is canceled
+    Then The other downloads complete with their own accounting
+
+  Scenario: Save the content in a buffer preallocated from Content-Length
+    Given We have an HTTP download manager and a local slow origin
+    When One download is saved
+    Then The content is returned in the preallocated buffer and listeners get read-only views
+
+  Scenario: Save content whose size is unknown or wrong
+    Given We have receive buffers expecting no size, 10 bytes, 50 bytes and 100 bytes
+    When 50 bytes are received in each of them
+    Then Each of them returns the 50 bytes
+
+  Scenario: Stream the downloads to the disk
+    Given We have an HTTP download manager writing to a temporary folder in small batches
+    When Two downloads are submitted to the local slow origin
+    Then The files are written under the folder with all the bytes
+
+  Scenario: Limit the rate of all the downloads and of one download
+    Given We have an HTTP download manager limited to 8 Mbps and a fast local origin
+    When Two downloads are submitted, the second one limited to 2 Mbps
+    Then The first download takes about 0.2 seconds and the second one about 0.4 seconds
+
+  Scenario: Coalesce the chunks reported to the listeners
+    Given We have an HTTP download manager coalescing 30000 bytes and a local slow origin
+    When One download is saved and another one is not
+    Then The listeners get a few events with all the bytes
+
+  Scenario: Cancel a download whose read is blocked
+    Given We have an HTTP download manager and a local origin which stalls for 2 seconds
+    When A download is submitted and canceled while its read is blocked
+    Then The download stops at once and the listeners get its cancellation
+
+  Scenario: Cancel the task of a download
+    Given We have an HTTP download manager and a local slow origin
+    When The task of a download is canceled while it transfers
+    Then The listeners get its cancellation and the bandwidth meter has no active transmission
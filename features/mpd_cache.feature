@@ -0,0 +1,36 @@
+Feature: Cache the parsed MPD files on the disk
+
+  Scenario: Skip the parsing of a cached MPD file
+    Given We have a caching MPD parser on a temporary folder
+    When The same MPD file is parsed twice, then by another caching parser on the same folder
+    Then It is parsed only once and the cached MPD objects are equal to the parsed one
+
+  Scenario: Evict the least recently used entries
+    Given We have an MPD cache holding about 2 entries
+    When 3 entries are stored, the first one being read before the third one is stored
+    Then The second entry is evicted
+
+  Scenario: Ignore a corrupted entry
+    Given We have a caching MPD parser on a temporary folder
+    When The MPD file is parsed, its entry is corrupted, and it is parsed again
+    Then It is parsed twice and the corrupted entry is replaced
+
+  Scenario: Keep the cache entries out of reach of the other users
+    Given We have a temporary folder
+    When An MPD cache is created in a new subfolder, and another one in a subfolder writable by other users
+    Then The new subfolder is only accessible by the user and the shared subfolder is refused
+
+  Scenario: Return the parsed MPD file when the cache can't store it
+    Given We have a caching MPD parser on a full disk
+    When The MPD file is parsed twice
+    Then It is parsed twice and the parsed MPD objects are returned
+
+  Scenario: Keep the entries of parsers configured differently apart
+    Given We have a caching MPD parser on a temporary folder
+    When The MPD file is parsed by streaming parsers keeping and dropping the content, sharing the cache folder
+    Then Each parser gets the content only if it keeps it
+
+  Scenario: Scan the cache folder only when it may be full
+    Given We have a temporary folder
+    When 10 entries smaller than the cache are stored
+    Then The folder is scanned at the first write and after 8 writes only
@@ -13,4 +13,24 @@ Feature: Parse MPD files
   Scenario: Parse a simple Representation
     Given We have the XML tree of a representation
     When nothing
-    Then The Representation gets parsed right
\ No newline at end of file
+    Then The Representation gets parsed right
+
+  Scenario: Parse a long SegmentTimeline lazily
+    Given We have a representation of 24 hours of 2-second segments with a $Number$ and $Time$ template
+    When The representation is parsed
+    Then The segments are built on demand with the right URLs and durations
+
+  Scenario: Parse an MPD file incrementally
+    Given We have the MPD file content
+    When The MPD file is parsed by the default parser and by the streaming parser without the content
+    Then Both parsers give the same MPD and the streaming parser doesn't keep the content
+
+  Scenario: Parse only the first period incrementally
+    Given We have an MPD file content with a prefixed namespace and two periods
+    When The MPD file is parsed by the streaming parser
+    Then Only the adaptation sets of the first period are parsed
+
+  Scenario: Keep the parsed model compact
+    Given We have a representation listing every segment of the same duration in its own S element
+    When The representation is parsed
+    Then The contiguous segments share one run and the model objects have no instance dictionaries
@@ -0,0 +1,36 @@
+Feature: Refresh dynamic MPD files incrementally
+
+  Scenario: Append the new segments of a sliding timeline
+    Given We have a timeline of 5 segments of 2 seconds
+    When A newer timeline without the first 3 segments, with the 5th segment longer and 4 new segments, is merged
+    Then The timeline keeps its first 5 segments and gets the 4 new ones
+
+  Scenario: Refresh a live MPD file with conditional requests
+    Given We have a local live origin whose MPD file changes after 3 requests
+    When An MPD provider follows the MPD file for 0.5 seconds
+    Then The MPD file is parsed only when it has changed and the new segments are appended
+
+  Scenario: Parse a large MPD file off the event loop
+    Given We have an MPD provider parsing in a process pool and a large MPD file on a synthetic origin
+    When The provider starts while a ticker measures the event loop lag
+    Then The MPD file is parsed, and the event loop kept running during the parse
+
+  Scenario: Keep the current MPD file when a refresh fails
+    Given We have a local live origin answering with errors after 1 request
+    When An MPD provider starts and follows the MPD file for 0.3 seconds
+    Then The provider keeps the MPD file and its validators through the failed refreshes
+
+  Scenario: Keep refreshing the MPD file when the connection drops
+    Given We have a local live origin dropping the connections after 1 request
+    When An MPD provider starts and follows the MPD file for 0.3 seconds
+    Then The provider keeps the MPD file and its validators through the failed refreshes
+
+  Scenario: Fail to start when the MPD file can't be downloaded
+    Given We have a local live origin answering with errors after 0 requests
+    When An MPD provider starts and follows the MPD file for 0.3 seconds
+    Then The provider fails to start without parsing the error response
+
+  Scenario: Shut down the parse executor only if the provider owns it
+    Given We have two MPD providers parsing in a thread pool, one owning it and one sharing another one
+    When Both providers start and stop
+    Then Only the executor owned by a provider is shut down, and the thread pool parses avoided no lag
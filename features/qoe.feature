@@ -0,0 +1,21 @@
+Feature: Compute the QoE metrics of a session as the events arrive
+
+  Scenario: Estimate the quantiles of a stream in constant memory
+    Given We have 100000 values drawn from an exponential distribution
+    When The values are added to streaming quantile estimators
+    Then The estimates are within 1 percent of the exact quantiles
+
+  Scenario: Keep the QoE metrics of a session up to date
+    Given We have a player on a virtual clock monitored for QoE and recording its events
+    When The monitored session is played
+    Then The QoE snapshots match the metrics recomputed from the recorded events
+
+  Scenario: Count the segments of the tracks scheduled independently
+    Given We have a scheduler with independent tracks monitored for QoE, the video track shorter than the audio one
+    When The scheduler downloads all the monitored segments
+    Then The average bitrate counts the segments of every track with their own durations
+
+  Scenario: Weight the buffer level by time however often it is reported
+    Given We have QoE monitors of a buffer level staying at 1 second for 9 seconds, then at 10 seconds for 1 second
+    When One monitor gets the buffer level every 10 ms and the other one only gets more reports at 10 seconds
+    Then Both monitors estimate the quantiles of the buffer level over time
@@ -0,0 +1,11 @@
+Feature: Limit the download rate with token buckets
+
+  Scenario: Two transfers share the rate of one bucket
+    Given We have a token bucket of 80 kbps on a virtual clock
+    When Two transfers take 100 chunks of 1000 bits each from the bucket
+    Then Both transfers complete after 2.5 simulated seconds
+
+  Scenario: The rate follows a schedule
+    Given We have a token bucket following the schedule "0:40000,1:80000" on a virtual clock
+    When One transfer takes 120 chunks of 1000 bits from the bucket
+    Then It completes after 2 simulated seconds
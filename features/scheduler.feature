@@ -0,0 +1,36 @@
+Feature: Schedule the segment downloads
+
+  Scenario: Download the segments of all the adaptation sets concurrently
+    Given We have a scheduler for a video and an audio adaptation set allowing 4 concurrent downloads
+    When The scheduler downloads all the segments
+    Then The downloads of each index overlap and each index completes after all its downloads
+
+  Scenario: Download the segments one after another
+    Given We have a scheduler for a video and an audio adaptation set allowing 1 concurrent downloads
+    When The scheduler downloads all the segments
+    Then The downloads never overlap
+
+  Scenario: Schedule each adaptation set independently
+    Given We have a scheduler with independent tracks and a slow audio adaptation set
+    When The scheduler downloads all the segments
+    Then The video track is not held back by the audio track and each track has its own buffer
+
+  Scenario: Request the next segments ahead while the current one arrives
+    Given We have a scheduler requesting 2 indices ahead in 4 download slots with an ABR switching down after 2 decisions
+    When The scheduler downloads all the segments
+    Then The next index is requested before the current one arrives and stale requests ahead are canceled
+
+  Scenario: Request ahead only the indices all the adaptation sets have
+    Given We have a scheduler requesting 2 indices ahead in 4 download slots with an audio adaptation set shorter than the video one
+    When The scheduler downloads all the segments
+    Then No segment after the end of the shortest adaptation set is requested and the initialization segments are requested once
+
+  Scenario: Sleep until the full buffer drains at the playback rate
+    Given We have a scheduler with a maximum buffer of 4 seconds during a playback paused from 5 to 8 seconds
+    When The scheduler downloads all the segments
+    Then Each segment is requested as soon as the buffer drains to 4 seconds and never during the pause
+
+  Scenario: Complete each index once with independent tracks of different lengths
+    Given We have a scheduler with independent tracks and an audio adaptation set shorter than the video one
+    When The scheduler downloads all the segments
+    Then Each index completes once, each track gets its own selections and the audio track stops holding the buffer back
@@ -0,0 +1,231 @@
+from types import SimpleNamespace
+
+from behave import *
+
+from dash_emulator.abr import DashABRController
+from dash_emulator.bandwidth import BandwidthMeter
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.models import AdaptationSet, Representation, MPD
+from dash_emulator.mpd import MPDProvider
+
+use_step_matcher("re")
+
+
+class FixedBandwidthMeter(BandwidthMeter):
+    def __init__(self, bandwidth):
+        self.fixed_bandwidth = bandwidth
+
+    @property
+    def bandwidth(self) -> int:
+        return self.fixed_bandwidth
+
+    def add_listener(self, listener):
+        pass
+
+
+class VersionedMPDProvider(MPDProvider):
+    def __init__(self, mpd):
+        self._mpd = mpd
+        self._version = 1
+
+    @property
+    def mpd(self) -> MPD:
+        return self._mpd
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def deliver(self):
+        self._version += 1
+
+    async def start(self, mpd_url):
+        pass
+
+    async def stop(self):
+        pass
+
+
+def build_adaptation_set(adaptation_set_id, content_type, bandwidths):
+    representations = {
+        i: Representation(i, "video/mp4", "avc1", bandwidth, 1280, 720, "init-%d.m4s" % i, [])
+        for i, bandwidth in bandwidths.items()}
+    return AdaptationSet(adaptation_set_id, content_type, "30", 1280, 720, "16:9", representations)
+
+
+def reference_selection(adaptation_set, bw):
+    # The highest representation below the bandwidth, the first one of the adaptation set among equal ones
+    representations = sorted(adaptation_set.representations.values(), key=lambda x: x.bandwidth, reverse=True)
+    for representation in representations:
+        if representation.bandwidth < bw:
+            return representation.id
+    return representations[-1].id
+
+
+@given("We have a DashABRController for a video and an audio adaptation set")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    # Representations 3 and 1 have the same bitrate
+    video = build_adaptation_set(0, "video", {0: 3000000, 3: 1000000, 1: 1000000, 2: 6000000, 4: 300000})
+    audio = build_adaptation_set(1, "audio", {0: 128000, 1: 64000})
+    context.args.adaptation_sets = {0: video, 1: audio}
+    mpd = MPD("", "", "dynamic", 0, 2, 2, context.args.adaptation_sets)
+    context.args.mpd_provider = VersionedMPDProvider(mpd)
+    context.args.bandwidth_meter = FixedBandwidthMeter(1000000)
+    # The buffer level never goes below the panic buffer or above the safe buffer, the ideal selection is kept
+    context.args.controller = DashABRController(-1, float("inf"), context.args.bandwidth_meter, BufferManagerImpl(),
+                                                context.args.mpd_provider)
+
+
+@when("The controller chooses the representations at many bandwidths")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    controller = context.args.controller
+    context.args.choices = []
+    context.args.ladders = []
+    for bandwidth in range(0, 12000000, 12500):
+        context.args.bandwidth_meter.fixed_bandwidth = bandwidth
+        context.args.choices.append((bandwidth, controller.update_selection(context.args.adaptation_sets)))
+        context.args.ladders.append(controller._ladders)
+
+
+@then("The choices are the representations with the highest bitrate below the bandwidth of each adaptation set")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    video, audio = context.args.adaptation_sets[0], context.args.adaptation_sets[1]
+    for bandwidth, selection in context.args.choices:
+        available_bandwidth = int(bandwidth * 0.7)
+        assert selection == {0: reference_selection(video, available_bandwidth * 0.8),
+                             1: reference_selection(audio, available_bandwidth * 0.2)}, (bandwidth, selection)
+    assert {selection[0] for _, selection in context.args.choices} == {0, 2, 3, 4}
+
+
+@then("The bitrate ladders are only built once")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert all(ladders is context.args.ladders[0] for ladders in context.args.ladders)
+
+
+@when("The MPD provider delivers a new version with a higher video representation")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    controller = context.args.controller
+    context.args.bandwidth_meter.fixed_bandwidth = 100000000
+    context.args.first_selection = controller.update_selection(context.args.adaptation_sets)
+    video = context.args.adaptation_sets[0]
+    video.representations[5] = Representation(5, "video/mp4", "avc1", 20000000, 3840, 2160, "init-5.m4s", [])
+    # The same adaptation sets are updated in place, as when a refreshed MPD file is merged
+    context.args.stale_selection = controller.update_selection(context.args.adaptation_sets)
+    context.args.mpd_provider.deliver()
+    context.args.new_selection = controller.update_selection(context.args.adaptation_sets)
+
+
+@then("The controller chooses the new representation")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert context.args.first_selection == {0: 2, 1: 0}
+    assert context.args.stale_selection == {0: 2, 1: 0}
+    assert context.args.new_selection == {0: 5, 1: 0}
+
+
+@given("We have a DashABRController with a panic buffer of 2 seconds for a video and an audio track")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    video = build_adaptation_set(0, "video", {0: 3000000, 1: 1000000, 2: 300000})
+    audio = build_adaptation_set(1, "audio", {0: 128000, 1: 64000})
+    context.args.adaptation_sets = {0: video, 1: audio}
+    mpd = MPD("", "", "dynamic", 0, 2, 2, context.args.adaptation_sets)
+    context.args.bandwidth_meter = FixedBandwidthMeter(300000)
+    context.args.buffer_manager = BufferManagerImpl()
+    context.args.buffer_manager.enqueue_buffer(10)
+    context.args.controller = DashABRController(2, float("inf"), context.args.bandwidth_meter,
+                                                context.args.buffer_manager, VersionedMPDProvider(mpd))
+
+
+@when("The video track switches up, then the buffer drops below the panic buffer before the audio track selects")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    controller = context.args.controller
+    adaptation_sets = context.args.adaptation_sets
+    context.args.first_selections = {id_: controller.update_track_selection(adaptation_sets, id_)
+                                     for id_ in adaptation_sets.keys()}
+    context.args.bandwidth_meter.fixed_bandwidth = 100000000
+    context.args.video_selection = controller.update_track_selection(adaptation_sets, 0)
+    context.args.buffer_manager.update_buffer(9)
+    context.args.audio_selection = controller.update_track_selection(adaptation_sets, 1)
+
+
+@then("The audio track doesn't switch up in panic")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert context.args.first_selections == {0: 2, 1: 1}
+    assert context.args.video_selection == 0
+    # The audio track downloaded the lowest representation last, whatever the video track selected since
+    assert context.args.audio_selection == 1
+
+
+@when("The controller chooses for new adaptation sets built after the previous ones were freed")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    controller = context.args.controller
+    context.args.bandwidth_meter.fixed_bandwidth = 100000000
+    videos = [build_adaptation_set(0, "video", {0: 3000000, 1: 1000000}),
+              build_adaptation_set(0, "video", {0: 3000000, 1: 1000000, 2: 20000000})]
+    context.args.choices = []
+    for video in videos:
+        # The adaptation sets are freed after each choice, the next ones are likely allocated at the same address
+        adaptation_sets = {0: video}
+        context.args.choices.append(controller.update_selection(adaptation_sets))
+        del adaptation_sets
+
+
+@then("The controller chooses from the new adaptation sets")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert context.args.choices == [{0: 0}, {0: 2}], context.args.choices
@@ -0,0 +1,247 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+from behave import *
+
+from dash_emulator.abr import DashABRController
+from dash_emulator.abr_batch import BatchABREvaluator, TraceBatch
+from dash_emulator.bandwidth import BandwidthMeter
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.models import AdaptationSet, Representation, MPD
+from dash_emulator.mpd import MPDProvider
+from dash_emulator.traces import ThroughputTrace
+
+use_step_matcher("re")
+
+SEGMENT_DURATION = 2
+NUM_SEGMENTS = 60
+
+
+class SettableBandwidthMeter(BandwidthMeter):
+    def __init__(self, bandwidth):
+        self.value = bandwidth
+
+    @property
+    def bandwidth(self) -> int:
+        return self.value
+
+    def add_listener(self, listener):
+        pass
+
+
+class SettableBufferManager(BufferManagerImpl):
+    def __init__(self):
+        super().__init__()
+        self.level = 0.0
+
+    @property
+    def buffer_level(self):
+        return self.level
+
+
+class StaticMPDProvider(MPDProvider):
+    def __init__(self, mpd):
+        self._mpd = mpd
+
+    @property
+    def mpd(self) -> MPD:
+        return self._mpd
+
+    async def start(self, mpd_url):
+        pass
+
+    async def stop(self):
+        pass
+
+
+def simulate_session(mpd, trace, panic_buffer, safe_buffer):
+    """
+    Simulate one session segment by segment with DashABRController, with the model of BatchABREvaluator
+    """
+    bandwidth_meter = SettableBandwidthMeter(1000000)
+    buffer_manager = SettableBufferManager()
+    controller = DashABRController(panic_buffer, safe_buffer, bandwidth_meter, buffer_manager, StaticMPDProvider(mpd))
+    now = 0.0
+    level = 0.0
+    playing = started = False
+    session = SimpleNamespace(stall_time=0.0, num_stalls=0, num_switches=0, startup_delay=None, total_bits=0.0,
+                              selections=[])
+    last = None
+    for _ in range(NUM_SEGMENTS):
+        if playing:
+            wait = max(level - 5, 0.0)
+            now += wait
+            level -= wait
+        buffer_manager.level = level
+        selection = controller.update_selection(mpd.adaptation_sets)
+        if last is not None:
+            session.num_switches += sum(selection[id_] != last[id_] for id_ in selection)
+        last = selection
+        session.selections.append(selection)
+        bits = sum(mpd.adaptation_sets[id_].representations[representation_id].bandwidth * SEGMENT_DURATION
+                   for id_, representation_id in selection.items())
+        session.total_bits += bits
+        download_time = trace.transfer_time(now, bits)
+        now += download_time
+        bandwidth_meter.value = bits / download_time
+        if playing and download_time > level:
+            session.stall_time += download_time - level
+            session.num_stalls += 1
+            level = 0.0
+            playing = False
+        elif playing:
+            level -= download_time
+        elif started:
+            session.stall_time += download_time
+        level += SEGMENT_DURATION
+        if not playing and level > (1 if started else 2):
+            if not started:
+                session.startup_delay = now
+            playing = started = True
+    return session
+
+
+@given("We have a batch of throughput traces with idle intervals")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    rng = random.Random(1)
+    context.args.traces = [
+        ThroughputTrace([rng.uniform(0.1, 3) for _ in range(length)],
+                        [rng.choice([0, 1e5, 1e6, 5e6]) for _ in range(length - 1)] + [2e6])
+        for length in (1, 3, 17, 40)]
+
+
+@when("The transfer times of many transfers are computed for the batch")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    rng = random.Random(2)
+    num_transfers = 2000
+    context.args.rows = np.array([rng.randrange(len(context.args.traces)) for _ in range(num_transfers)])
+    context.args.starts = np.array([rng.uniform(0, 200) for _ in range(num_transfers)])
+    context.args.bits = np.array([rng.choice([0, rng.uniform(0, 5e7)]) for _ in range(num_transfers)])
+    context.args.times = TraceBatch(context.args.traces).transfer_time(context.args.rows, context.args.starts,
+                                                                       context.args.bits)
+
+
+@then("They are the transfer times of the traces")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    for row, start, bits, time in zip(context.args.rows, context.args.starts, context.args.bits, context.args.times):
+        expected = context.args.traces[row].transfer_time(start, bits)
+        assert abs(time - expected) <= 1e-9 * max(expected, 1), (row, start, bits, time, expected)
+
+
+@given("We have a video and an audio adaptation set of 60 segments and three throughput traces")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    video = AdaptationSet(0, "video", "30", 1920, 1080, "16:9", {
+        i: Representation(i, "video/mp4", "avc1", bandwidth, 1920, 1080, "", [])
+        for i, bandwidth in enumerate([300000, 1000000, 2500000, 5000000])})
+    audio = AdaptationSet(1, "audio", "", 0, 0, "", {
+        i: Representation(i, "audio/mp4", "mp4a", bandwidth, 0, 0, "", [])
+        for i, bandwidth in enumerate([64000, 128000])})
+    context.args.mpd = MPD("", "", "static", NUM_SEGMENTS * SEGMENT_DURATION, SEGMENT_DURATION, 2, {0: video, 1: audio})
+    context.args.traces = [
+        ThroughputTrace.constant(8000000),
+        ThroughputTrace([10, 10], [6000000, 800000]),
+        ThroughputTrace([3, 1, 7, 4], [3000000, 0, 1500000, 400000]),
+    ]
+    context.args.panic_buffers = [0, 2, 4]
+    context.args.safe_buffers = [3, 4.5, 10]
+
+
+@when("The batch evaluator simulates every trace with every panic buffer and safe buffer")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    evaluator = BatchABREvaluator(context.args.mpd.adaptation_sets, [SEGMENT_DURATION] * NUM_SEGMENTS,
+                                  context.args.mpd.max_segment_duration)
+    context.args.result = evaluator.evaluate(context.args.traces, context.args.panic_buffers,
+                                             context.args.safe_buffers, keep_selections=True)
+
+
+@then("Each session gives the same QoE as DashABRController simulated segment by segment")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    result = context.args.result
+    assert len(result) == len(context.args.traces) * len(context.args.panic_buffers) * len(context.args.safe_buffers)
+    num_switches = 0
+    num_stalls = 0
+    for i in range(len(result)):
+        trace = context.args.traces[result.trace_index[i]]
+        session = simulate_session(context.args.mpd, trace, result.panic_buffer[i], result.safe_buffer[i])
+        assert [{0: result.selections[0][i, j], 1: result.selections[1][i, j]} for j in range(NUM_SEGMENTS)] == \
+               session.selections, i
+        assert result.num_switches[i] == session.num_switches
+        assert result.num_stalls[i] == session.num_stalls
+        assert abs(result.stall_time[i] - session.stall_time) < 1e-6
+        assert abs(result.startup_delay[i] - session.startup_delay) < 1e-6
+        assert abs(result.average_bitrate[i] - session.total_bits / (NUM_SEGMENTS * SEGMENT_DURATION)) < 1e-3
+        num_switches += session.num_switches
+        num_stalls += session.num_stalls
+    # The sessions exercise the switches and the stalls
+    assert num_switches > 0
+    assert num_stalls > 0
+
+
+@given("We have an adaptation set of one representation of 1 Mbps in segments of 2 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    video = AdaptationSet(0, "video", "30", 1920, 1080, "16:9", {
+        0: Representation(0, "video/mp4", "avc1", 1000000, 1920, 1080, "", [])})
+    context.args.adaptation_sets = {0: video}
+
+
+@when("The batch evaluator simulates a constant trace of 8 Mbps with a start buffer of 2 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    evaluator = BatchABREvaluator(context.args.adaptation_sets, [SEGMENT_DURATION] * 10, SEGMENT_DURATION,
+                                  min_start_buffer_duration=2)
+    context.args.result = evaluator.evaluate([ThroughputTrace.constant(8000000)], [0], [10])
+
+
+@then("The playback starts after the second segment, when the buffer level exceeds 2 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    # Each segment takes 0.25 seconds to download, the first one only fills the buffer up to the threshold
+    assert abs(context.args.result.startup_delay[0] - 0.5) < 1e-9
+    assert context.args.result.num_stalls[0] == 0
@@ -4,10 +4,22 @@ from types import SimpleNamespace
 from behave import *
 
 from dash_emulator.bandwidth import BandwidthMeterImpl, BandwidthUpdateListener
+from dash_emulator.clock import VirtualClock
 
 use_step_matcher("re")
 
 
+class CountingListener(BandwidthUpdateListener):
+    def __init__(self):
+        self.cont_bw_updates = []
+
+    async def on_bandwidth_update(self, bw: int, extra_stats: dict) -> None:
+        pass
+
+    async def on_continuous_bw_update(self, bw: int) -> None:
+        self.cont_bw_updates.append(bw)
+
+
 @given("We have a default bandwidth meter")
 def step_impl(context):
     """
@@ -130,3 +142,179 @@ def step_impl(context):
     """
     bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
     assert abs(bandwidth_meter.bandwidth - 60000) < 1000
+
+
+@given("We have a bandwidth meter with a continuous bandwidth window of 1 second")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.bandwidth_meter = BandwidthMeterImpl(1000, 0.5, [], cont_bw_window=1)
+
+
+@when("10000 chunks of 1000 bytes are received every 10 milliseconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
+
+    async def feed():
+        await bandwidth_meter.on_transfer_start("http://foo.bar")
+        for i in range(10000):
+            await bandwidth_meter.update_cont_bw(1000, i * 0.01)
+
+    asyncio.run(feed())
+
+
+@then("The continuous bandwidth is 800 kbps and the window holds only the last second")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
+    assert abs(bandwidth_meter.last_cont_bw - 800000) < 10
+    assert len(bandwidth_meter._cont_bw) <= 101
+
+
+@given("We have a bandwidth meter updating its listeners at most every 100 milliseconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.listener = CountingListener()
+    context.args.bandwidth_meter = BandwidthMeterImpl(1000, 0.5, [context.args.listener], cont_bw_window=1,
+                                                      cont_bw_update_interval=0.1)
+
+
+@when("1000 chunks of 1000 bytes are received every 1 millisecond")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
+
+    async def feed():
+        await bandwidth_meter.on_transfer_start("http://foo.bar")
+        for i in range(1000):
+            await bandwidth_meter.update_cont_bw(1000, i * 0.001)
+
+    asyncio.run(feed())
+
+
+@then("The listeners get 10 continuous updates and the estimate still uses every chunk")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
+    assert len(context.args.listener.cont_bw_updates) == 10, len(context.args.listener.cont_bw_updates)
+    assert abs(bandwidth_meter.last_cont_bw - 8000000) < 100
+    assert len(bandwidth_meter._cont_bw) == 999
+
+
+@given("We have a bandwidth meter updating its listeners every 100000 bytes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.listener = CountingListener()
+    context.args.bandwidth_meter = BandwidthMeterImpl(1000, 0.5, [context.args.listener], cont_bw_window=1,
+                                                      cont_bw_update_bytes=100000)
+
+
+@when("950 chunks of 1000 bytes are received every 1 millisecond before the transfer is (?P<outcome>ended|canceled)")
+def step_impl(context, outcome):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    outcome : str
+    """
+    bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
+
+    async def feed():
+        await bandwidth_meter.on_transfer_start("http://foo.bar")
+        for i in range(950):
+            await bandwidth_meter.update_cont_bw(1000, i * 0.001)
+        context.args.num_updates_before_end = len(context.args.listener.cont_bw_updates)
+        if outcome == "ended":
+            await bandwidth_meter.on_transfer_end(950000, "http://foo.bar")
+        else:
+            await bandwidth_meter.on_transfer_canceled("http://foo.bar", 950000, 1000000)
+
+    asyncio.run(feed())
+
+
+@then("The listeners get an update every 100 chunks and the last estimate at the end of the transfer")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
+    updates = context.args.listener.cont_bw_updates
+    # At the first chunk, then at the chunks 100, 200, ..., 900
+    assert context.args.num_updates_before_end == 10, context.args.num_updates_before_end
+    assert len(updates) == 11, len(updates)
+    assert updates[-1] == bandwidth_meter.last_cont_bw
+    assert updates[-2] != updates[-1]
+
+
+@given("We have a bandwidth meter on a virtual clock")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = VirtualClock()
+    context.args.listener = CountingListener()
+    context.args.bandwidth_meter = BandwidthMeterImpl(1000, 0.5, [context.args.listener], clock=context.args.clock)
+
+
+@when("A transfer starts and ends at the same simulated time")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    bandwidth_meter: BandwidthMeterImpl = context.args.bandwidth_meter
+
+    async def transfer():
+        await bandwidth_meter.on_transfer_start("http://foo.bar")
+        await bandwidth_meter.on_bytes_transferred(1000, "http://foo.bar", 1000, 1000, None)
+        await bandwidth_meter.on_transfer_end(1000, "http://foo.bar")
+
+    context.args.clock.run(transfer())
+    context.args.clock.close()
+
+
+@then("The bandwidth estimate is kept")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert context.args.bandwidth_meter.bandwidth == 1000
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from behave import *
+
+from dash_emulator.clock import VirtualClock
+
+use_step_matcher("re")
+
+
+@given("We have a virtual clock")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = VirtualClock()
+
+
+@when("A coroutine sleeps for 2 hours on the virtual clock")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+
+    async def run():
+        start = clock.time()
+        await clock.sleep(7200)
+        return clock.time() - start
+
+    wall_start = time.time()
+    context.args.elapsed = clock.run(run())
+    context.args.wall_elapsed = time.time() - wall_start
+
+
+@then("The simulated time advances by 2 hours without waiting")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert context.args.elapsed == 7200
+    assert context.args.wall_elapsed < 1
+
+
+@when("Several coroutines sleep for different durations")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+    context.args.wakeups = []
+
+    async def sleeper(name, delay):
+        await clock.sleep(delay)
+        context.args.wakeups.append((name, clock.time()))
+
+    async def run():
+        await asyncio.gather(sleeper("c", 30), sleeper("a", 0.5), sleeper("b", 10))
+
+    clock.run(run())
+
+
+@then("They wake up in the order of their deadlines at the exact simulated times")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert context.args.wakeups == [("a", 0.5), ("b", 10), ("c", 30)]
@@ -0,0 +1,206 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+from behave import *
+
+from dash_emulator.abr import DashABRController
+from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.clock import VirtualClock
+from dash_emulator.event_recorder import EventRecorder, load_events, load_many, stalls, EVENT_STATE, \
+    EVENT_SEGMENT_START, EVENT_SEGMENT_COMPLETE, EVENT_BANDWIDTH, EVENT_POSITION
+from dash_emulator.models import State
+from dash_emulator.mpd.parser import DefaultMPDParser
+from dash_emulator.mpd.providers import MPDProviderImpl
+from dash_emulator.origin import SyntheticOrigin
+from dash_emulator.player import DASHPlayer, PlayerEventListener
+from dash_emulator.scheduler import SchedulerImpl
+from dash_emulator.trace_download import TraceDownloadManager, TraceLink
+from dash_emulator.traces import ThroughputTrace
+
+use_step_matcher("re")
+
+MPD_URL = "http://origin.local/videos/recorded/output.mpd"
+
+MPD_CONTENT = """<?xml version="1.0" encoding="utf-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT120S"
+    maxSegmentDuration="PT2S" minBufferTime="PT2S">
+    <Period id="0">
+        <AdaptationSet id="0" contentType="video" maxWidth="1280" maxHeight="720">
+            <Representation id="0" mimeType="video/mp4" codecs="avc1" bandwidth="2000000" width="1280" height="720">
+                <SegmentTemplate timescale="1000" initialization="init-$RepresentationID$.m4s"
+                    media="chunk-$RepresentationID$-$Number%05d$.m4s" startNumber="1">
+                    <SegmentTimeline>
+                        <S t="0" d="2000" r="59" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>
+            <Representation id="1" mimeType="video/mp4" codecs="avc1" bandwidth="500000" width="640" height="360">
+                <SegmentTemplate timescale="1000" initialization="init-$RepresentationID$.m4s"
+                    media="chunk-$RepresentationID$-$Number%05d$.m4s" startNumber="1">
+                    <SegmentTimeline>
+                        <S t="0" d="2000" r="59" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>
+        </AdaptationSet>
+    </Period>
+</MPD>"""
+
+
+class TransitionListener(PlayerEventListener):
+    def __init__(self, clock):
+        self.clock = clock
+        self.transitions = []
+
+    async def on_state_change(self, position: float, old_state: State, new_state: State):
+        self.transitions.append((self.clock.time(), position, old_state, new_state))
+
+    async def on_buffer_level_change(self, buffer_level):
+        pass
+
+    async def on_position_change(self, position):
+        pass
+
+
+@given("We have a player on a virtual clock recording its events to a file")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.folder = tempfile.TemporaryDirectory()
+    context.args.path = os.path.join(context.args.folder.name, "events.bin")
+    context.args.clock = clock = VirtualClock()
+    origin = SyntheticOrigin()
+    origin.add_mpd_content(MPD_URL, MPD_CONTENT)
+    trace = ThroughputTrace([10, 10, 10], [3000000, 300000, 3000000])
+    context.args.recorder = recorder = EventRecorder(context.args.path, clock, batch_size=16)
+    context.args.listener = listener = TransitionListener(clock)
+
+    link = TraceLink(trace, clock)
+    buffer_manager = BufferManagerImpl()
+    mpd_provider = MPDProviderImpl(DefaultMPDParser(), 0.05, TraceDownloadManager([], link, origin, clock), clock=clock)
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [recorder], clock=clock)
+    download_manager = TraceDownloadManager([bandwidth_meter], link, origin, clock, 40960)
+    abr_controller = DashABRController(2, 4, bandwidth_meter, buffer_manager, mpd_provider)
+    scheduler = SchedulerImpl(5, 0.05, download_manager, bandwidth_meter, buffer_manager, abr_controller, [recorder],
+                              clock=clock)
+    context.args.player = DASHPlayer(0.05, min_rebuffer_duration=1, min_start_buffer_duration=2,
+                                     buffer_manager=buffer_manager, mpd_provider=mpd_provider, scheduler=scheduler,
+                                     listeners=[recorder, listener], clock=clock)
+
+
+@when("The recorded session is played")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args.clock.run(context.args.player.start(MPD_URL))
+    context.args.clock.close()
+    context.args.recorder.close()
+
+
+@then("The loaded events match the state changes, the segments and the stalls of the session")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    events = load_events(context.args.path)
+    transitions = context.args.listener.transitions
+
+    states = events[events["type"] == EVENT_STATE]
+    assert len(states) == len(transitions)
+    assert np.array_equal(states["time"], [transition[0] for transition in transitions])
+    assert np.array_equal(states["value"], [transition[1] for transition in transitions])
+    assert np.array_equal(states["a"], [transition[2].value for transition in transitions])
+    assert np.array_equal(states["b"], [transition[3].value for transition in transitions])
+
+    # One start per segment index, and the scheduler ends at the index after the last segment
+    starts = events[events["type"] == EVENT_SEGMENT_START]
+    assert np.array_equal(starts["a"], np.arange(61))
+    assert np.isin(starts["c"], [0, 1]).all()
+    assert np.array_equal(events[events["type"] == EVENT_SEGMENT_COMPLETE]["a"], np.arange(60))
+    assert np.count_nonzero(events["type"] == EVENT_BANDWIDTH) > 0
+    assert np.count_nonzero(events["type"] == EVENT_POSITION) > 0
+    assert np.all(np.diff(events["time"]) >= 0)
+
+    start_times, durations, positions = stalls(events)
+    expected = [(transitions[i][0], transitions[i + 1][0] - transitions[i][0], transitions[i][1])
+                for i in range(len(transitions) - 1)
+                if transitions[i][2] == State.READY and transitions[i][3] == State.BUFFERING]
+    assert len(expected) > 0
+    assert np.allclose(np.column_stack([start_times, durations, positions]), expected)
+    del events, states, starts
+    context.args.folder.cleanup()
+
+
+@given("We have an events file with 5 records written in batches of 2")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.folder = tempfile.TemporaryDirectory()
+    context.args.path = os.path.join(context.args.folder.name, "events.bin")
+    recorder = EventRecorder(context.args.path, VirtualClock(), batch_size=2)
+    for i in range(5):
+        recorder.record(EVENT_SEGMENT_COMPLETE, i)
+    # The last record is still in the buffer until the recorder is closed
+    assert len(load_events(context.args.path)) == 4
+    recorder.close()
+
+
+@when("3 more records are appended to it, followed by a partial record")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    recorder = EventRecorder(context.args.path, VirtualClock(), batch_size=2)
+    for i in range(5, 8):
+        recorder.record(EVENT_SEGMENT_COMPLETE, i)
+    recorder.close()
+    with open(context.args.path, "ab") as f:
+        f.write(b"\0" * 10)
+
+
+@then("The file loads 8 records and loads with another file as 2 sessions")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    events = load_events(context.args.path)
+    assert np.array_equal(events["a"], np.arange(8))
+    other_path = os.path.join(context.args.folder.name, "other.bin")
+    EventRecorder(other_path).close()
+    recorder = EventRecorder(other_path, batch_size=2)
+    recorder.record(EVENT_SEGMENT_COMPLETE, 100)
+    recorder.close()
+    all_events, sessions = load_many([context.args.path, other_path])
+    assert np.array_equal(all_events["a"], list(range(8)) + [100])
+    assert np.array_equal(sessions, [0] * 8 + [1])
+
+    not_events_path = os.path.join(context.args.folder.name, "other.txt")
+    with open(not_events_path, "w") as f:
+        f.write("not events at all")
+    try:
+        load_events(not_events_path)
+        assert False, "A file which is not an events file must be rejected"
+    except ValueError:
+        pass
+    del events, all_events
+    context.args.folder.cleanup()
@@ -0,0 +1,260 @@
+import asyncio
+import csv
+import multiprocessing
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+
+from aiohttp import web
+from behave import *
+
+from dash_emulator.abr import DashABRController
+from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.download import DownloadManagerImpl
+from dash_emulator.fleet import FleetRunner
+from dash_emulator.fleet_shards import ShardedFleetRunner, STATUS, STATE, BYTES, BITRATE, SEGMENTS, STATUS_ENDED
+from dash_emulator.models import State
+from dash_emulator.mpd.parser import DefaultMPDParser
+from dash_emulator.mpd.providers import MPDProviderImpl
+from dash_emulator.player import DASHPlayer
+from dash_emulator.scheduler import SchedulerImpl
+
+use_step_matcher("re")
+
+SEGMENT_SIZE = 1000
+BANDWIDTH = 800000
+
+FLEET_MPD = """<?xml version="1.0" encoding="utf-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT3S"
+    maxSegmentDuration="PT1S" minBufferTime="PT1S">
+    <Period id="0">
+        <AdaptationSet id="0" contentType="video" maxWidth="1280" maxHeight="720">
+            <Representation id="0" mimeType="video/mp4" codecs="avc1" bandwidth="%d" width="1280" height="720">
+                <SegmentTemplate timescale="1000" initialization="init.m4s" media="chunk-$Number$.m4s" startNumber="1">
+                    <SegmentTimeline>
+                        <S t="0" d="1000" r="2" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>
+        </AdaptationSet>
+    </Period>
+</MPD>
+""" % BANDWIDTH
+
+
+class FleetOrigin(object):
+    def __init__(self):
+        self.runner = None
+        self.base_url = None
+
+    async def handle(self, request):
+        if request.match_info["name"].endswith(".mpd"):
+            return web.Response(text=FLEET_MPD)
+        return web.Response(body=bytes(SEGMENT_SIZE))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{name}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base_url = "http://127.0.0.1:%d/" % self.runner.addresses[0][1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def build_fleet_player(session, params, stats):
+    mpd_download_manager = DownloadManagerImpl([], session=session)
+    download_manager = DownloadManagerImpl([stats], session=session)
+    buffer_manager = BufferManagerImpl()
+    mpd_provider = MPDProviderImpl(DefaultMPDParser(), 0.05, mpd_download_manager)
+    stats.mpd_provider = mpd_provider
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [])
+    download_manager.add_listener(bandwidth_meter)
+    abr_controller = DashABRController(2, 4, bandwidth_meter, buffer_manager, mpd_provider)
+    scheduler = SchedulerImpl(5, 0.05, download_manager, bandwidth_meter, buffer_manager, abr_controller, [stats])
+    return DASHPlayer(0.05, min_rebuffer_duration=1, min_start_buffer_duration=2, buffer_manager=buffer_manager,
+                      mpd_provider=mpd_provider, scheduler=scheduler, listeners=[stats])
+
+
+@given("We have a local origin serving a static MPD file of 3 one-second segments")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = FleetOrigin()
+    context.args.download_managers = []
+
+
+@when("A fleet of 4 players plays it, with a duration of 0.5 seconds for every other player")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+
+    def build_player(session, params, stats):
+        player = build_fleet_player(session, params, stats)
+        context.args.download_managers += [player.mpd_provider.download_manager, player.scheduler.download_manager]
+        return player
+
+    async def run():
+        await context.args.origin.start()
+        try:
+            url = context.args.origin.base_url + "stream.mpd"
+            runner = FleetRunner(build_player, [(url, {}), (url, {"duration": 0.5})], 4, arrival_rate=50,
+                                 poisson=False, connection_limit=8)
+            context.args.runner = runner
+            context.args.results = await runner.run()
+        finally:
+            await context.args.origin.stop()
+
+    asyncio.run(run())
+    fd, context.args.results_path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    context.args.runner.write_results(context.args.results_path)
+
+
+@then("The players share the HTTP session of the fleet")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    sessions = {id(download_manager._session) for download_manager in context.args.download_managers}
+    assert len(context.args.download_managers) == 8
+    assert len(sessions) == 1
+    assert context.args.download_managers[0]._session.closed
+
+
+@then("The players without a duration play to the end and the others are stopped")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    results = context.args.results
+    assert [fleet_session.id for fleet_session in results] == [0, 1, 2, 3]
+    for fleet_session in results:
+        stats = fleet_session.stats
+        assert fleet_session.error is None
+        if fleet_session.id % 2 == 0:
+            assert not fleet_session.timed_out
+            assert stats.state == State.END
+            # The initialization segment and the 3 segments
+            assert stats.bytes_downloaded == 4 * SEGMENT_SIZE
+            assert stats.segments_downloaded == 3
+            assert stats.average_bitrate == BANDWIDTH
+            assert stats.startup_delay is not None and stats.end_time - stats.start_time >= 3
+        else:
+            assert fleet_session.timed_out
+            assert stats.state != State.END
+            assert stats.end_time - stats.start_time < 1
+    # The players arrived at a constant interval
+    starts = [fleet_session.stats.start_time for fleet_session in results]
+    assert all(0.015 <= b - a < 0.1 for a, b in zip(starts, starts[1:])), starts
+    summary = context.args.runner.summary()
+    assert summary["sessions"] == 4 and summary["ended"] == 2 and summary["timed_out"] == 2
+    assert summary["errors"] == 0
+
+
+@then("The results of every session are written")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    with open(context.args.results_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    os.remove(context.args.results_path)
+    assert [row["session"] for row in rows] == ["0", "1", "2", "3"]
+    assert [row["state"] for row in rows[::2]] == ["END", "END"]
+    assert [row["timed_out"] for row in rows] == ["False", "True", "False", "True"]
+    assert rows[0]["bytes"] == str(4 * SEGMENT_SIZE)
+
+
+@given("We have a local origin serving a static MPD file of 3 one-second segments in a thread")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = FleetOrigin()
+    context.args.loop = asyncio.new_event_loop()
+    context.args.thread = threading.Thread(target=context.args.loop.run_forever, daemon=True)
+    context.args.thread.start()
+    asyncio.run_coroutine_threadsafe(context.args.origin.start(), context.args.loop).result()
+
+
+@when("A fleet of 6 players plays it in 2 worker processes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    url = context.args.origin.base_url + "stream.mpd"
+    # The builder is defined in the steps, the workers are forked to inherit it
+    runner = ShardedFleetRunner(build_fleet_player, [(url, {})], 6, num_workers=2, arrival_rate=20, seed=1,
+                                publish_interval=0.1, mp_context=multiprocessing.get_context("fork"))
+    context.args.runner = runner
+    context.args.reports = []
+    try:
+        context.args.counters = runner.run(report_interval=0.2, on_report=context.args.reports.append)
+    finally:
+        asyncio.run_coroutine_threadsafe(context.args.origin.stop(), context.args.loop).result()
+        context.args.loop.call_soon_threadsafe(context.args.loop.stop)
+        context.args.thread.join()
+
+
+@then("The parent sees the live counters of the sessions in shared memory")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    reports = context.args.reports
+    assert len(reports) >= 10
+    assert any(report["running"] > 0 and report["playing"] > 0 for report in reports)
+    assert any(report["mean_bitrate"] == BANDWIDTH for report in reports)
+    assert all(sum(report[name] for name in ("pending", "running", "ended", "timed_out", "failed")) == 6
+               for report in reports)
+    assert reports[-1]["ended"] == 6
+    assert reports[-1]["bytes"] == 6 * 4 * SEGMENT_SIZE
+
+
+@then("The final counters of every session are published")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    counters = context.args.counters
+    assert counters.shape[0] == 6
+    assert all(counters[:, STATUS] == STATUS_ENDED)
+    assert all(counters[:, STATE] == State.END.value)
+    assert all(counters[:, BYTES] == 4 * SEGMENT_SIZE)
+    assert all(counters[:, SEGMENTS] == 3)
+    assert all(counters[:, BITRATE] == BANDWIDTH)
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    context.args.runner.write_results(path)
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    os.remove(path)
+    assert [row["status"] for row in rows] == ["ended"] * 6
@@ -1,9 +1,14 @@
 import asyncio
+import tempfile
+import time
 from types import SimpleNamespace
 
+from aiohttp import web
 from behave import *
 
-from dash_emulator.download import DownloadManagerImpl, DownloadEventListener
+from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.download import DownloadManagerImpl, DownloadEventListener, ReceiveBuffer
+from dash_emulator.rate_limit import TokenBucket
 
 use_step_matcher("re")
 
@@ -74,3 +79,472 @@ def step_impl(context):
         assert context.args.download_manager.is_busy is False
 
     asyncio.run(run())
+
+
+class LocalOrigin(object):
+    """
+    A local HTTP server streaming chunks of zeros slowly
+    """
+
+    def __init__(self, chunk_size=10000, num_chunks=10, chunk_interval=0.02):
+        self.chunk_size = chunk_size
+        self.num_chunks = num_chunks
+        self.chunk_interval = chunk_interval
+        self.runner = None
+        self.base_url = None
+
+    async def handle(self, request):
+        response = web.StreamResponse()
+        response.content_length = self.chunk_size * self.num_chunks
+        await response.prepare(request)
+        try:
+            for _ in range(self.num_chunks):
+                await asyncio.sleep(self.chunk_interval)
+                await response.write(bytes(self.chunk_size))
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client canceled the request
+            pass
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{name}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = "http://127.0.0.1:%d/" % port
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class AccountingListener(DownloadEventListener):
+    def __init__(self):
+        self.ended = {}
+        self.canceled = {}
+        self.views = []
+
+    async def on_transfer_start(self, url) -> None:
+        pass
+
+    async def on_transfer_end(self, size: int, url: str) -> None:
+        self.ended[url] = size
+
+    async def on_bytes_transferred(self, length: int, url: str, position: int, size: int, content) -> None:
+        self.views.append(content)
+
+    async def on_transfer_canceled(self, url: str, position: int, size: int) -> None:
+        self.canceled[url] = (position, size)
+
+
+@given("We have an HTTP download manager and a local slow origin")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = LocalOrigin()
+    context.args.listener = AccountingListener()
+    context.args.download_manager = DownloadManagerImpl([context.args.listener], False, 1024)
+
+
+@when("Three downloads are submitted and the second one is canceled")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LocalOrigin = context.args.origin
+    download_manager: DownloadManagerImpl = context.args.download_manager
+
+    async def run():
+        await origin.start()
+        try:
+            handles = [download_manager.submit(origin.base_url + name, save=True) for name in "abc"]
+            await asyncio.sleep(0.07)
+            context.args.busy = download_manager.is_busy
+            await download_manager.cancel(handles[1])
+            context.args.contents = [await handle.wait() for handle in handles]
+            context.args.handles = handles
+            context.args.busy_after = download_manager.is_busy
+        finally:
+            await download_manager.close()
+            await origin.stop()
+
+    asyncio.run(run())
+
+
+@then("The other downloads complete with their own accounting")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    size = context.args.origin.chunk_size * context.args.origin.num_chunks
+    handles = context.args.handles
+    listener: AccountingListener = context.args.listener
+    assert context.args.busy is True
+    assert context.args.busy_after is False
+    assert len(context.args.contents[0]) == size and len(context.args.contents[2]) == size
+    assert handles[0].position == size and handles[2].position == size
+    assert 0 < handles[1].position < size
+    assert set(listener.ended.keys()) == {handles[0].url, handles[2].url}
+    assert listener.canceled == {handles[1].url: (handles[1].position, size)}
+
+
+@when("One download is saved")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LocalOrigin = context.args.origin
+    download_manager: DownloadManagerImpl = context.args.download_manager
+
+    async def run():
+        await origin.start()
+        try:
+            context.args.content = await download_manager.download(origin.base_url + "a", save=True)
+        finally:
+            await download_manager.close()
+            await origin.stop()
+
+    asyncio.run(run())
+
+
+@then("The content is returned in the preallocated buffer and listeners get read-only views")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    size = context.args.origin.chunk_size * context.args.origin.num_chunks
+    views = context.args.listener.views
+    assert isinstance(context.args.content, bytearray)
+    assert len(context.args.content) == size
+    assert sum(len(view) for view in views) == size
+    assert all(isinstance(view, memoryview) and view.readonly for view in views)
+    # The views point into the returned buffer
+    assert views[0].obj is context.args.content
+
+
+@given("We have receive buffers expecting no size, 10 bytes, 50 bytes and 100 bytes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.buffers = [ReceiveBuffer(None), ReceiveBuffer(10), ReceiveBuffer(50), ReceiveBuffer(100)]
+
+
+@when("50 bytes are received in each of them")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args.views = []
+    for buffer in context.args.buffers:
+        for i in range(5):
+            context.args.views.append(buffer.append(bytes([i]) * 10))
+
+
+@then("Each of them returns the 50 bytes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    expected = b"".join(bytes([i]) * 10 for i in range(5))
+    values = [buffer.getvalue() for buffer in context.args.buffers]
+    assert all(bytes(value) == expected for value in values)
+    assert all(view.readonly for view in context.args.views)
+    # Once the listeners release their views, the buffers don't hold the contents any more
+    for view in context.args.views:
+        view.release()
+    for value in values:
+        value.extend(b"!")
+
+
+@given("We have an HTTP download manager writing to a temporary folder in small batches")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = LocalOrigin()
+    context.args.folder = tempfile.TemporaryDirectory()
+    context.args.download_manager = DownloadManagerImpl([], write_to_disk=True,
+                                                        output_folder=context.args.folder.name)
+    context.args.download_manager.sink.batch_size = 15000
+    context.args.download_manager.sink.max_pending = 30000
+
+
+@when("Two downloads are submitted to the local slow origin")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LocalOrigin = context.args.origin
+    download_manager: DownloadManagerImpl = context.args.download_manager
+
+    async def run():
+        await origin.start()
+        try:
+            handles = [download_manager.submit(origin.base_url + name) for name in ("a", "b")]
+            for handle in handles:
+                await handle.wait()
+            context.args.urls = [handle.url for handle in handles]
+        finally:
+            await download_manager.close()
+            await origin.stop()
+
+    asyncio.run(run())
+
+
+@then("The files are written under the folder with all the bytes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    size = context.args.origin.chunk_size * context.args.origin.num_chunks
+    sink = context.args.download_manager.sink
+    try:
+        for url in context.args.urls:
+            path = sink.path_of(url)
+            assert str(path).startswith(context.args.folder.name)
+            assert path.read_bytes() == bytes(size)
+    finally:
+        context.args.folder.cleanup()
+
+
+@given("We have an HTTP download manager limited to 8 Mbps and a fast local origin")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = LocalOrigin(chunk_interval=0)
+    context.args.download_manager = DownloadManagerImpl([], rate_limiter=TokenBucket(8000000, burst=0))
+
+
+@when("Two downloads are submitted, the second one limited to 2 Mbps")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LocalOrigin = context.args.origin
+    download_manager: DownloadManagerImpl = context.args.download_manager
+
+    async def run():
+        await origin.start()
+        try:
+            start = time.time()
+            handles = [download_manager.submit(origin.base_url + "a"),
+                       download_manager.submit(origin.base_url + "b", rate=2000000)]
+            durations = []
+            for handle in handles:
+                await handle.wait()
+                durations.append(time.time() - start)
+            return durations
+        finally:
+            await download_manager.close()
+            await origin.stop()
+
+    context.args.durations = asyncio.run(run())
+
+
+@then("The first download takes about 0.2 seconds and the second one about 0.4 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    # 100 kB: the first download gets the 8 Mbps left by the second one, 6 Mbps, so it takes 0.13 s at least.
+    # The second one is held at 2 Mbps, after a burst of 0.05 s.
+    first, second = context.args.durations
+    assert 0.12 <= first < 0.3, first
+    assert 0.33 <= second < 0.6, second
+
+
+@given("We have an HTTP download manager coalescing 30000 bytes and a local slow origin")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = LocalOrigin(chunk_size=1000, num_chunks=100, chunk_interval=0.001)
+    context.args.listener = AccountingListener()
+    context.args.download_manager = DownloadManagerImpl([context.args.listener], coalesce_bytes=30000)
+
+
+@when("One download is saved and another one is not")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LocalOrigin = context.args.origin
+    download_manager: DownloadManagerImpl = context.args.download_manager
+
+    async def run():
+        await origin.start()
+        try:
+            saved = download_manager.submit(origin.base_url + "saved", save=True)
+            discarded = download_manager.submit(origin.base_url + "discarded")
+            context.args.content = await saved.wait()
+            await discarded.wait()
+        finally:
+            await download_manager.close()
+            await origin.stop()
+
+    asyncio.run(run())
+
+
+@then("The listeners get a few events with all the bytes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    listener: AccountingListener = context.args.listener
+    assert len(context.args.content) == 100000
+    assert len(listener.ended) == 2
+    # At least 30000 bytes in each event but the last one of each download
+    assert len(listener.views) <= 8, len(listener.views)
+    assert sum(len(view) for view in listener.views) == 200000
+    assert all(view.readonly for view in listener.views)
+
+
+@given("We have an HTTP download manager and a local origin which stalls for 2 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = LocalOrigin(num_chunks=1, chunk_interval=2)
+    context.args.listener = AccountingListener()
+    context.args.download_manager = DownloadManagerImpl([context.args.listener], False, 1024)
+
+
+@when("A download is submitted and canceled while its read is blocked")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LocalOrigin = context.args.origin
+    download_manager: DownloadManagerImpl = context.args.download_manager
+
+    async def run():
+        await origin.start()
+        try:
+            handle = download_manager.submit(origin.base_url + "a", save=True)
+            await asyncio.sleep(0.1)
+            start = time.time()
+            await download_manager.cancel(handle)
+            context.args.content = await handle.wait()
+            context.args.elapsed = time.time() - start
+            context.args.handle = handle
+            context.args.busy_after = download_manager.is_busy
+        finally:
+            await download_manager.close()
+            await origin.stop()
+
+    asyncio.run(run())
+
+
+@then("The download stops at once and the listeners get its cancellation")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    size = context.args.origin.chunk_size * context.args.origin.num_chunks
+    handle = context.args.handle
+    assert context.args.elapsed < 0.5
+    assert context.args.busy_after is False
+    assert handle.position == 0
+    assert len(context.args.content) == 0
+    assert context.args.listener.ended == {}
+    assert context.args.listener.canceled == {handle.url: (0, size)}
+
+
+@when("The task of a download is canceled while it transfers")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LocalOrigin = context.args.origin
+    download_manager: DownloadManagerImpl = context.args.download_manager
+    context.args.bandwidth_meter = BandwidthMeterImpl(1000000, 0, [])
+    download_manager.add_listener(context.args.bandwidth_meter)
+
+    async def run():
+        await origin.start()
+        try:
+            handle = download_manager.submit(origin.base_url + "a")
+            await asyncio.sleep(0.07)
+            handle.task.cancel()
+            try:
+                await handle.wait()
+            except asyncio.CancelledError:
+                context.args.raised = True
+            context.args.handle = handle
+            context.args.busy_after = download_manager.is_busy
+        finally:
+            await download_manager.close()
+            await origin.stop()
+
+    context.args.raised = False
+    asyncio.run(run())
+
+
+@then("The listeners get its cancellation and the bandwidth meter has no active transmission")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    size = context.args.origin.chunk_size * context.args.origin.num_chunks
+    handle = context.args.handle
+    assert context.args.raised is True
+    assert context.args.busy_after is False
+    assert 0 < handle.position < size
+    assert context.args.listener.canceled == {handle.url: (handle.position, size)}
+    assert context.args.bandwidth_meter.active_transmissions == 0
@@ -0,0 +1,338 @@
+import errno
+import os
+import tempfile
+from inspect import cleandoc
+from types import SimpleNamespace
+
+from behave import *
+
+from dash_emulator.models import MPD
+from dash_emulator.mpd.cache import MPDCache, CachingMPDParser
+from dash_emulator.mpd.parser import DefaultMPDParser, StreamingMPDParser
+
+use_step_matcher("re")
+
+URL = "http://127.0.0.1/videos/BBB/output.mpd"
+
+
+def generate_mpd(num_segments: int) -> str:
+    return cleandoc("""
+        <?xml version="1.0" encoding="utf-8"?>
+        <MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT%dS" minBufferTime="PT2.0S">
+            <Period id="0">
+                <AdaptationSet id="0" contentType="video" maxWidth="1280" maxHeight="720">
+                    <Representation id="0" mimeType="video/mp4" codecs="avc1" bandwidth="1000000" width="1280" height="720">
+                        <SegmentTemplate timescale="1000" initialization="init.m4s" media="$Number%%05d$.m4s" startNumber="1">
+                            <SegmentTimeline>
+                                <S t="0" d="2000" r="%d" />
+                            </SegmentTimeline>
+                        </SegmentTemplate>
+                    </Representation>
+                </AdaptationSet>
+            </Period>
+        </MPD>
+        """) % (num_segments * 2, num_segments - 1)
+
+
+def summarize(mpd: MPD):
+    """
+    All the parsed values of an MPD object
+    """
+    return (mpd.type, mpd.url, mpd.media_presentation_duration, mpd.min_buffer_time,
+            [(adaptation_set.id, adaptation_set.max_width,
+              [(representation.id, representation.bandwidth, representation.initialization,
+                [(segment.url, segment.duration) for segment in representation.segments])
+               for representation in adaptation_set.representations.values()])
+             for adaptation_set in mpd.adaptation_sets.values()])
+
+
+class CountingMPDParser(DefaultMPDParser):
+    def __init__(self):
+        self.num_parsed = 0
+
+    def parse(self, content: str, url: str) -> MPD:
+        self.num_parsed += 1
+        return super().parse(content, url)
+
+
+class FullMPDCache(MPDCache):
+    def put(self, key: str, mpd: MPD) -> None:
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+
+@given("We have a caching MPD parser on a temporary folder")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.folder = tempfile.TemporaryDirectory()
+    context.args.inner_parser = CountingMPDParser()
+    context.args.parser = CachingMPDParser(context.args.inner_parser, MPDCache(context.args.folder.name))
+    context.args.content = generate_mpd(100)
+
+
+@when("The same MPD file is parsed twice, then by another caching parser on the same folder")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    parser: CachingMPDParser = context.args.parser
+    context.args.mpds = [parser.parse(context.args.content, URL), parser.parse(context.args.content, URL)]
+    # Like another process sharing the cache
+    other_parser = CachingMPDParser(context.args.inner_parser, MPDCache(context.args.folder.name))
+    context.args.mpds.append(other_parser.parse(context.args.content, URL))
+
+
+@then("It is parsed only once and the cached MPD objects are equal to the parsed one")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    try:
+        assert context.args.inner_parser.num_parsed == 1
+        first, second, third = context.args.mpds
+        assert summarize(first) == summarize(second) == summarize(third)
+        assert len(second.adaptation_sets[0].representations[0].segments) == 100
+        assert second.content == third.content == first.content
+        assert second is not first
+    finally:
+        context.args.folder.cleanup()
+
+
+@given("We have an MPD cache holding about 2 entries")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.folder = tempfile.TemporaryDirectory()
+    parser = DefaultMPDParser()
+    context.args.mpds = [parser.parse(generate_mpd(1000 + i), URL) for i in range(3)]
+    probe = MPDCache(context.args.folder.name)
+    probe.put("probe", context.args.mpds[0])
+    entry_size = probe.path_of("probe").stat().st_size
+    probe.path_of("probe").unlink()
+    context.args.cache = MPDCache(context.args.folder.name, max_size=int(entry_size * 2.5))
+
+
+@when("3 entries are stored, the first one being read before the third one is stored")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    cache: MPDCache = context.args.cache
+    mpds = context.args.mpds
+    cache.put("first", mpds[0])
+    cache.put("second", mpds[1])
+    # Make the first entry the oldest one, until it is read
+    for name, age in (("first", 20), ("second", 10)):
+        stat = cache.path_of(name).stat()
+        os.utime(cache.path_of(name), (stat.st_atime - age, stat.st_mtime - age))
+    assert cache.get("first") is not None
+    cache.put("third", mpds[2])
+
+
+@then("The second entry is evicted")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    cache: MPDCache = context.args.cache
+    try:
+        assert cache.get("second") is None
+        assert len(cache.get("first").adaptation_sets[0].representations[0].segments) == 1000
+        assert len(cache.get("third").adaptation_sets[0].representations[0].segments) == 1002
+    finally:
+        context.args.folder.cleanup()
+
+
+@when("The MPD file is parsed, its entry is corrupted, and it is parsed again")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    parser: CachingMPDParser = context.args.parser
+    parser.parse(context.args.content, URL)
+    key = parser.cache.key(context.args.content, URL, context.args.inner_parser.cache_key)
+    parser.cache.path_of(key).write_bytes(b"not a cache entry")
+    context.args.mpd = parser.parse(context.args.content, URL)
+    context.args.key = key
+
+
+@then("It is parsed twice and the corrupted entry is replaced")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    parser: CachingMPDParser = context.args.parser
+    try:
+        assert context.args.inner_parser.num_parsed == 2
+        assert len(context.args.mpd.adaptation_sets[0].representations[0].segments) == 100
+        assert parser.cache.get(context.args.key) is not None
+    finally:
+        context.args.folder.cleanup()
+
+
+@given("We have a temporary folder")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.folder = tempfile.TemporaryDirectory()
+
+
+@when("An MPD cache is created in a new subfolder, and another one in a subfolder writable by other users")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args.new_folder = os.path.join(context.args.folder.name, "new", "cache")
+    MPDCache(context.args.new_folder)
+    shared_folder = os.path.join(context.args.folder.name, "shared")
+    os.mkdir(shared_folder)
+    os.chmod(shared_folder, 0o777)
+    context.args.error = None
+    try:
+        MPDCache(shared_folder)
+    except PermissionError as e:
+        context.args.error = e
+
+
+@then("The new subfolder is only accessible by the user and the shared subfolder is refused")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    try:
+        assert os.stat(context.args.new_folder).st_mode & 0o777 == 0o700
+        assert isinstance(context.args.error, PermissionError), context.args.error
+    finally:
+        context.args.folder.cleanup()
+
+
+@given("We have a caching MPD parser on a full disk")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.folder = tempfile.TemporaryDirectory()
+    context.args.inner_parser = CountingMPDParser()
+    context.args.parser = CachingMPDParser(context.args.inner_parser, FullMPDCache(context.args.folder.name))
+    context.args.content = generate_mpd(100)
+
+
+@when("The MPD file is parsed twice")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    parser: CachingMPDParser = context.args.parser
+    context.args.mpds = [parser.parse(context.args.content, URL), parser.parse(context.args.content, URL)]
+
+
+@then("It is parsed twice and the parsed MPD objects are returned")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    try:
+        assert context.args.inner_parser.num_parsed == 2
+        expected = DefaultMPDParser().parse(context.args.content, URL)
+        for mpd in context.args.mpds:
+            assert summarize(mpd) == summarize(expected)
+            assert mpd.content == expected.content
+    finally:
+        context.args.folder.cleanup()
+
+
+@when("The MPD file is parsed by streaming parsers keeping and dropping the content, sharing the cache folder")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    folder = context.args.folder.name
+    context.args.mpds = [CachingMPDParser(StreamingMPDParser(keep_content), MPDCache(folder)).parse(
+        context.args.content, URL) for keep_content in (True, False, True, False)]
+
+
+@then("Each parser gets the content only if it keeps it")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    try:
+        assert [mpd.content for mpd in context.args.mpds] == [context.args.content, None] * 2
+        assert len(list(MPDCache(context.args.folder.name).folder.glob("*" + MPDCache.suffix))) == 2
+    finally:
+        context.args.folder.cleanup()
+
+
+@when("10 entries smaller than the cache are stored")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    cache = MPDCache(context.args.folder.name, scan_interval=8)
+    mpd = DefaultMPDParser().parse(generate_mpd(10), URL)
+    context.args.scans = 0
+    evict = cache.evict
+
+    def counting_evict():
+        context.args.scans += 1
+        evict()
+
+    cache.evict = counting_evict
+    for i in range(10):
+        cache.put("entry-%d" % i, mpd)
+    context.args.cache = cache
+
+
+@then("The folder is scanned at the first write and after 8 writes only")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    try:
+        assert context.args.scans == 2
+        assert all(context.args.cache.get("entry-%d" % i) is not None for i in range(10))
+    finally:
+        context.args.folder.cleanup()
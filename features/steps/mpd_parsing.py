@@ -3,8 +3,8 @@ from xml.etree import ElementTree
 
 from behave import *
 
-from dash_emulator.models import MPD
-from dash_emulator.mpd.parser import MPDParser, DefaultMPDParser
+from dash_emulator.models import MPD, AdaptationSet, SegmentTimeline
+from dash_emulator.mpd.parser import MPDParser, DefaultMPDParser, StreamingMPDParser
 
 use_step_matcher("re")
 
@@ -79,6 +79,81 @@ def step_impl(context):
     assert representation.segments[18].duration == 29.0 / 30
 
 
+
+def summarize(mpd: MPD):
+    """
+    All the parsed values of an MPD object
+    """
+    return (mpd.type, mpd.url, mpd.media_presentation_duration, mpd.max_segment_duration, mpd.min_buffer_time,
+            [(adaptation_set.id, adaptation_set.content_type, adaptation_set.frame_rate, adaptation_set.max_width,
+              adaptation_set.max_height, adaptation_set.par,
+              [(representation.id, representation.mime_type, representation.codecs, representation.bandwidth,
+                representation.width, representation.height, representation.initialization,
+                [(segment.url, segment.duration) for segment in representation.segments])
+               for representation in adaptation_set.representations.values()])
+             for adaptation_set in mpd.adaptation_sets.values()])
+
+
+@when("The MPD file is parsed by the default parser and by the streaming parser without the content")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.default_mpd = DefaultMPDParser().parse(context.mpd_content, context.url)
+    context.streaming_mpd = StreamingMPDParser(keep_content=False).parse(context.mpd_content, context.url)
+
+
+@then("Both parsers give the same MPD and the streaming parser doesn't keep the content")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    assert summarize(context.default_mpd) == summarize(context.streaming_mpd)
+    assert context.streaming_mpd.content is None
+
+
+@given("We have an MPD file content with a prefixed namespace and two periods")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.mpd_content = cleandoc(mpd_content_with_two_periods)
+    context.url = "http://127.0.0.1/videos/BBB/output.mpd"
+
+
+@when("The MPD file is parsed by the streaming parser")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.streaming_mpd = StreamingMPDParser().parse(context.mpd_content, context.url)
+
+
+@then("Only the adaptation sets of the first period are parsed")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    mpd: MPD = context.streaming_mpd
+    assert mpd.content == context.mpd_content
+    assert mpd.type == "dynamic"
+    assert list(mpd.adaptation_sets.keys()) == [1]
+    representation = mpd.adaptation_sets[1].representations[0]
+    assert representation.initialization == "http://127.0.0.1/videos/BBB/audio-init-0.m4s"
+    assert [segment.url for segment in representation.segments] == [
+        "http://127.0.0.1/videos/BBB/audio-0-1.m4s", "http://127.0.0.1/videos/BBB/audio-0-2.m4s"]
+
+
 mpd_content_using_segment_template = """
     <?xml version="1.0" encoding="utf-8"?>
     <MPD xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
@@ -229,3 +304,147 @@ adaptation_content_using_segment_template = """
         </AdaptationSet>
 
 """
+
+
+@given(r"We have a representation of 24 hours of 2-second segments with a \$Number\$ and \$Time\$ template")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.tree = ElementTree.fromstring(long_representation_content_using_segment_timeline)
+    context.url = "http://127.0.0.1/videos/live/"
+
+
+@when("The representation is parsed")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.representation = DefaultMPDParser().parse_representation(context.tree, context.url)
+
+
+@then("The segments are built on demand with the right URLs and durations")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    segments = context.representation.segments
+    assert isinstance(segments, SegmentTimeline)
+    # 43199 2-second segments, a 1-second one, then 2 segments starting after a gap
+    assert len(segments) == 43202
+    assert segments[0].url == "http://127.0.0.1/videos/live/video1/10-0.m4s"
+    assert segments[0].duration == 2.0
+    assert segments[43198].url == "http://127.0.0.1/videos/live/video1/43208-86396000.m4s"
+    assert segments[43199].url == "http://127.0.0.1/videos/live/video1/43209-86398000.m4s"
+    assert segments[43199].duration == 1.0
+    assert segments[43200].url == "http://127.0.0.1/videos/live/video1/43210-86400000.m4s"
+    assert segments[-1].url == "http://127.0.0.1/videos/live/video1/43211-86402000.m4s"
+    assert [segment.url for segment in segments[-2:]] == [segments[43200].url, segments[43201].url]
+    assert sum(segment.duration for segment in segments) == 86403.0
+    try:
+        segments[43202]
+        assert False
+    except IndexError:
+        pass
+    # The segments are found by their URLs without building them
+    for index in (0, 43198, 43199, 43200, 43201):
+        assert segments.index_of(segments[index].url) == index
+    assert segments.index_of("http://127.0.0.1/videos/live/video1/43209-86396000.m4s") is None
+    assert segments.index_of("http://127.0.0.1/videos/live/video1/43212-86404000.m4s") is None
+    assert segments.index_of("http://127.0.0.1/videos/live/video2/10-0.m4s") is None
+    timeline = SegmentTimeline("http://127.0.0.1/videos/live/", "audio-$Time$.m4s", 1, 1000)
+    timeline.add_run(0, 2002, 3)
+    timeline.add_run(6006, 1968, 3)
+    assert [timeline.index_of(segment.url) for segment in timeline] == list(range(6))
+    assert timeline.index_of("http://127.0.0.1/videos/live/audio-2000.m4s") is None
+
+
+
+@given("We have a representation listing every segment of the same duration in its own S element")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.tree = ElementTree.fromstring(representation_content_with_one_segment_per_element)
+    context.url = "http://127.0.0.1/videos/live/"
+
+
+@then("The contiguous segments share one run and the model objects have no instance dictionaries")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    segments = context.representation.segments
+    # The 4 first segments make one run, the last one starts after a gap
+    assert len(segments) == 5
+    assert len(segments._ends) == 2
+    assert [segment.url for segment in segments] == [
+        "http://127.0.0.1/videos/live/video2/%d.m4s" % time for time in (0, 2000, 4000, 6000, 10000)]
+    assert [segment.duration for segment in segments] == [2.0] * 5
+    for model in (context.representation, segments, segments[0],
+                  MPD("", "", "static", 0, 0, 0, {}), AdaptationSet(0, "video", "30", 0, 0, "16:9", {})):
+        assert not hasattr(model, "__dict__")
+
+long_representation_content_using_segment_timeline = """
+            <Representation id="1" mimeType="video/mp4" codecs="avc1.64001f" bandwidth="3000000" width="1280" height="720">
+                <SegmentTemplate timescale="1000" initialization="video$RepresentationID$/init.mp4" media="video$RepresentationID$/$Number$-$Time$.m4s" startNumber="10">
+                    <SegmentTimeline>
+                        <S t="0" d="2000" r="43198" />
+                        <S d="1000" />
+                        <S t="86400000" d="2000" r="1" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>
+"""
+
+mpd_content_with_two_periods = """
+    <?xml version="1.0" encoding="utf-8"?>
+    <dash:MPD xmlns:dash="urn:mpeg:dash:schema:mpd:2011" type="dynamic" minBufferTime="PT2.0S">
+        <dash:Period id="0">
+            <dash:AdaptationSet id="1" contentType="audio">
+                <dash:Representation id="0" mimeType="audio/mp4" codecs="mp4a.40.2" bandwidth="128000" width="0" height="0">
+                    <dash:SegmentTemplate timescale="48000" initialization="audio-init-$RepresentationID$.m4s" media="audio-$RepresentationID$-$Number$.m4s" startNumber="1">
+                        <dash:SegmentTimeline>
+                            <dash:S t="0" d="96000" r="1" />
+                        </dash:SegmentTimeline>
+                    </dash:SegmentTemplate>
+                </dash:Representation>
+            </dash:AdaptationSet>
+        </dash:Period>
+        <dash:Period id="1">
+            <dash:AdaptationSet id="2" contentType="audio">
+                <dash:Representation id="0" mimeType="audio/mp4" codecs="mp4a.40.2" bandwidth="128000" width="0" height="0">
+                    <dash:SegmentTemplate timescale="48000" initialization="audio-init-$RepresentationID$.m4s" media="audio-$RepresentationID$-$Number$.m4s" startNumber="3">
+                        <dash:SegmentTimeline>
+                            <dash:S t="96000" d="96000" />
+                        </dash:SegmentTimeline>
+                    </dash:SegmentTemplate>
+                </dash:Representation>
+            </dash:AdaptationSet>
+        </dash:Period>
+    </dash:MPD>
+    """
+
+representation_content_with_one_segment_per_element = """
+            <Representation id="2" mimeType="video/mp4" codecs="avc1.64001f" bandwidth="3000000" width="1280" height="720">
+                <SegmentTemplate timescale="1000" initialization="video$RepresentationID$/init.mp4" media="video$RepresentationID$/$Time$.m4s" startNumber="1">
+                    <SegmentTimeline>
+                        <S t="0" d="2000" />
+                        <S d="2000" />
+                        <S t="4000" d="2000" />
+                        <S d="2000" />
+                        <S t="10000" d="2000" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>
+"""
@@ -0,0 +1,412 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from inspect import cleandoc
+from types import SimpleNamespace
+
+from aiohttp import web
+from behave import *
+
+from dash_emulator.download import DownloadManagerImpl
+from dash_emulator.models import SegmentTimeline, MPD
+from dash_emulator.mpd.parser import DefaultMPDParser
+from dash_emulator.mpd.providers import MPDProviderImpl, MPDDownloadException
+from dash_emulator.origin import SyntheticOrigin
+from dash_emulator.trace_download import TraceDownloadManager
+from dash_emulator.traces import ThroughputTrace
+
+use_step_matcher("re")
+
+
+@given("We have a timeline of 5 segments of 2 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.timeline = SegmentTimeline("http://127.0.0.1/live/", "$Number$.m4s", 1, 1000)
+    context.args.timeline.add_run(0, 2000, 5)
+
+
+@when("A newer timeline without the first 3 segments, with the 5th segment longer and 4 new segments, is merged")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    # In another timescale, to check the conversion
+    newer = SegmentTimeline("http://127.0.0.1/live/", "$Number$.m4s", 4, 10000)
+    newer.add_run(60000, 20000, 1)
+    newer.add_run(80000, 30000, 2)
+    newer.add_run(140000, 20000, 3)
+    context.args.num_appended = context.args.timeline.extend(newer)
+
+
+@then("The timeline keeps its first 5 segments and gets the 4 new ones")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    timeline: SegmentTimeline = context.args.timeline
+    assert context.args.num_appended == 4
+    assert len(timeline) == 9
+    assert [segment.url for segment in timeline] == ["http://127.0.0.1/live/%d.m4s" % i for i in range(1, 10)]
+    assert [segment.duration for segment in timeline] == [2.0] * 5 + [3.0, 2.0, 2.0, 2.0]
+
+
+def live_mpd(num_segments: int) -> str:
+    return cleandoc("""
+        <?xml version="1.0" encoding="utf-8"?>
+        <MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="dynamic" minimumUpdatePeriod="PT0.05S" minBufferTime="PT2.0S">
+            <Period id="0">
+                <AdaptationSet id="0" contentType="video">
+                    <Representation id="0" mimeType="video/mp4" codecs="avc1" bandwidth="1000000" width="1280" height="720">
+                        <SegmentTemplate timescale="1000" initialization="init.m4s" media="$Number$.m4s" startNumber="1">
+                            <SegmentTimeline>
+                                <S t="0" d="2000" r="%d" />
+                            </SegmentTimeline>
+                        </SegmentTemplate>
+                    </Representation>
+                </AdaptationSet>
+            </Period>
+        </MPD>
+        """) % (num_segments - 1)
+
+
+class LiveOrigin(object):
+    """
+    A local HTTP server of an MPD file supporting conditional requests,
+    answering with an error from the request after fail_after if it is given,
+    or dropping the connection instead if disconnect is True
+    """
+
+    def __init__(self, change_after: int, fail_after: int = None, disconnect: bool = False):
+        self.change_after = change_after
+        self.fail_after = fail_after
+        self.disconnect = disconnect
+        self.requests = 0
+        self.not_modified = 0
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.fail_after is not None and self.requests > self.fail_after:
+            if self.disconnect:
+                request.transport.close()
+                return web.Response()
+            return web.Response(status=503, text="Service Unavailable", headers={"ETag": '"error"'})
+        version = 1 if self.requests <= self.change_after else 2
+        etag = '"v%d"' % version
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=live_mpd(3 if version == 1 else 5), headers={"ETag": etag})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/live/manifest.mpd", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = "http://127.0.0.1:%d/live/manifest.mpd" % self.runner.addresses[0][1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class CountingMPDParser(DefaultMPDParser):
+    def __init__(self):
+        self.num_parsed = 0
+
+    def parse(self, content: str, url: str) -> MPD:
+        self.num_parsed += 1
+        return super().parse(content, url)
+
+
+@given("We have a local live origin whose MPD file changes after 3 requests")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = LiveOrigin(change_after=3)
+    context.args.parser = CountingMPDParser()
+    # The update interval is overridden by the minimumUpdatePeriod of the MPD file
+    context.args.provider = MPDProviderImpl(context.args.parser, 10, DownloadManagerImpl([]))
+
+
+@when("An MPD provider follows the MPD file for 0.5 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LiveOrigin = context.args.origin
+    provider: MPDProviderImpl = context.args.provider
+
+    async def run():
+        await origin.start()
+        try:
+            await provider.start(origin.url)
+            context.args.first_mpd = provider.mpd
+            context.args.first_urls = [segment.url for segment in
+                                       provider.mpd.adaptation_sets[0].representations[0].segments]
+            await asyncio.sleep(0.5)
+        finally:
+            await provider.stop()
+            await origin.stop()
+
+    asyncio.run(run())
+
+
+@then("The MPD file is parsed only when it has changed and the new segments are appended")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LiveOrigin = context.args.origin
+    provider: MPDProviderImpl = context.args.provider
+    assert provider.refresh_interval == 0.05
+    # About 10 refreshes in 0.5 seconds
+    assert origin.requests >= 6, origin.requests
+    assert context.args.parser.num_parsed == 2
+    assert origin.not_modified == origin.requests - 2
+    assert provider.mpd is context.args.first_mpd
+    segments = provider.mpd.adaptation_sets[0].representations[0].segments
+    assert len(context.args.first_urls) == 3
+    assert [segment.url for segment in segments][:3] == context.args.first_urls
+    assert len(segments) == 5
+
+
+def large_mpd(num_segments: int) -> str:
+    timeline = "\n".join('<S t="%d" d="%d" />' % (i * 2000, 2000) for i in range(num_segments))
+    return cleandoc("""
+        <?xml version="1.0" encoding="utf-8"?>
+        <MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2.0S">
+            <Period id="0">
+                <AdaptationSet id="0" contentType="video">
+                    <Representation id="0" mimeType="video/mp4" codecs="avc1" bandwidth="1000000" width="1280" height="720">
+                        <SegmentTemplate timescale="1000" initialization="init.m4s" media="$Number$.m4s" startNumber="1">
+                            <SegmentTimeline>
+                            %s
+                            </SegmentTimeline>
+                        </SegmentTemplate>
+                    </Representation>
+                </AdaptationSet>
+            </Period>
+        </MPD>
+        """) % timeline
+
+
+@given("We have an MPD provider parsing in a process pool and a large MPD file on a synthetic origin")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.url = "http://127.0.0.1/vod/manifest.mpd"
+    origin = SyntheticOrigin()
+    origin.add_content(context.args.url, large_mpd(50000).encode("utf-8"))
+    download_manager = TraceDownloadManager([], ThroughputTrace.constant(1e12), origin)
+    context.args.executor = ProcessPoolExecutor(max_workers=1)
+    context.args.provider = MPDProviderImpl(DefaultMPDParser(), 1, download_manager,
+                                            parse_executor=context.args.executor)
+
+
+@when("The provider starts while a ticker measures the event loop lag")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    provider: MPDProviderImpl = context.args.provider
+
+    async def tick():
+        max_lag = 0
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+            context.args.max_lag = max_lag
+
+    async def run():
+        ticker = asyncio.create_task(tick())
+        try:
+            await provider.start(context.args.url)
+        finally:
+            ticker.cancel()
+            await provider.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        context.args.executor.shutdown()
+
+
+@then("The MPD file is parsed, and the event loop kept running during the parse")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    provider: MPDProviderImpl = context.args.provider
+    stats = provider.parse_stats
+    assert len(provider.mpd.adaptation_sets[0].representations[0].segments) == 50000
+    assert stats.num_parses == 1
+    assert stats.last_parse_time > 0
+    assert stats.lag_avoided == stats.last_parse_time
+    # The parse took much longer than the longest pause of the event loop
+    assert context.args.max_lag < stats.last_parse_time / 2, (context.args.max_lag, stats.last_parse_time)
+
+
+@given("We have a local live origin (?P<failure>answering with errors|dropping the connections) after "
+       "(?P<fail_after>\\d+) requests?")
+def step_impl(context, failure, fail_after):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    failure : str
+    fail_after : str
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = LiveOrigin(change_after=100, fail_after=int(fail_after),
+                                     disconnect=failure == "dropping the connections")
+    context.args.parser = CountingMPDParser()
+    context.args.provider = MPDProviderImpl(context.args.parser, 10, DownloadManagerImpl([]))
+
+
+@when("An MPD provider starts and follows the MPD file for 0.3 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LiveOrigin = context.args.origin
+    provider: MPDProviderImpl = context.args.provider
+    context.args.error = None
+
+    async def run():
+        await origin.start()
+        try:
+            await provider.start(origin.url)
+            context.args.first_mpd = provider.mpd
+            await asyncio.sleep(0.3)
+        except MPDDownloadException as e:
+            context.args.error = e
+        finally:
+            await provider.stop()
+            await origin.stop()
+
+    asyncio.run(run())
+
+
+@then("The provider keeps the MPD file and its validators through the failed refreshes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: LiveOrigin = context.args.origin
+    provider: MPDProviderImpl = context.args.provider
+    assert context.args.error is None
+    assert origin.requests >= 4, origin.requests
+    assert context.args.parser.num_parsed == 1
+    # The HTTP client sends a request again once when the connection drops
+    attempts = 2 if origin.disconnect else 1
+    assert provider.parse_stats.num_failed == (origin.requests - 1) // attempts
+    assert provider.mpd is context.args.first_mpd
+    assert provider.version == 1
+    assert provider._etag == '"v1"'
+    assert len(provider.mpd.adaptation_sets[0].representations[0].segments) == 3
+
+
+@then("The provider fails to start without parsing the error response")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    provider: MPDProviderImpl = context.args.provider
+    assert isinstance(context.args.error, MPDDownloadException), context.args.error
+    assert "503" in str(context.args.error)
+    assert context.args.parser.num_parsed == 0
+    assert provider.mpd is None
+    assert provider._etag is None
+
+
+@given("We have two MPD providers parsing in a thread pool, one owning it and one sharing another one")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.url = "http://127.0.0.1/vod/manifest.mpd"
+    origin = SyntheticOrigin()
+    origin.add_content(context.args.url, large_mpd(10).encode("utf-8"))
+    context.args.own_executor = ThreadPoolExecutor(max_workers=1)
+    context.args.shared_executor = ThreadPoolExecutor(max_workers=1)
+    context.args.owner = MPDProviderImpl(DefaultMPDParser(), 1,
+                                         TraceDownloadManager([], ThroughputTrace.constant(1e12), origin),
+                                         parse_executor=context.args.own_executor, shutdown_executor=True)
+    context.args.sharer = MPDProviderImpl(DefaultMPDParser(), 1,
+                                          TraceDownloadManager([], ThroughputTrace.constant(1e12), origin),
+                                          parse_executor=context.args.shared_executor)
+
+
+@when("Both providers start and stop")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+
+    async def run():
+        for provider in (context.args.owner, context.args.sharer):
+            await provider.start(context.args.url)
+            await provider.stop()
+
+    asyncio.run(run())
+
+
+@then("Only the executor owned by a provider is shut down, and the thread pool parses avoided no lag")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    for provider in (context.args.owner, context.args.sharer):
+        assert provider.parse_stats.num_parses == 1
+        assert provider.parse_stats.total_parse_time > 0
+        # The parsing thread still holds the interpreter lock
+        assert provider.parse_stats.lag_avoided == 0
+    try:
+        context.args.own_executor.submit(int)
+        assert False, "The executor owned by the provider is still running"
+    except RuntimeError:
+        pass
+    assert context.args.shared_executor.submit(int).result() == 0
+    context.args.shared_executor.shutdown()
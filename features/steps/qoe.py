@@ -0,0 +1,345 @@
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+from behave import *
+
+from dash_emulator.abr import DashABRController, ABRController
+from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.clock import VirtualClock
+from dash_emulator.event_recorder import EventRecorder, load_events, stalls, EVENT_STATE, EVENT_BUFFER_LEVEL, \
+    EVENT_SEGMENT_START
+from dash_emulator.models import State, AdaptationSet, Representation, Segment, MPD
+from dash_emulator.mpd.parser import DefaultMPDParser
+from dash_emulator.mpd import MPDProvider
+from dash_emulator.mpd.providers import MPDProviderImpl
+from dash_emulator.origin import SyntheticOrigin
+from dash_emulator.player import DASHPlayer
+from dash_emulator.qoe import P2Quantile, QoEMonitor
+from dash_emulator.scheduler import SchedulerImpl
+from dash_emulator.trace_download import TraceDownloadManager, TraceLink
+from dash_emulator.traces import ThroughputTrace
+
+use_step_matcher("re")
+
+MPD_URL = "http://origin.local/videos/monitored/output.mpd"
+
+BANDWIDTHS = [3000000, 1200000, 400000]
+
+
+def generate_mpd(num_segments: int, segment_duration: int) -> str:
+    representations = "".join("""
+            <Representation id="%d" mimeType="video/mp4" codecs="avc1" bandwidth="%d" width="1280" height="720">
+                <SegmentTemplate timescale="1000" initialization="init-$RepresentationID$.m4s"
+                    media="chunk-$RepresentationID$-$Number%%05d$.m4s" startNumber="1">
+                    <SegmentTimeline>
+                        <S t="0" d="%d" r="%d" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>""" % (i, bw, segment_duration * 1000, num_segments - 1)
+                              for i, bw in enumerate(BANDWIDTHS))
+    return """<?xml version="1.0" encoding="utf-8"?>
+    <MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT%dS"
+        maxSegmentDuration="PT%dS" minBufferTime="PT2S">
+        <Period id="0">
+            <AdaptationSet id="0" contentType="video" maxWidth="1280" maxHeight="720">%s
+            </AdaptationSet>
+        </Period>
+    </MPD>""" % (num_segments * segment_duration, segment_duration, representations)
+
+
+class FixedMPDProvider(MPDProvider):
+    def __init__(self, mpd):
+        self._mpd = mpd
+
+    @property
+    def mpd(self) -> MPD:
+        return self._mpd
+
+    async def start(self, mpd_url):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LowestABRController(ABRController):
+    def update_selection(self, adaptation_sets):
+        return {id_: min(adaptation_set.representations.keys()) for id_, adaptation_set in adaptation_sets.items()}
+
+
+@given("We have (?P<count>\\d+) values drawn from an exponential distribution")
+def step_impl(context, count):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    count : str
+    """
+    context.args = SimpleNamespace()
+    context.args.values = np.random.default_rng(0).exponential(5, int(count))
+
+
+@when("The values are added to streaming quantile estimators")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args.estimators = [P2Quantile(p) for p in (0.05, 0.5, 0.9, 0.99)]
+    for value in context.args.values.tolist():
+        for estimator in context.args.estimators:
+            estimator.add(value)
+
+
+@then("The estimates are within 1 percent of the exact quantiles")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    for estimator in context.args.estimators:
+        exact = np.quantile(context.args.values, estimator.p)
+        assert estimator.count == len(context.args.values)
+        assert abs(estimator.value - exact) <= 0.01 * exact
+
+
+def sample_buffer_levels(events, interval):
+    """
+    The buffer level every interval seconds from the first recorded level to the last event,
+    draining from the latest recorded level while the player is playing
+    """
+    levels = events[events["type"] == EVENT_BUFFER_LEVEL]
+    states = events[events["type"] == EVENT_STATE]
+    end_time = events["time"][-1]
+    # The cumulated playback time at each state change and at the end
+    times = np.append(states["time"], end_time)
+    played = np.concatenate([[0], np.cumsum(np.diff(times) * (states["b"] == State.READY.value))])
+    samples = levels["time"][0] + interval * np.arange(int(np.ceil((end_time - levels["time"][0]) / interval)))
+    latest = np.searchsorted(levels["time"], samples, side="right") - 1
+    drained = np.interp(samples, times, played) - np.interp(levels["time"][latest], times, played)
+    return np.maximum(levels["value"][latest] - drained, 0)
+
+
+@given("We have a player on a virtual clock monitored for QoE and recording its events")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.folder = tempfile.TemporaryDirectory()
+    context.args.path = os.path.join(context.args.folder.name, "events.bin")
+    context.args.clock = clock = VirtualClock()
+    origin = SyntheticOrigin()
+    origin.add_mpd_content(MPD_URL, generate_mpd(90, 2))
+    trace = ThroughputTrace([20, 20, 20, 20], [4000000, 500000, 1500000, 300000])
+
+    link = TraceLink(trace, clock)
+    buffer_manager = BufferManagerImpl()
+    mpd_provider = MPDProviderImpl(DefaultMPDParser(), 0.05, TraceDownloadManager([], link, origin, clock), clock=clock)
+    context.args.recorder = recorder = EventRecorder(context.args.path, clock)
+    context.args.monitor = monitor = QoEMonitor(clock, mpd_provider, buffer_quantiles=(0.1, 0.5, 0.9))
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([bandwidth_meter], link, origin, clock, 40960)
+    abr_controller = DashABRController(2, 4, bandwidth_meter, buffer_manager, mpd_provider)
+    scheduler = SchedulerImpl(5, 0.05, download_manager, bandwidth_meter, buffer_manager, abr_controller,
+                              [recorder, monitor], clock=clock)
+    context.args.player = DASHPlayer(0.05, min_rebuffer_duration=1, min_start_buffer_duration=2,
+                                     buffer_manager=buffer_manager, mpd_provider=mpd_provider, scheduler=scheduler,
+                                     listeners=[recorder, monitor], clock=clock)
+
+
+@when("The monitored session is played")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+    monitor: QoEMonitor = context.args.monitor
+    context.args.snapshots = snapshots = []
+
+    async def watch():
+        # Like a live dashboard
+        while True:
+            await clock.sleep(5)
+            snapshots.append(monitor.snapshot())
+
+    async def run():
+        watcher = asyncio.create_task(watch())
+        await context.args.player.start(MPD_URL)
+        watcher.cancel()
+
+    clock.run(run())
+    clock.close()
+    context.args.recorder.close()
+
+
+@then("The QoE snapshots match the metrics recomputed from the recorded events")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    monitor: QoEMonitor = context.args.monitor
+    snapshots = context.args.snapshots
+    snapshot = monitor.snapshot()
+    events = load_events(context.args.path)
+
+    states = events[events["type"] == EVENT_STATE]
+    assert snapshot["state"] == State.END.name
+    assert abs(snapshot["startup_delay"] - states["time"][0]) < 1e-9
+
+    start_times, durations, _ = stalls(events)
+    assert snapshot["num_stalls"] == len(start_times) > 0
+    assert abs(snapshot["stall_time"] - durations.sum()) < 1e-6
+
+    # The scheduler ends at the index after the last segment, which is not downloaded
+    starts = events[events["type"] == EVENT_SEGMENT_START][:-1]
+    bitrates = np.array(BANDWIDTHS)[starts["c"]]
+    assert abs(snapshot["average_bitrate"] - bitrates.mean()) < 1e-6
+    changes = np.flatnonzero(np.diff(starts["c"]) != 0)
+    assert snapshot["num_switches"] == len(changes) > 0
+    assert abs(snapshot["mean_switch_magnitude"] - np.abs(np.diff(bitrates))[changes].mean()) < 1e-6
+
+    buffer_levels = sample_buffer_levels(events, monitor.buffer_sample_interval)
+    spread = buffer_levels.max() - buffer_levels.min()
+    for p, value in snapshot["buffer_level_quantiles"].items():
+        assert abs(value - np.quantile(buffer_levels, p)) < 0.1 * spread
+    # The index after the last segment, which the scheduler starts before it ends, leaves nothing pending
+    assert not monitor._pending_segments
+
+    # The snapshots taken during the session never go back
+    assert len(snapshots) > 10
+    for previous, current in zip(snapshots, snapshots[1:]):
+        assert current["num_stalls"] >= previous["num_stalls"]
+        assert current["stall_time"] >= previous["stall_time"]
+        assert current["num_switches"] >= previous["num_switches"]
+    del events, states, starts, buffer_levels
+    context.args.folder.cleanup()
+
+
+@given("We have a scheduler with independent tracks monitored for QoE, the video track shorter than the audio one")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    origin = SyntheticOrigin()
+    adaptation_sets = {}
+    for id_, content_type, bandwidth, num_segments in [(0, "video", 1000000, 3), (1, "audio", 128000, 5)]:
+        segments = [Segment("http://origin.local/%s-%d.m4s" % (content_type, i), 2.0) for i in range(num_segments)]
+        init = "http://origin.local/%s-init.m4s" % content_type
+        representation = Representation(0, "%s/mp4" % content_type, "codec", bandwidth, 0, 0, init, segments)
+        adaptation_sets[id_] = AdaptationSet(id_, content_type, "30", 0, 0, "16:9", {0: representation})
+        origin.add_size(init, 1000)
+        for segment in segments:
+            origin.add_size(segment.url, 20000)
+    context.args.adaptation_sets = adaptation_sets
+    mpd_provider = FixedMPDProvider(MPD("", "", "static", 10, 2, 2, adaptation_sets))
+    context.args.monitor = monitor = QoEMonitor(clock, mpd_provider)
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([bandwidth_meter], ThroughputTrace.constant(8000000), origin, clock)
+    context.args.scheduler = SchedulerImpl(1000, 0.05, download_manager, bandwidth_meter, BufferManagerImpl(),
+                                           LowestABRController(), [monitor], clock=clock, independent_tracks=True)
+
+
+@when("The scheduler downloads all the monitored segments")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+    scheduler: SchedulerImpl = context.args.scheduler
+
+    async def run():
+        scheduler.start(context.args.adaptation_sets)
+        while not scheduler.is_end:
+            await clock.sleep(0.1)
+        await scheduler.stop()
+
+    clock.run(run())
+    clock.close()
+
+
+@then("The average bitrate counts the segments of every track with their own durations")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    monitor: QoEMonitor = context.args.monitor
+    # The video and audio segments of the indices 0 to 2, then the audio segments of the indices 3 and 4
+    expected = (3 * 2 * (1000000 + 128000) + 2 * 2 * 128000) / 10
+    assert abs(monitor.average_bitrate - expected) < 1e-6, monitor.average_bitrate
+    assert monitor.num_switches == 0
+    assert not monitor._pending_segments
+
+
+@given("We have QoE monitors of a buffer level staying at 1 second for 9 seconds, then at 10 seconds for 1 second")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    context.args.monitors = [QoEMonitor(clock, buffer_quantiles=(0.5, 0.95)) for _ in range(2)]
+
+
+@when("One monitor gets the buffer level every 10 ms and the other one only gets more reports at 10 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+    even, uneven = context.args.monitors
+
+    async def run():
+        # The monitors see a buffering player, whose buffer level doesn't drain
+        for monitor in (even, uneven):
+            await monitor.on_state_change(0, State.IDLE, State.BUFFERING)
+        await uneven.on_buffer_level_change(1)
+        for i in range(1000):
+            buffer_level = 1 if i < 900 else 10
+            await even.on_buffer_level_change(buffer_level)
+            if i >= 900:
+                await uneven.on_buffer_level_change(buffer_level)
+            await clock.sleep(0.01)
+        context.args.snapshots = [monitor.snapshot() for monitor in (even, uneven)]
+
+    clock.run(run())
+    clock.close()
+
+
+@then("Both monitors estimate the quantiles of the buffer level over time")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    # The buffer level is 1 second 90 percent of the time, whichever monitor got most of the reports
+    even, uneven = [snapshot["buffer_level_quantiles"] for snapshot in context.args.snapshots]
+    for quantiles in (even, uneven):
+        assert abs(quantiles[0.5] - 1) < 0.5, quantiles
+        assert quantiles[0.95] > 5, quantiles
+    assert abs(even[0.5] - uneven[0.5]) < 0.1 and abs(even[0.95] - uneven[0.95]) < 0.1, (even, uneven)
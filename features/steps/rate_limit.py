@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+
+from behave import *
+
+from dash_emulator.clock import VirtualClock
+from dash_emulator.rate_limit import TokenBucket, RateSchedule
+
+use_step_matcher("re")
+
+
+async def transfer(bucket: TokenBucket, num_chunks: int, chunk_bits: int) -> float:
+    """
+    Take the tokens of some chunks, and return the time when the last chunk is allowed
+    """
+    for _ in range(num_chunks):
+        await bucket.consume(chunk_bits)
+    return bucket.clock.time()
+
+
+@given("We have a token bucket of 80 kbps on a virtual clock")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = VirtualClock()
+    context.args.bucket = TokenBucket(80000, burst=0, clock=context.args.clock)
+
+
+@when("Two transfers take 100 chunks of 1000 bits each from the bucket")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+    bucket: TokenBucket = context.args.bucket
+
+    async def run():
+        start = clock.time()
+        ends = await asyncio.gather(transfer(bucket, 100, 1000), transfer(bucket, 100, 1000))
+        return [end - start for end in ends]
+
+    context.args.durations = clock.run(run())
+    clock.close()
+
+
+@then("Both transfers complete after 2.5 simulated seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    for duration in context.args.durations:
+        # Each chunk waits for its own tokens, so the transfers finish within one chunk of each other
+        assert abs(duration - 2.5) <= 1000 / 80000 + 1e-6, duration
+
+
+@given('We have a token bucket following the schedule "0:40000,1:80000" on a virtual clock')
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = VirtualClock()
+    context.args.bucket = TokenBucket(None, burst=0, clock=context.args.clock,
+                                      schedule=RateSchedule.parse("0:40000,1:80000"))
+
+
+@when("One transfer takes 120 chunks of 1000 bits from the bucket")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+    bucket: TokenBucket = context.args.bucket
+
+    async def run():
+        start = clock.time()
+        end = await transfer(bucket, 120, 1000)
+        return end - start
+
+    context.args.duration = clock.run(run())
+    clock.close()
+
+
+@then("It completes after 2 simulated seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    # 40 kbits in the first second, then 80 kbits at 80 kbps
+    assert abs(context.args.duration - 2) <= 1000 / 40000 + 1e-6, context.args.duration
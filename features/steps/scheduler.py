@@ -0,0 +1,416 @@
+from types import SimpleNamespace
+
+from behave import *
+
+from dash_emulator.abr import ABRController
+from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.clock import VirtualClock
+from dash_emulator.download import DownloadEventListener
+from dash_emulator.models import AdaptationSet, Representation, Segment
+from dash_emulator.origin import SyntheticOrigin
+from dash_emulator.scheduler import SchedulerImpl, SchedulerEventListener
+from dash_emulator.trace_download import TraceDownloadManager
+from dash_emulator.traces import ThroughputTrace
+
+use_step_matcher("re")
+
+BASE_URL = "http://origin.local/"
+
+
+class LowestABRController(ABRController):
+    def update_selection(self, adaptation_sets):
+        return {id_: min(adaptation_set.representations.keys()) for id_, adaptation_set in adaptation_sets.items()}
+
+
+class SwitchingABRController(ABRController):
+    def __init__(self, switch_after):
+        self.switch_after = switch_after
+        self.calls = 0
+
+    def update_selection(self, adaptation_sets):
+        self.calls += 1
+        representation_id = 1 if self.calls <= self.switch_after else 0
+        return {id_: representation_id for id_ in adaptation_sets.keys()}
+
+
+class TrackABRController(LowestABRController):
+    def __init__(self):
+        self.track_calls = []
+
+    def update_selection(self, adaptation_sets):
+        raise AssertionError("The independent tracks select their representations separately")
+
+    def update_track_selection(self, adaptation_sets, adaptation_set_id):
+        self.track_calls.append(adaptation_set_id)
+        return min(adaptation_sets[adaptation_set_id].representations.keys())
+
+
+class ConcurrencyListener(DownloadEventListener, SchedulerEventListener):
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.events = []
+
+    async def on_transfer_start(self, url) -> None:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.events.append(("start", url))
+
+    async def on_transfer_end(self, size: int, url: str) -> None:
+        self.running -= 1
+        self.events.append(("end", url))
+
+    async def on_bytes_transferred(self, length: int, url: str, position: int, size: int, content) -> None:
+        pass
+
+    async def on_transfer_canceled(self, url: str, position: int, size: int) -> None:
+        self.running -= 1
+        self.events.append(("canceled", url))
+
+    async def on_segment_download_start(self, index, selections):
+        self.events.append(("segment_start", index))
+
+    async def on_segment_download_complete(self, index):
+        self.events.append(("segment_complete", index, self.running))
+
+
+class TimingListener(SchedulerEventListener):
+    def __init__(self, clock):
+        self.clock = clock
+        self.starts = []
+
+    async def on_segment_download_start(self, index, selections):
+        self.starts.append((self.clock.time(), index))
+
+    async def on_segment_download_complete(self, index):
+        pass
+
+
+def build_origin(adaptation_sets, segment_sizes):
+    origin = SyntheticOrigin()
+    for id_, adaptation_set in adaptation_sets.items():
+        for representation in adaptation_set.representations.values():
+            origin.add_size(representation.initialization, 1000)
+            for segment in representation.segments:
+                origin.add_size(segment.url, segment_sizes[id_])
+    return origin
+
+
+def build_adaptation_sets(num_segments, num_representations=1):
+    adaptation_sets = {}
+    for id_, content_type, bandwidth in [(0, "video", 1000000), (1, "audio", 128000)]:
+        representations = {}
+        for representation_id in range(num_representations):
+            segments = [Segment("%s%s-%d-%d.m4s" % (BASE_URL, content_type, representation_id, i), 2.0)
+                        for i in range(num_segments)]
+            representations[representation_id] = Representation(
+                representation_id, "%s/mp4" % content_type, "codec", bandwidth // (representation_id + 1), 0, 0,
+                "%s%s-%d-init.m4s" % (BASE_URL, content_type, representation_id), segments)
+        adaptation_sets[id_] = AdaptationSet(id_, content_type, "30", 0, 0, "16:9", representations)
+    return adaptation_sets
+
+
+@given("We have a scheduler for a video and an audio adaptation set allowing (?P<limit>\\d+) concurrent downloads")
+def step_impl(context, limit):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    limit : str
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    context.args.adaptation_sets = build_adaptation_sets(5)
+    origin = build_origin(context.args.adaptation_sets, {0: 100000, 1: 100000})
+    context.args.listener = listener = ConcurrencyListener()
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([listener, bandwidth_meter], ThroughputTrace.constant(8000000), origin,
+                                            clock, 4096)
+    context.args.scheduler = SchedulerImpl(1000, 0.05, download_manager, bandwidth_meter, BufferManagerImpl(),
+                                           LowestABRController(), [listener], clock=clock,
+                                           max_concurrent_downloads=int(limit))
+
+
+@given("We have a scheduler with independent tracks and a slow audio adaptation set")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    context.args.adaptation_sets = build_adaptation_sets(5)
+    origin = build_origin(context.args.adaptation_sets, {0: 10000, 1: 500000})
+    context.args.listener = listener = ConcurrencyListener()
+    context.args.buffer_manager = BufferManagerImpl()
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([listener, bandwidth_meter], ThroughputTrace.constant(8000000), origin,
+                                            clock, 4096)
+    context.args.scheduler = SchedulerImpl(1000, 0.05, download_manager, bandwidth_meter,
+                                           context.args.buffer_manager, LowestABRController(), [listener],
+                                           clock=clock, independent_tracks=True)
+
+
+@given("We have a scheduler with independent tracks and an audio adaptation set shorter than the video one")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    context.args.adaptation_sets = build_adaptation_sets(5)
+    audio = context.args.adaptation_sets[1].representations[0]
+    audio.segments = audio.segments[:3]
+    origin = build_origin(context.args.adaptation_sets, {0: 100000, 1: 20000})
+    context.args.listener = listener = ConcurrencyListener()
+    context.args.buffer_manager = BufferManagerImpl()
+    context.args.abr_controller = TrackABRController()
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([listener, bandwidth_meter], ThroughputTrace.constant(8000000), origin,
+                                            clock, 4096)
+    context.args.scheduler = SchedulerImpl(1000, 0.05, download_manager, bandwidth_meter,
+                                           context.args.buffer_manager, context.args.abr_controller, [listener],
+                                           clock=clock, independent_tracks=True)
+
+
+@given("We have a scheduler requesting (?P<depth>\\d+) indices ahead in (?P<limit>\\d+) download slots with an ABR "
+       "switching down after (?P<calls>\\d+) decisions")
+def step_impl(context, depth, limit, calls):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    depth : str
+    limit : str
+    calls : str
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    context.args.adaptation_sets = build_adaptation_sets(6, num_representations=2)
+    origin = build_origin(context.args.adaptation_sets, {0: 100000, 1: 20000})
+    context.args.listener = listener = ConcurrencyListener()
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([listener, bandwidth_meter], ThroughputTrace.constant(8000000), origin,
+                                            clock, 4096)
+    context.args.scheduler = SchedulerImpl(1000, 0.05, download_manager, bandwidth_meter, BufferManagerImpl(),
+                                           SwitchingABRController(int(calls)), [listener], clock=clock,
+                                           max_concurrent_downloads=int(limit), pipeline_depth=int(depth))
+    context.args.limit = int(limit)
+
+
+@given("We have a scheduler requesting (?P<depth>\\d+) indices ahead in (?P<limit>\\d+) download slots with an audio "
+       "adaptation set shorter than the video one")
+def step_impl(context, depth, limit):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    depth : str
+    limit : str
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    context.args.adaptation_sets = build_adaptation_sets(6)
+    audio = context.args.adaptation_sets[1].representations[0]
+    audio.segments = audio.segments[:3]
+    origin = build_origin(context.args.adaptation_sets, {0: 100000, 1: 20000})
+    context.args.listener = listener = ConcurrencyListener()
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([listener, bandwidth_meter], ThroughputTrace.constant(8000000), origin,
+                                            clock, 4096)
+    context.args.scheduler = SchedulerImpl(1000, 0.05, download_manager, bandwidth_meter, BufferManagerImpl(),
+                                           LowestABRController(), [listener], clock=clock,
+                                           max_concurrent_downloads=int(limit), pipeline_depth=int(depth))
+    context.args.limit = int(limit)
+
+
+@given("We have a scheduler with a maximum buffer of 4 seconds during a playback paused from 5 to 8 seconds")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.clock = clock = VirtualClock()
+    context.args.adaptation_sets = build_adaptation_sets(12)
+    origin = build_origin(context.args.adaptation_sets, {0: 100000, 1: 20000})
+    context.args.listener = listener = TimingListener(clock)
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([bandwidth_meter], ThroughputTrace.constant(8000000), origin, clock, 4096)
+    context.args.scheduler = scheduler = SchedulerImpl(4, 0.05, download_manager, bandwidth_meter,
+                                                       BufferManagerImpl(), LowestABRController(), [listener],
+                                                       clock=clock)
+    # The player starts playing at once, pauses at 5 seconds and resumes at 8 seconds
+    scheduler.notify_playback(0, 1)
+    clock.loop.call_at(5, scheduler.notify_playback, 5, 0)
+    clock.loop.call_at(8, scheduler.notify_playback, 5, 1)
+
+
+@when("The scheduler downloads all the segments")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock: VirtualClock = context.args.clock
+    scheduler: SchedulerImpl = context.args.scheduler
+
+    async def run():
+        scheduler.start(context.args.adaptation_sets)
+        while not scheduler.is_end:
+            await clock.sleep(0.1)
+        await scheduler.stop()
+
+    clock.run(run())
+    clock.close()
+
+
+@then("The downloads of each index overlap and each index completes after all its downloads")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    listener: ConcurrencyListener = context.args.listener
+    assert listener.max_running == 4
+    completes = [event for event in listener.events if event[0] == "segment_complete"]
+    assert [event[1] for event in completes] == [0, 1, 2, 3, 4]
+    assert all(event[2] == 0 for event in completes)
+
+
+@then("The downloads never overlap")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    listener: ConcurrencyListener = context.args.listener
+    assert listener.max_running == 1
+    assert len([event for event in listener.events if event[0] == "segment_complete"]) == 5
+
+
+@then("The video track is not held back by the audio track and each track has its own buffer")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    listener: ConcurrencyListener = context.args.listener
+    buffer_manager: BufferManagerImpl = context.args.buffer_manager
+    ends = [event[1] for event in listener.events if event[0] == "end"]
+    assert ends.index(BASE_URL + "video-0-4.m4s") < ends.index(BASE_URL + "audio-0-1.m4s")
+    assert buffer_manager.track_buffer_level(0) == 10
+    assert buffer_manager.track_buffer_level(1) == 10
+    assert buffer_manager.buffer_level == 10
+
+
+@then("The next index is requested before the current one arrives and stale requests ahead are canceled")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    listener: ConcurrencyListener = context.args.listener
+    starts = [event[1] for event in listener.events if event[0] == "start"]
+    ends = [event[1] for event in listener.events if event[0] == "end"]
+    canceled = [event[1] for event in listener.events if event[0] == "canceled"]
+    # The requests ahead take download slots too
+    assert listener.max_running <= context.args.limit
+    # The segment 1 is requested while the segment 0 is still arriving
+    assert listener.events.index(("start", BASE_URL + "video-1-1.m4s")) < \
+        listener.events.index(("end", BASE_URL + "video-1-0.m4s"))
+    # The requests ahead for the indices 2 and 3 were made with the old selection, and got canceled while in flight
+    assert {BASE_URL + "video-1-3.m4s", BASE_URL + "audio-1-3.m4s"} <= set(canceled)
+    assert set(canceled) <= {BASE_URL + "%s-1-%d.m4s" % (content_type, i)
+                             for content_type in ("video", "audio") for i in (2, 3)}
+    for i in range(6):
+        representation_id = 1 if i < 2 else 0
+        for content_type in ("video", "audio"):
+            assert BASE_URL + "%s-%d-%d.m4s" % (content_type, representation_id, i) in ends
+    assert len(starts) == len(ends) + len(canceled)
+    completes = [event[1] for event in listener.events if event[0] == "segment_complete"]
+    assert completes == list(range(6))
+
+
+@then("Each segment is requested as soon as the buffer drains to 4 seconds and never during the pause")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    scheduler: SchedulerImpl = context.args.scheduler
+    starts = context.args.listener.starts
+    # The scheduler ends when it finds no segment for the index 12
+    assert [index for _, index in starts] == list(range(13))
+    waited = 0
+    for (previous_time, _), (time, index) in zip(starts, starts[1:]):
+        position = time if time < 5 else 5 if time < 8 else time - 3
+        buffer_level = index * 2 - position
+        assert buffer_level <= 4 + 1e-6
+        assert not 5 + 1e-6 < time < 8
+        # The segment was requested when the buffer drained to the maximum, unless it had room already
+        if time - previous_time > 0.5:
+            assert abs(buffer_level - 4) < 1e-6 or abs(time - 8) < 1e-6
+            waited += 1
+    assert waited > 0
+    # The scheduler only woke up to request a segment or when the playback changed
+    assert scheduler.wakeups <= waited + 3
+
+
+@then("Each index completes once, each track gets its own selections and the audio track stops holding the buffer "
+      "back")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    listener: ConcurrencyListener = context.args.listener
+    buffer_manager: BufferManagerImpl = context.args.buffer_manager
+    completes = [event[1] for event in listener.events if event[0] == "segment_complete"]
+    assert completes == [0, 1, 2, 3, 4]
+    # Each index completes after its downloads in all the tracks which have it
+    completed_at = {event[1]: i for i, event in enumerate(listener.events) if event[0] == "segment_complete"}
+    for index in range(5):
+        assert listener.events.index(("end", BASE_URL + "video-0-%d.m4s" % index)) < completed_at[index]
+        if index < 3:
+            assert listener.events.index(("end", BASE_URL + "audio-0-%d.m4s" % index)) < completed_at[index]
+    # One selection per download of each track, and one more when each track finds no more segments
+    calls = context.args.abr_controller.track_calls
+    assert calls.count(0) == 6 and calls.count(1) == 4
+    assert buffer_manager.track_buffer_level(1) == 6
+    assert buffer_manager.buffer_level == 10
+
+
+@then("No segment after the end of the shortest adaptation set is requested and the initialization segments are "
+      "requested once")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    listener: ConcurrencyListener = context.args.listener
+    scheduler: SchedulerImpl = context.args.scheduler
+    starts = [event[1] for event in listener.events if event[0] == "start"]
+    ends = [event[1] for event in listener.events if event[0] == "end"]
+    assert scheduler.is_end
+    assert listener.max_running <= context.args.limit
+    # The segments of the index 3 would only be requested ahead, the audio adaptation set ends before it
+    assert sorted(starts) == sorted(ends)
+    assert sorted(starts) == sorted([BASE_URL + "video-0-init.m4s", BASE_URL + "audio-0-init.m4s"] +
+                                    [BASE_URL + "%s-0-%d.m4s" % (content_type, i)
+                                     for content_type in ("video", "audio") for i in range(3)])
+    completes = [event[1] for event in listener.events if event[0] == "segment_complete"]
+    assert completes == [0, 1, 2]
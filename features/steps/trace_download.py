@@ -0,0 +1,453 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from behave import *
+
+from dash_emulator.abr import DashABRController
+from dash_emulator.bandwidth import BandwidthMeterImpl
+from dash_emulator.buffer import BufferManagerImpl
+from dash_emulator.clock import VirtualClock
+from dash_emulator.download import DownloadEventListener
+from dash_emulator.models import State
+from dash_emulator.mpd.parser import DefaultMPDParser
+from dash_emulator.mpd.providers import MPDProviderImpl
+from dash_emulator.origin import SyntheticOrigin, OriginException
+from dash_emulator.player import DASHPlayer, PlayerEventListener
+from dash_emulator.scheduler import SchedulerImpl
+from dash_emulator.trace_download import TraceDownloadManager, TraceLink
+from dash_emulator.traces import ThroughputTrace
+
+use_step_matcher("re")
+
+MPD_URL = "http://origin.local/videos/BBB/output.mpd"
+
+
+class RecordingDownloadListener(DownloadEventListener):
+    def __init__(self):
+        self.started = False
+        self.ended_size = None
+        self.canceled_position = None
+        self.bytes = 0
+
+    async def on_transfer_start(self, url) -> None:
+        self.started = True
+
+    async def on_bytes_transferred(self, length: int, url: str, position: int, size: int, content) -> None:
+        self.bytes += length
+
+    async def on_transfer_end(self, size: int, url: str) -> None:
+        self.ended_size = size
+
+    async def on_transfer_canceled(self, url: str, position: int, size: int) -> None:
+        self.canceled_position = position
+
+
+class RecordingPlayerListener(PlayerEventListener):
+    def __init__(self, clock):
+        self.clock = clock
+        self.transitions = []
+        self.buffer_levels = []
+
+    async def on_state_change(self, position: float, old_state: State, new_state: State):
+        self.transitions.append((round(self.clock.time(), 6), round(position, 6), old_state, new_state))
+
+    async def on_buffer_level_change(self, buffer_level):
+        self.buffer_levels.append(buffer_level)
+
+    async def on_position_change(self, position):
+        pass
+
+
+def generate_mpd(num_segments: int, segment_duration: int, bandwidths) -> str:
+    representations = "".join("""
+            <Representation id="%d" mimeType="video/mp4" codecs="avc1" bandwidth="%d" width="1280" height="720">
+                <SegmentTemplate timescale="1000" initialization="init-$RepresentationID$.m4s"
+                    media="chunk-$RepresentationID$-$Number%%05d$.m4s" startNumber="1">
+                    <SegmentTimeline>
+                        <S t="0" d="%d" r="%d" />
+                    </SegmentTimeline>
+                </SegmentTemplate>
+            </Representation>""" % (i, bw, segment_duration * 1000, num_segments - 2) for i, bw in enumerate(bandwidths))
+    return """<?xml version="1.0" encoding="utf-8"?>
+    <MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT%dS"
+        maxSegmentDuration="PT%dS" minBufferTime="PT2S">
+        <Period id="0">
+            <AdaptationSet id="0" contentType="video" maxWidth="1280" maxHeight="720">%s
+            </AdaptationSet>
+        </Period>
+    </MPD>""" % (num_segments * segment_duration, segment_duration, representations)
+
+
+def build_player(clock, trace, origin, listener):
+    link = TraceLink(trace, clock)
+    buffer_manager = BufferManagerImpl()
+    mpd_provider = MPDProviderImpl(DefaultMPDParser(), 0.05, TraceDownloadManager([], link, origin, clock), clock=clock)
+    bandwidth_meter = BandwidthMeterImpl(1000000, 0, [], clock=clock)
+    download_manager = TraceDownloadManager([bandwidth_meter], link, origin, clock, 40960)
+    abr_controller = DashABRController(2, 4, bandwidth_meter, buffer_manager, mpd_provider)
+    scheduler = SchedulerImpl(5, 0.05, download_manager, bandwidth_meter, buffer_manager, abr_controller, [],
+                              clock=clock)
+    return DASHPlayer(0.05, min_rebuffer_duration=1, min_start_buffer_duration=2, buffer_manager=buffer_manager,
+                      mpd_provider=mpd_provider, scheduler=scheduler, listeners=[listener], clock=clock)
+
+
+@given("We have a trace download manager with a constant bandwidth of 8 Mbps")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.trace = ThroughputTrace.constant(8000000)
+
+
+@given("We have a trace download manager with a varying bandwidth")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.trace = ThroughputTrace([0.5, 0.5, 1], [8000000, 0, 8000000])
+
+
+@given("We have a trace download manager with 1 second at 8 Mbps then 1 second at 4 Mbps")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.trace = ThroughputTrace([1, 1], [8000000, 4000000])
+
+
+@when("The trace download manager downloads 1000000 bytes")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock = VirtualClock()
+    origin = SyntheticOrigin()
+    origin.add_size("http://origin.local/segment.m4s", 1000000)
+    listener = RecordingDownloadListener()
+    download_manager = TraceDownloadManager([listener], context.args.trace, origin, clock, 4096)
+
+    async def run():
+        start = clock.time()
+        await download_manager.download("http://origin.local/segment.m4s")
+        return clock.time() - start
+
+    context.args.elapsed = clock.run(run())
+    context.args.listener = listener
+
+
+@then("The download takes (?P<seconds>[\\d.]+) seconds? of simulated time and calls the listeners")
+def step_impl(context, seconds):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    seconds : str
+    """
+    assert abs(context.args.elapsed - float(seconds)) < 1e-6
+    assert context.args.listener.started is True
+    assert context.args.listener.bytes == 1000000
+    assert context.args.listener.ended_size == 1000000
+
+
+@when("A transfer is canceled in the middle of a chunk and another transfer follows")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock = VirtualClock()
+    origin = SyntheticOrigin()
+    origin.add_size("http://origin.local/large.m4s", 8000000)
+    origin.add_size("http://origin.local/segment.m4s", 1000000)
+    listener = RecordingDownloadListener()
+    # Each chunk takes 1 second on the link
+    download_manager = TraceDownloadManager([listener], context.args.trace, origin, clock, 1000000)
+
+    async def run():
+        handle = download_manager.submit("http://origin.local/large.m4s")
+        await clock.sleep(0.25)
+        await download_manager.cancel(handle)
+        start = clock.time()
+        await download_manager.download("http://origin.local/segment.m4s")
+        elapsed = clock.time() - start
+        await handle.task
+        return elapsed
+
+    context.args.elapsed = clock.run(run())
+    context.args.listener = listener
+
+
+@then("The next transfer gets the whole bandwidth right after the cancellation")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    # The canceled chunk doesn't hold the link until the end of its 1 second
+    assert abs(context.args.elapsed - 1) < 1e-6
+    assert context.args.listener.canceled_position == 0
+    assert context.args.listener.ended_size == 1000000
+
+
+@given("We have a player downloading from a synthetic origin on a virtual clock")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.trace = ThroughputTrace([10, 10, 10], [3000000, 600000, 1500000])
+    context.args.content = generate_mpd(300, 2, [2000000, 1000000, 400000])
+
+
+@given("We have a player downloading 2 segments of 4 seconds over a slow link")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    # Each segment takes 20 seconds to download
+    context.args.trace = ThroughputTrace.constant(200000)
+    context.args.content = generate_mpd(3, 4, [1000000])
+
+
+@when("The session is played twice")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args.runs = []
+    for _ in range(2):
+        clock = VirtualClock()
+        origin = SyntheticOrigin()
+        origin.add_mpd_content(MPD_URL, context.args.content)
+        listener = RecordingPlayerListener(clock)
+        player = build_player(clock, context.args.trace, origin, listener)
+        wall_start = time.time()
+        clock.run(player.start(MPD_URL))
+        clock.close()
+        context.args.runs.append((listener.transitions, clock.time(), time.time() - wall_start))
+
+
+@then("Both sessions end with identical state transitions long before the content duration")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    (transitions, simulated, wall), (transitions_2, _, _) = context.args.runs
+    assert transitions == transitions_2
+    assert transitions[0][2:] == (State.BUFFERING, State.READY)
+    assert transitions[-1][3] == State.END
+    assert simulated >= 600
+    assert wall < simulated / 10
+
+
+@when("The session is played once")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock = VirtualClock()
+    origin = SyntheticOrigin()
+    origin.add_mpd_content(MPD_URL, context.args.content)
+    listener = RecordingPlayerListener(clock)
+    player = build_player(clock, context.args.trace, origin, listener)
+    clock.run(player.start(MPD_URL))
+    clock.close()
+    context.args.transitions = listener.transitions
+    context.args.buffer_levels = listener.buffer_levels
+    context.args.simulated = clock.time()
+    context.args.player = player
+
+
+@then("The player stalls exactly when its buffer runs out and wakes up far less often than by polling")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    transitions = context.args.transitions
+    stalls = [transition for transition in transitions if transition[3] == State.BUFFERING]
+    assert len(stalls) > 0
+    # The playback stops at the end of a segment, the segments last 2 seconds
+    for _, position, old_state, _ in stalls:
+        assert old_state == State.READY
+        assert abs(position / 2 - round(position / 2)) < 1e-6
+    assert transitions[-1][3] == State.END
+    player = context.args.player
+    assert player.wakeups < context.args.simulated / player.update_interval / 5
+
+
+@then("The player doesn't poll while buffering and reports each buffer level once")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    transitions = context.args.transitions
+    assert [transition[2:] for transition in transitions] == [(State.BUFFERING, State.READY),
+                                                              (State.READY, State.BUFFERING),
+                                                              (State.BUFFERING, State.READY),
+                                                              (State.READY, State.END)]
+    # Buffering for 40 seconds, polling every update interval would wake the player up 800 times
+    player = context.args.player
+    assert player.wakeups < 30, player.wakeups
+    levels = context.args.buffer_levels
+    assert all(previous != level for previous, level in zip(levels, levels[1:]))
+
+
+@when("Two trace download managers on one link download 1000000 bytes one after the other")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    clock = VirtualClock()
+    origin = SyntheticOrigin()
+    origin.add_size("http://origin.local/segment.m4s", 1000000)
+    link = TraceLink(context.args.trace, clock)
+    download_managers = [TraceDownloadManager([], link, origin, clock, 4096) for _ in range(2)]
+
+    async def run():
+        durations = []
+        for download_manager in download_managers:
+            start = clock.time()
+            await download_manager.download("http://origin.local/segment.m4s")
+            durations.append(clock.time() - start)
+        return durations
+
+    context.args.durations = clock.run(run())
+
+
+@then("The second download continues the trace where the first one stopped")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    # The second download gets 4 Mbit at 4 Mbps, then the trace repeats and the rest comes at 8 Mbps
+    first, second = context.args.durations
+    assert abs(first - 1) < 1e-6
+    assert abs(second - 1.5) < 1e-6
+
+
+TRACE_FILES = {
+    # One packet every 10 ms during the first second, then one every 5 ms, grouped by 100 ms
+    "Mahimahi": (lambda path: ThroughputTrace.from_mahimahi(path, resolution=0.1),
+                 "".join("%d\n" % t for t in range(5, 1000, 10)) + "".join("%d\n" % t for t in range(1002, 2000, 5))),
+    "cooked": (ThroughputTrace.from_cooked, "0.0 1.0\n1.0 2.0\n1.0 3.0\n2.5 4.0\n"),
+    "HSDPA": (ThroughputTrace.from_hsdpa,
+              "1203500000 0 59.85 10.66 125000 1000\n"
+              "1203500001 1000 59.85 10.66 0 0\n"
+              "malformed line\n"
+              "1203500001 1000 59.85 10.66 125000 500\n"),
+}
+
+
+@given("We have an? (?P<trace_format>Mahimahi|cooked|HSDPA) trace file(?: with duplicate timestamps)?")
+def step_impl(context, trace_format):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    trace_format : str
+    """
+    context.args = SimpleNamespace()
+    context.args.load, content = TRACE_FILES[trace_format]
+    context.args.folder = tempfile.TemporaryDirectory()
+    context.args.path = os.path.join(context.args.folder.name, "trace.log")
+    with open(context.args.path, "w") as f:
+        f.write(content)
+
+
+@when("The trace file is loaded")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args.loaded_trace = context.args.load(context.args.path)
+    context.args.folder.cleanup()
+
+
+@then("The loaded trace has the durations (?P<durations>[\\d., ]+) and the bandwidths (?P<bandwidths>[\\d., ]+) Mbps")
+def step_impl(context, durations, bandwidths):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    durations : str
+    bandwidths : str
+    """
+    trace = context.args.loaded_trace
+    durations = [float(duration) for duration in durations.split(",")]
+    bandwidths = [float(bandwidth) * 1000000 for bandwidth in bandwidths.split(",")]
+    assert len(trace.durations) == len(durations)
+    assert all(abs(actual - expected) < 1e-6 for actual, expected in zip(trace.durations, durations))
+    assert all(abs(actual - expected) < 1e-3 for actual, expected in zip(trace.bandwidths, bandwidths))
+
+
+@given("We have a synthetic origin serving a 24-hour MPD file of 3 representations")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    context.args = SimpleNamespace()
+    context.args.origin = SyntheticOrigin()
+    context.args.mpd = context.args.origin.add_mpd_content(MPD_URL, generate_mpd(43200, 2, [2000000, 1000000, 400000]))
+
+
+@then("The segments are sized when they are requested, without storing a size per segment")
+def step_impl(context):
+    """
+    Parameters
+    ----------
+    context : behave.runner.Context
+    """
+    origin: SyntheticOrigin = context.args.origin
+    representations = context.args.mpd.adaptation_sets[0].representations
+    # The MPD file and the initialization segments
+    assert len(origin._sizes) == 4, len(origin._sizes)
+    for representation in representations.values():
+        segments = representation.segments
+        for index in (0, 20000, len(segments) - 1):
+            assert origin.size(segments[index].url) == representation.bandwidth * 2 // 8
+            assert len(origin.read(segments[index].url, 0, 100)) == 100
+    assert origin.size(representations[0].initialization) == origin.init_segment_size
+    for url in ("http://origin.local/videos/BBB/chunk-0-99999.m4s", "http://origin.local/videos/BBB/unknown.m4s"):
+        try:
+            origin.size(url)
+            assert False, url
+        except OriginException:
+            pass
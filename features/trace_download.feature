@@ -0,0 +1,55 @@
+Feature: Download from a synthetic origin at the rate of a throughput trace
+
+  Scenario: Download a segment at a constant traced rate
+    Given We have a trace download manager with a constant bandwidth of 8 Mbps
+    When The trace download manager downloads 1000000 bytes
+    Then The download takes 1 second of simulated time and calls the listeners
+
+  Scenario: Download across the intervals of a varying trace
+    Given We have a trace download manager with a varying bandwidth
+    When The trace download manager downloads 1000000 bytes
+    Then The download takes 1.5 seconds of simulated time and calls the listeners
+
+  Scenario: Free the link as soon as a transfer is canceled
+    Given We have a trace download manager with a constant bandwidth of 8 Mbps
+    When A transfer is canceled in the middle of a chunk and another transfer follows
+    Then The next transfer gets the whole bandwidth right after the cancellation
+
+  Scenario: Emulate a full session in simulated time
+    Given We have a player downloading from a synthetic origin on a virtual clock
+    When The session is played twice
+    Then Both sessions end with identical state transitions long before the content duration
+
+  Scenario: Wake the player up only on buffer events and deadlines
+    Given We have a player downloading from a synthetic origin on a virtual clock
+    When The session is played once
+    Then The player stalls exactly when its buffer runs out and wakes up far less often than by polling
+
+  Scenario: Wait for the segments without polling while buffering
+    Given We have a player downloading 2 segments of 4 seconds over a slow link
+    When The session is played once
+    Then The player doesn't poll while buffering and reports each buffer level once
+
+  Scenario: Replay the trace from the same start for the MPD file and the segments
+    Given We have a trace download manager with 1 second at 8 Mbps then 1 second at 4 Mbps
+    When Two trace download managers on one link download 1000000 bytes one after the other
+    Then The second download continues the trace where the first one stopped
+
+  Scenario: Load a Mahimahi trace
+    Given We have a Mahimahi trace file
+    When The trace file is loaded
+    Then The loaded trace has the durations 1, 1 and the bandwidths 1.2, 2.4 Mbps
+
+  Scenario: Load a cooked trace with duplicate timestamps
+    Given We have a cooked trace file with duplicate timestamps
+    When The trace file is loaded
+    Then The loaded trace has the durations 1, 1.5, 1.5 and the bandwidths 1, 3, 4 Mbps
+
+  Scenario: Load a 3G/HSDPA log
+    Given We have a HSDPA trace file
+    When The trace file is loaded
+    Then The loaded trace has the durations 1, 0.5 and the bandwidths 1, 2 Mbps
+
+  Scenario: Size the segments of a long MPD file when they are requested
+    Given We have a synthetic origin serving a 24-hour MPD file of 3 representations
+    Then The segments are sized when they are requested, without storing a size per segment
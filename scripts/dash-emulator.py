@@ -2,13 +2,19 @@
 
 import argparse
 import asyncio
+import json
 import logging
 import pathlib
 import re
 import sys
-from typing import Dict, Union
+from typing import Dict, Union, List, Tuple, Any
 
+from dash_emulator.config import Config
+from dash_emulator.event_recorder import EventRecorder
+from dash_emulator.fleet import FleetRunner, build_fleet_dash_player
+from dash_emulator.fleet_shards import ShardedFleetRunner
 from dash_emulator.player_factory import build_dash_player
+from dash_emulator.rate_limit import RateSchedule
 
 log = logging.getLogger(__name__)
 
@@ -25,10 +31,67 @@ def create_parser():
     arg_parser.add_argument("--plot", required=False, default=False, action='store_true')
     arg_parser.add_argument("-y", required=False, default=False, action='store_true',
                             help="Automatically overwrite output folder")
+    arg_parser.add_argument("--rate-limit", type=float, required=False, default=None,
+                            help="Limit the download rate of the player, in bps")
+    arg_parser.add_argument("--rate-schedule", type=str, required=False, default=None,
+                            help="Change the download rate limit over time, e.g. \"0:5000000,30:1000000\" "
+                                 "(seconds:bps, \"none\" for no limit)")
+    arg_parser.add_argument("--fleet", type=int, required=False, default=None,
+                            help="Run this number of players in one process, sharing one connection pool")
+    arg_parser.add_argument("--arrival-rate", type=float, required=False, default=0,
+                            help="Number of players of the fleet started per second (Poisson arrivals), "
+                                 "0 to start all of them at once")
+    arg_parser.add_argument("--sessions", type=str, required=False, default=None,
+                            help="A JSON lines file of the sessions of the fleet, taken in turn by the players. "
+                                 "Each line is an object with an optional \"mpd\" URL (the target by default), "
+                                 "and optional \"rate_limit\" (bps) and \"duration\" (seconds) parameters")
+    arg_parser.add_argument("--fleet-results", type=str, required=False, default=None,
+                            help="Path of the CSV file of the results of the sessions of the fleet")
+    arg_parser.add_argument("--workers", type=int, required=False, default=None,
+                            help="Shard the fleet over this number of processes, each one with its own event loop")
+    arg_parser.add_argument("--connection-limit", type=int, required=False, default=Config.fleet_connection_limit,
+                            help="Maximum number of connections of the fleet, 0 for no limit")
+    arg_parser.add_argument("--events", type=str, required=False, default=None,
+                            help="Path of a binary file to append the events of the player to, "
+                                 "see dash_emulator.event_recorder.load_events")
     arg_parser.add_argument(PLAYER_TARGET, type=str, help="Target MPD file link")
     return arg_parser
 
 
+def load_sessions(path: str, default_mpd: str) -> List[Tuple[str, Dict[str, Any]]]:
+    sessions = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            params = json.loads(line)
+            sessions.append((params.pop("mpd", default_mpd), params))
+    if len(sessions) == 0:
+        raise ValueError("No session in %s" % path)
+    return sessions
+
+
+def run_fleet(arguments: Dict[str, Union[int, str, None]]):
+    if arguments["sessions"] is not None:
+        sessions = load_sessions(arguments["sessions"], arguments[PLAYER_TARGET])
+    else:
+        sessions = [(arguments[PLAYER_TARGET], {})]
+    if arguments["workers"] is not None:
+        runner = ShardedFleetRunner(build_fleet_dash_player, sessions, arguments["fleet"],
+                                    num_workers=arguments["workers"], arrival_rate=arguments["arrival_rate"],
+                                    connection_limit=arguments["connection_limit"],
+                                    connection_limit_per_host=Config.fleet_connection_limit_per_host)
+        runner.run()
+    else:
+        runner = FleetRunner(build_fleet_dash_player, sessions, arguments["fleet"],
+                             arrival_rate=arguments["arrival_rate"],
+                             connection_limit=arguments["connection_limit"],
+                             connection_limit_per_host=Config.fleet_connection_limit_per_host)
+        asyncio.run(runner.run())
+    if arguments["fleet_results"] is not None:
+        runner.write_results(arguments["fleet_results"])
+
+
 def validate_args(arguments: Dict[str, Union[int, str, None]]) -> bool:
     # Validate target
     # args.PLAYER_TARGET is required
@@ -45,6 +108,28 @@ def validate_args(arguments: Dict[str, Union[int, str, None]]) -> bool:
     # Validate proxy
     # TODO
 
+    # Validate rate schedule
+    if arguments["rate_schedule"] is not None:
+        try:
+            RateSchedule.parse(arguments["rate_schedule"])
+        except ValueError as e:
+            log.error(str(e))
+            return False
+
+    # Validate fleet
+    if arguments["fleet"] is not None and arguments["fleet"] <= 0:
+        log.error("The fleet needs at least one player")
+        return False
+    if arguments["workers"] is not None and (arguments["fleet"] is None or arguments["workers"] <= 0):
+        log.error("--workers needs --fleet and at least one worker")
+        return False
+    if arguments["sessions"] is not None:
+        try:
+            load_sessions(arguments["sessions"], arguments[PLAYER_TARGET])
+        except (OSError, ValueError) as e:
+            log.error("Cannot load the sessions: %s" % e)
+            return False
+
     # Validate Output
     if arguments["output"] is not None:
         path = pathlib.Path(arguments['output'])
@@ -72,6 +157,16 @@ if __name__ == '__main__':
 
     logging.basicConfig(level=logging.INFO)
 
-    player = build_dash_player()
+    Config.rate_limit = args["rate_limit"]
+    Config.rate_schedule = args["rate_schedule"]
+    if args["fleet"] is not None:
+        run_fleet(args)
+        exit(0)
+    recorder = EventRecorder(args["events"]) if args["events"] is not None else None
+    player = build_dash_player(output_folder=args["output"], listeners=[recorder] if recorder is not None else [])
 
-    asyncio.run(player.start(args["target"]))
+    try:
+        asyncio.run(player.start(args["target"]))
+    finally:
+        if recorder is not None:
+            recorder.close()
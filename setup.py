@@ -8,6 +8,7 @@ requirements = [
     "aiohttp",  # Async HTTP requests
     "requests",  # Synchronous HTTP requests
     "matplotlib",  # for plotting figures
+    "numpy",  # for the batch evaluation of the ABR logic
     "behave"  # for Behavior-Driven Development (BDD)
 ]
 